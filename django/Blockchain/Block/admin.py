@@ -1,13 +1,22 @@
 from django.contrib import admin
-from .models import Block
+from .models import Block, Transaction
 
 
 # Register your models here.
 class BlockAdmin(admin.ModelAdmin):
-    list_display = ['header', 'hashValue']
+    list_display = ['height', 'hash', 'previous_hash', 'timestamp']
+    search_fields = ['=height', '=hash']
 
     class Meta:
         model = Block
 
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ['tx_id', 'transaction_type', 'name', 'block']
+    search_fields = ['=tx_id', '=name']
+    raw_id_fields = ['block']
+
+    class Meta:
+        model = Transaction
+
 admin.site.register(Block, BlockAdmin)
-from django.contrib import admin
+admin.site.register(Transaction, TransactionAdmin)
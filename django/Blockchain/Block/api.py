@@ -0,0 +1,157 @@
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import condition, require_GET
+
+from .models import Block, Transaction
+
+# Keys are compared the way the node sources compare them
+sys.path.append(settings.BLOCKCHAIN_SRC)
+from revocation import normalize_key
+
+
+# How long rendered API responses stay in the cache. Entries are keyed on the
+# chain height, so new blocks make them unreachable long before this.
+API_CACHE_TIMEOUT = 60 * 60
+# Maximum number of blocks returned by the latest blocks endpoint
+MAX_LATEST = 100
+
+
+def chain_height(request):
+    '''
+    The height of the latest block, looked up once per request.
+    It is read from the database rather than cached, a single lookup on the
+    height index, so blocks written by other processes such as ingest_chain
+    change it at once.
+    '''
+    if not hasattr(request, 'chain_height'):
+        height = Block.objects.order_by('-height').values_list('height', flat=True).first()
+        request.chain_height = -1 if height is None else height
+    return request.chain_height
+
+
+def chain_etag(request, *args, **kwargs):
+    # Every response only changes when the chain grows
+    return 'h%d' % chain_height(request)
+
+
+def block_json(block):
+    return {
+        'height': block.height,
+        'hash': block.hash,
+        'previous_hash': block.previous_hash,
+        'merkle_root': block.merkle_root,
+        'generator': block.generator,
+        'status': block.status,
+        'timestamp': block.timestamp,
+    }
+
+
+def transaction_json(transaction):
+    return {
+        'tx_id': transaction.tx_id,
+        'block': transaction.block.height,
+        'position': transaction.position,
+        'transaction_type': transaction.transaction_type,
+        'generator': transaction.generator,
+        'name': transaction.name,
+        'public_key': transaction.public_key,
+        'inputs': transaction.inputs,
+        'outputs': transaction.outputs,
+        'success': transaction.success,
+        'timestamp': transaction.timestamp,
+    }
+
+
+def latest_count(request):
+    '''
+    The number of blocks asked for by the latest blocks endpoint, between 0 and MAX_LATEST.
+    '''
+    try:
+        count = int(request.GET.get('count', 10))
+    except ValueError:
+        count = 10
+    return max(min(count, MAX_LATEST), 0)
+
+
+def cached_api(view=None, vary=None):
+    '''
+    Serve a JSON API view through the cache framework and ETags.
+
+    Conditional GETs whose ETag matches the current chain height get a 304
+    without touching the view. Otherwise the rendered data is cached per
+    path and chain height, so repeated polls are a single cache hit.
+    A view signals a missing object by raising Http404.
+
+    The query string is not part of the cache key, so made up parameters
+    cannot fill the cache. A view that reads a parameter passes vary, a
+    function of the request returning the parameter as the view uses it.
+    '''
+    if view is None:
+        return lambda view: cached_api(view, vary)
+
+    @require_GET
+    @condition(etag_func=chain_etag)
+    def wrapper(request, *args, **kwargs):
+        key = 'api:%d:%s' % (chain_height(request), request.path)
+        if vary is not None:
+            key += ':%s' % vary(request)
+        data = cache.get(key)
+        if data is None:
+            try:
+                data = {'status': 200, 'body': view(request, *args, **kwargs)}
+            except Http404 as e:
+                data = {'status': 404, 'body': {'error': str(e)}}
+            cache.set(key, data, API_CACHE_TIMEOUT)
+        return JsonResponse(data['body'], status=data['status'])
+    return wrapper
+
+
+@cached_api
+def block_by_height(request, height):
+    block = Block.objects.filter(height=height).first()
+    if block is None:
+        raise Http404("No block at height %d" % height)
+    return block_json(block)
+
+
+@cached_api
+def block_by_hash(request, hash):
+    block = Block.objects.filter(hash=hash).first()
+    if block is None:
+        raise Http404("No block with hash %s" % hash)
+    return block_json(block)
+
+
+@cached_api(vary=latest_count)
+def latest_blocks(request):
+    blocks = Block.objects.order_by('-height')[:latest_count(request)]
+    return {'height': chain_height(request), 'blocks': [block_json(b) for b in blocks]}
+
+
+@cached_api
+def transaction_by_id(request, tx_id):
+    transaction = Transaction.objects.select_related('block').filter(tx_id=tx_id).first()
+    if transaction is None:
+        raise Http404("No transaction %s" % tx_id)
+    return transaction_json(transaction)
+
+
+@cached_api
+def key_by_name(request, name):
+    # The newest successful registration or update of the name holds its current key
+    transaction = (Transaction.objects
+                   .filter(name=name, success=True, transaction_type__in=['REGISTER', 'UPDATE'])
+                   .select_related('block')
+                   .order_by('-block__height', '-position')
+                   .first())
+    if transaction is None:
+        raise Http404("Name %s is not registered" % name)
+    # A key may be revoked with other indentation or line endings than it was registered with
+    public_key = normalize_key(transaction.public_key)
+    revoked = any(normalize_key(key) == public_key for key in Transaction.objects.filter(
+        transaction_type='REVOKE', success=True).values_list('public_key', flat=True).iterator())
+    return {'name': name, 'public_key': transaction.public_key, 'revoked': revoked,
+            'tx_id': transaction.tx_id, 'block': transaction.block.height}
@@ -1,9 +1,11 @@
-from django.forms import ModelForm, TextInput
+from django.forms import ModelForm, TextInput, NumberInput
 from .models import Block
 
 class BlockForm(ModelForm):
     class Meta:
         model = Block
-        fields = ['header','hashValue']
-        widgets = {'header':TextInput(attrs={'class': 'input','placeholder': 'Block'}),
-                   'hashValue':TextInput(attrs={'class': 'input','placeholder': 'Hash'})}
+        fields = ['height', 'hash', 'previous_hash', 'timestamp']
+        widgets = {'height':NumberInput(attrs={'class': 'input','placeholder': 'Height'}),
+                   'hash':TextInput(attrs={'class': 'input','placeholder': 'Hash'}),
+                   'previous_hash':TextInput(attrs={'class': 'input','placeholder': 'Previous hash'}),
+                   'timestamp':NumberInput(attrs={'class': 'input','placeholder': 'Timestamp'})}
@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import time
+from threading import Thread
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Block.models import Block, Transaction, IngestCursor
+
+# The chain objects are unpickled from the node sources
+sys.path.append(settings.BLOCKCHAIN_SRC)
+
+
+# Number of parameters per query when checking for transactions that already exist
+LOOKUP_CHUNK = 500
+
+
+def block_row(height, block):
+    '''
+    Build the Block row of a chain block.
+    '''
+    return Block(
+        height=height,
+        hash=block.hash,
+        previous_hash=block.previous_hash or "",
+        merkle_root=block.merkle_root or "",
+        generator=str(block.block_generator_address or ""),
+        status=block.status or "",
+        timestamp=block.timestamp,
+    )
+
+
+def transaction_row(block_id, position, tx):
+    '''
+    Build the Transaction row of a chain transaction, pulling the PKI
+    operation, name, key and result out of its JSON inputs and outputs.
+    '''
+    operation, name, public_key, success = "", "", "", True
+    try:
+        inputs = json.loads(tx.inputs)
+        # There is a single top level key naming the operation
+        operation = next(iter(inputs))
+        name = inputs[operation].get("name", "")
+        public_key = inputs[operation].get("public_key") or inputs[operation].get("new_public_key", "")
+    except (TypeError, ValueError, AttributeError, StopIteration):
+        pass
+    try:
+        success = bool(json.loads(tx.outputs)[operation]["success"])
+    except (TypeError, ValueError, KeyError):
+        pass
+    return Transaction(
+        block_id=block_id,
+        position=position,
+        tx_id=tx.transaction_id,
+        transaction_type=operation[:16],
+        generator=tx.tx_generator_address or "",
+        name=name[:255],
+        public_key=public_key,
+        inputs=tx.inputs if isinstance(tx.inputs, str) else json.dumps(tx.inputs),
+        outputs=tx.outputs if isinstance(tx.outputs, str) else json.dumps(tx.outputs),
+        success=success,
+        timestamp=tx.time_stamp,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Ingest blocks and transactions from a chain store or a validator into the explorer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.BLOCKCHAIN_CHAIN_PATH,
+                            help='The chain store directory to read from')
+        parser.add_argument('--validator', metavar='HOST:PORT',
+                            help='Stream blocks from a validator instead of a chain store')
+        parser.add_argument('--port', type=int, default=4848,
+                            help='The local port to receive validator blocks on')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of blocks written per database transaction')
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep polling for new blocks instead of exiting')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between polls when following')
+
+    def handle(self, *args, **options):
+        if options['validator']:
+            source = 'validator:%s' % options['validator']
+            blocks = self.validator_blocks(options)
+        else:
+            path = os.path.abspath(os.path.expanduser(options['path']))
+            if not os.path.exists(path):
+                raise CommandError("Chain store %s does not exist" % path)
+            source = 'store:%s' % path
+            blocks = self.store_blocks(path)
+
+        cursor, _ = IngestCursor.objects.get_or_create(source=source)
+        self.stdout.write("Ingesting from %s after height %d" % (source, cursor.height))
+        try:
+            while True:
+                count = 0
+                batch = list()
+                for height, block in blocks(cursor.height):
+                    batch.append((height, block))
+                    if len(batch) >= options['batch_size']:
+                        count += self.ingest(cursor, batch)
+                        batch = list()
+                if batch:
+                    count += self.ingest(cursor, batch)
+                if count:
+                    self.stdout.write("Ingested %d blocks, now at height %d" % (count, cursor.height))
+                if not options['follow']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def store_blocks(self, path):
+        # Imported here so the command module loads without the node sources
+        from chainstore import ChainStore
+        store = ChainStore(path)
+
+        def blocks(height):
+            # Positions in the store are the heights
+            for position, block in enumerate(store.read(height + 1), height + 1):
+                if block.pruned:
+                    # Read the transactions of pruned blocks from the archive if it was kept
+                    block = store.archived_block(position) or block
+                yield position, block
+        return blocks
+
+    def validator_blocks(self, options):
+        from client import Client
+        from node import Peer
+
+        host, port = options['validator'].rsplit(':', 1)
+        client = Client(port=options['port'])
+        peer = Peer(hostname=host, port=int(port))
+        client.connections.append(peer)
+        Thread(target=client.receive, daemon=True).start()
+
+        # Ask for the chain from the last ingested block onwards. Asking for a block
+        # that is already on the chain makes the validator send everything after it
+        # and keep sending new blocks.
+        last = IngestCursor.objects.filter(source='validator:%s' % options['validator']).first()
+        client.broadcast_transaction(client.sync_request(max(last.height if last else 0, 0)))
+        received = {'count': 0}
+
+        def blocks(height):
+            chain = client.blockchain.chain
+            new = chain[received['count']:]
+            received['count'] = len(chain)
+            for block in new:
+                if block.id is not None and block.id > height:
+                    yield block.id, block
+        return blocks
+
+    def ingest(self, cursor, batch):
+        '''
+        Write a batch of (height, block) pairs and move the cursor in one transaction.
+        '''
+        with transaction.atomic():
+            Block.objects.bulk_create([block_row(height, block) for height, block in batch])
+            # bulk_create does not return primary keys on every backend, look them up
+            block_ids = dict(Block.objects.filter(
+                height__range=(batch[0][0], batch[-1][0])).values_list('height', 'id'))
+
+            rows, tx_ids = list(), set()
+            for height, block in batch:
+                if block.pruned:
+                    # Only the header is left, the block is recorded without its transactions
+                    continue
+                for position, tx in enumerate(block.transactions):
+                    if tx.transaction_id in tx_ids:
+                        continue
+                    tx_ids.add(tx.transaction_id)
+                    rows.append(transaction_row(block_ids[height], position, tx))
+
+            # A transaction committed twice keeps its first block
+            existing = set()
+            tx_ids = list(tx_ids)
+            for i in range(0, len(tx_ids), LOOKUP_CHUNK):
+                existing.update(Transaction.objects.filter(
+                    tx_id__in=tx_ids[i:i + LOOKUP_CHUNK]).values_list('tx_id', flat=True))
+            Transaction.objects.bulk_create(
+                [row for row in rows if row.tx_id not in existing], batch_size=LOOKUP_CHUNK)
+
+            cursor.height = batch[-1][0]
+            cursor.save()
+        return len(batch)
@@ -0,0 +1,100 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_blocks(apps, schema_editor):
+    '''
+        Give the blocks stored before heights were recorded consecutive heights
+    '''
+    Block = apps.get_model('Block', 'Block')
+    for height, block in enumerate(Block.objects.order_by('id')):
+        block.height = height
+        block.save(update_fields=['height'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Block', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='block',
+            old_name='hashValue',
+            new_name='hash',
+        ),
+        migrations.AlterModelOptions(
+            name='block',
+            options={'ordering': ['-height'], 'verbose_name_plural': 'blocks'},
+        ),
+        migrations.RemoveField(
+            model_name='block',
+            name='header',
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='generator',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='height',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='merkle_root',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='previous_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='status',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='timestamp',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='block',
+            name='hash',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('tx_id', models.CharField(max_length=64, unique=True)),
+                ('transaction_type', models.CharField(db_index=True, max_length=16)),
+                ('generator', models.TextField(blank=True)),
+                ('name', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('public_key', models.TextField(blank=True)),
+                ('inputs', models.TextField(blank=True)),
+                ('outputs', models.TextField(blank=True)),
+                ('timestamp', models.PositiveIntegerField()),
+                ('block', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='Block.block')),
+            ],
+            options={
+                'verbose_name_plural': 'transactions',
+                'ordering': ['block', 'position'],
+                'unique_together': {('block', 'position')},
+            },
+        ),
+        migrations.RunPython(number_blocks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='block',
+            name='height',
+            field=models.PositiveIntegerField(unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Block', '0002_explorer_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='success',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Block', '0003_transaction_success'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('height', models.IntegerField(default=-1)),
+            ],
+        ),
+    ]
@@ -2,10 +2,51 @@ from django.db import models
 
 # Create your models here.
 class Block(models.Model):
-    header = models.CharField(max_length=25)
-    hashValue = models.CharField(max_length=25)
+    height = models.PositiveIntegerField(unique=True)
+    hash = models.CharField(max_length=64, unique=True)
+    previous_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    merkle_root = models.CharField(max_length=64, blank=True)
+    generator = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, blank=True)
+    # Unix time the block was created, as stored on the chain
+    timestamp = models.PositiveIntegerField()
 
     def __str__(self):
-        return self.header
+        return "Block %d" % self.height
     class Meta:
         verbose_name_plural = 'blocks'
+        ordering = ['-height']
+
+
+class Transaction(models.Model):
+    block = models.ForeignKey(Block, related_name='transactions', on_delete=models.CASCADE)
+    # Index of the transaction inside its block
+    position = models.PositiveIntegerField()
+    tx_id = models.CharField(max_length=64, unique=True)
+    # The PKI operation: REGISTER, QUERY, VALIDATE, UPDATE or REVOKE
+    transaction_type = models.CharField(max_length=16, db_index=True)
+    generator = models.TextField(blank=True)
+    name = models.CharField(max_length=255, blank=True, db_index=True)
+    public_key = models.TextField(blank=True)
+    inputs = models.TextField(blank=True)
+    outputs = models.TextField(blank=True)
+    # Whether the outputs report the operation as successful
+    success = models.BooleanField(default=True)
+    timestamp = models.PositiveIntegerField()
+
+    def __str__(self):
+        return self.tx_id
+    class Meta:
+        verbose_name_plural = 'transactions'
+        ordering = ['block', 'position']
+        unique_together = ('block', 'position')
+
+
+class IngestCursor(models.Model):
+    # A chain store path or validator address that blocks are ingested from
+    source = models.CharField(max_length=255, unique=True)
+    # Position of the last ingested block in the source, -1 before the first one
+    height = models.IntegerField(default=-1)
+
+    def __str__(self):
+        return "%s @ %d" % (self.source, self.height)
@@ -1,3 +1,158 @@
+import json
+import os
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
+from .models import Block, Transaction, IngestCursor
+from .views import PAGE_SIZE
+
 # Create your tests here.
+def make_chain(length, txs_per_block=0):
+    previous_hash = ""
+    for height in range(length):
+        block = Block.objects.create(height=height, hash="%064x" % height,
+                                     previous_hash=previous_hash, timestamp=1556000000 + height)
+        for position in range(txs_per_block):
+            Transaction.objects.create(block=block, position=position,
+                                       tx_id="%032x%032x" % (height, position),
+                                       transaction_type="REGISTER", name="user_%d_%d" % (height, position),
+                                       timestamp=block.timestamp)
+        previous_hash = block.hash
+
+
+class ExplorerTests(TestCase):
+    def test_index_keyset_pages(self):
+        make_chain(PAGE_SIZE + 5)
+        response = self.client.get('/')
+        blocks = response.context['blocks']
+        self.assertEqual(blocks[0].height, PAGE_SIZE + 4)
+        self.assertEqual(len(blocks), PAGE_SIZE)
+        self.assertEqual(response.context['before'], 5)
+
+        response = self.client.get('/', {'before': response.context['before']})
+        self.assertEqual([b.height for b in response.context['blocks']], [4, 3, 2, 1, 0])
+        self.assertIsNone(response.context['before'])
+
+    def test_block_transactions_pages(self):
+        make_chain(1, txs_per_block=PAGE_SIZE + 1)
+        response = self.client.get('/block/0')
+        self.assertEqual(response.context['transactions'][0].position, 0)
+        after = response.context['after']
+        response = self.client.get('/block/0', {'after': after})
+        self.assertEqual([tx.position for tx in response.context['transactions']], [PAGE_SIZE])
+
+    def test_transaction_view(self):
+        make_chain(1, txs_per_block=1)
+        tx = Transaction.objects.get()
+        response = self.client.get('/transaction/%s' % tx.tx_id)
+        self.assertContains(response, tx.name)
+        self.assertEqual(self.client.get('/transaction/missing').status_code, 404)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_chain(3, txs_per_block=1)
+
+    def test_block_by_height_and_hash(self):
+        response = self.client.get('/api/block/1')
+        self.assertEqual(response.json()['hash'], "%064x" % 1)
+        response = self.client.get('/api/block/hash/%064x' % 2)
+        self.assertEqual(response.json()['height'], 2)
+        self.assertEqual(self.client.get('/api/block/7').status_code, 404)
+
+    def test_latest_blocks(self):
+        response = self.client.get('/api/blocks/latest', {'count': 2})
+        self.assertEqual([b['height'] for b in response.json()['blocks']], [2, 1])
+
+    def test_conditional_get_and_cache(self):
+        response = self.client.get('/api/block/0')
+        etag = response['ETag']
+        response = self.client.get('/api/block/0', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # A cached response only costs the chain height lookup
+        with self.assertNumQueries(1):
+            self.client.get('/api/block/0')
+        # A new block changes the ETag, even when written without model signals
+        Block.objects.bulk_create([Block(height=3, hash="%064x" % 3, timestamp=1556000003)])
+        response = self.client.get('/api/block/0', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_key_by_name(self):
+        tx = Transaction.objects.get(block__height=1)
+        tx.public_key = "KEY"
+        tx.save()
+        data = self.client.get('/api/key/%s' % tx.name).json()
+        self.assertEqual(data['public_key'], "KEY")
+        self.assertFalse(data['revoked'])
+        self.assertEqual(self.client.get('/api/key/nobody').status_code, 404)
+
+        # The same key revoked with other line endings and indentation
+        tx.public_key = "-----BEGIN KEY-----\nKEY\n-----END KEY-----\n"
+        tx.save()
+        Block.objects.bulk_create([Block(height=3, hash="%064x" % 3, timestamp=1556000003)])
+        Transaction.objects.create(block=Block.objects.get(height=3), position=0, tx_id="revoke",
+                                   transaction_type="REVOKE", success=True, timestamp=1556000003,
+                                   public_key="  -----BEGIN KEY-----\r\n  KEY\r\n  -----END KEY-----")
+        self.assertTrue(self.client.get('/api/key/%s' % tx.name).json()['revoked'])
+
+    def test_query_strings_do_not_add_cache_entries(self):
+        self.client.get('/api/block/0')
+        keys = set(cache._cache)
+        for i in range(5):
+            self.client.get('/api/block/0', {'junk': i})
+        self.assertEqual(set(cache._cache), keys)
+        # Counts are clamped before they are part of the key
+        self.assertEqual(len(self.client.get('/api/blocks/latest', {'count': 1000}).json()['blocks']), 3)
+        self.assertEqual(len(self.client.get('/api/blocks/latest', {'count': 1}).json()['blocks']), 1)
+        self.client.get('/api/blocks/latest', {'count': 5000})
+        self.assertEqual(len(cache._cache), len(keys) + 2)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        sys.path.append(settings.BLOCKCHAIN_SRC)
+        from block import Block as ChainBlock
+        from chainstore import ChainStore
+        from transaction import Transaction as ChainTransaction
+
+        self.store = ChainStore(tempfile.mkdtemp())
+        previous_hash = ""
+        for height in range(5):
+            txs = [ChainTransaction(inputs=json.dumps({"REGISTER": {"name": "user_%d_%d" % (height, i),
+                                                                    "public_key": "KEY_%d_%d" % (height, i)}}),
+                                    outputs=json.dumps({"REGISTER": {"success": True}}))
+                   for i in range(3)]
+            block = ChainBlock(id=height, transactions=txs, previous_hash=previous_hash)
+            self.store.append(block)
+            previous_hash = block.hash
+
+    def test_ingest_and_resume(self):
+        call_command('ingest_chain', path=self.store.path, batch_size=2, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Block.objects.count(), 5)
+        self.assertEqual(Transaction.objects.count(), 15)
+        self.assertEqual(Transaction.objects.get(name="user_4_2").public_key, "KEY_4_2")
+        self.assertEqual(IngestCursor.objects.get().height, 4)
+
+        # Only blocks after the cursor are ingested on the next run
+        from block import Block as ChainBlock
+        self.store.append(ChainBlock(id=5, transactions=[], previous_hash=Block.objects.get(height=4).hash))
+        call_command('ingest_chain', path=self.store.path, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Block.objects.count(), 6)
+        self.assertEqual(IngestCursor.objects.get().height, 5)
+
+    def test_ingest_pruned_store(self):
+        # Archived bodies are read back, blocks pruned without an archive keep their header only
+        self.store.prune(2, archive=False)
+        self.store.prune(4)
+        call_command('ingest_chain', path=self.store.path, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Block.objects.count(), 5)
+        self.assertEqual(Block.objects.get(height=0).hash, next(self.store.read(0, 1)).hash)
+        self.assertEqual(sorted(set(Transaction.objects.values_list('block__height', flat=True))), [2, 3, 4])
+        self.assertEqual(IngestCursor.objects.get().height, 4)
@@ -1,7 +1,12 @@
 from django.urls import path
-from . import views
+from . import views, api
 urlpatterns = [
-    path('', views.index),
-    path('transaction',views.TransactionView, name="transaction"),
-    path('block',views.BlockView, name ="block")
+    path('', views.index, name="index"),
+    path('transaction/<str:tx_id>', views.TransactionView, name="transaction"),
+    path('block/<int:height>', views.BlockView, name ="block"),
+    path('api/blocks/latest', api.latest_blocks, name="api-latest-blocks"),
+    path('api/block/<int:height>', api.block_by_height, name="api-block"),
+    path('api/block/hash/<str:hash>', api.block_by_hash, name="api-block-hash"),
+    path('api/transaction/<str:tx_id>', api.transaction_by_id, name="api-transaction"),
+    path('api/key/<str:name>', api.key_by_name, name="api-key")
 ]
@@ -1,12 +1,40 @@
-from django.shortcuts import render
-import requests
-from .models import Block
+from django.shortcuts import render, get_object_or_404
+from .models import Block, Transaction
 from .forms import BlockForm
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
 
 
-import json
+# Number of rows shown on each explorer page
+PAGE_SIZE = 25
+
+
+def keyset_page(queryset, key, cursor, descending=True):
+    '''
+    Fetch one page of an ordered queryset starting after cursor.
+
+    Pages are found with an indexed WHERE on key instead of OFFSET, so the
+    cost of a page does not grow with how far into the chain it is.
+    Returns the rows and the cursor of the next page (None on the last page).
+    '''
+    if cursor is not None:
+        lookup = '%s__lt' % key if descending else '%s__gt' % key
+        queryset = queryset.filter(**{lookup: cursor})
+    queryset = queryset.order_by('-' + key if descending else key)
+    # Fetch one extra row to find out whether there is a next page
+    rows = list(queryset[:PAGE_SIZE + 1])
+    next_cursor = None
+    if len(rows) > PAGE_SIZE:
+        rows = rows[:PAGE_SIZE]
+        next_cursor = getattr(rows[-1], key)
+    return rows, next_cursor
+
+
+def int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
 
 # Create your views here.
 @csrf_exempt
@@ -16,44 +44,39 @@ def index(request):
 
         print("Hit the post method")
         form = BlockForm(request.POST)
-        form.save()
+        if form.is_valid():
+            form.save()
 
     form = BlockForm()
 
-    blocks = Block.objects.all()
+    # Latest blocks first, older pages are requested with ?before=<height>
+    blocks, before = keyset_page(Block.objects.all(), 'height', int_param(request, 'before'))
 
     context = {
         'blocks' : blocks,
+        'before' : before,
         'form' : form
         }
 
     return render(request, 'Block_Templates/block.html', context)
 
-#@csrf_exempt is required for making post requests
-@csrf_exempt
-def BlockView(request):
-    block = ""
-    hashVal = ""
-    context = {"Block" : "Test"}
-
+def BlockView(request, height):
+    block = get_object_or_404(Block, height=height)
 
-    if request.method == 'POST':
-        form = BlockForm(request.POST)
-        form.save()
-        block = request.POST.get("block")
-        hashVal = request.POST.get("hash")
-        context = {"Block" : "{0},{1}".format(block,hashVal)}
-
-    return render(request, 'Block_Templates/block.html', context)
+    # Transactions in block order, later pages are requested with ?after=<position>
+    transactions, after = keyset_page(block.transactions.all(), 'position',
+                                      int_param(request, 'after'), descending=False)
 
-def TransactionView(request):
-    return JsonResponse(context)
-
-    '''block_list = []
-    for block in range(0,10):
+    context = {
+        'block' : block,
+        'transactions' : transactions,
+        'after' : after
+        }
 
-        myBlock = {
+    return render(request, 'Block_Templates/block_detail.html', context)
 
-        }
-        block_list.append(myBlock)
-    context = {'Blocks': block_list}'''
+def TransactionView(request, tx_id):
+    transaction = get_object_or_404(
+        Transaction.objects.select_related('block'), tx_id=tx_id)
+    context = {'transaction' : transaction}
+    return render(request, 'Block_Templates/transaction.html', context)
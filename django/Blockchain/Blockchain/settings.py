@@ -82,6 +82,27 @@ DATABASES = {
 }
 
 
+# Blockchain
+# Where the node sources live and the default chain store the ingest_chain command follows
+
+BLOCKCHAIN_SRC = os.path.join(BASE_DIR, '..', '..', 'src')
+
+BLOCKCHAIN_CHAIN_PATH = '~/.BlockchainPKI/chain/'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# The JSON API caches responses per chain height. Use a shared backend such as
+# memcached when running more than one worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blockchain-api',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -1,15 +1,19 @@
 import requests
 import json
+import time
 from django.views.decorators.csrf import csrf_exempt
 
 #@csrf_exempt is required for making post requests
 @csrf_exempt
 def addBlock():
-    blockInput = input("Enter block ID: \n")
+    blockInput = input("Enter block height: \n")
     hashInput = input("Enter hash:  \n")
+    previousInput = input("Enter previous hash:  \n")
     p = {
-        "header":"{0}".format(blockInput),
-        "hashValue":"{0}".format(hashInput),
+        "height":"{0}".format(blockInput),
+        "hash":"{0}".format(hashInput),
+        "previous_hash":"{0}".format(previousInput),
+        "timestamp":"{0}".format(int(time.time())),
          }
     r = requests.post("http://127.0.0.1:8000/", data=p)
     #data = r.json()
@@ -0,0 +1,168 @@
+from client import Client, BATCH_SIZE, BATCH_FLUSH_INTERVAL
+from block import Block
+
+from collections import namedtuple
+from threading import Thread
+
+import asyncio
+
+
+class Confirmation(namedtuple('Confirmation', ['height', 'block_hash', 'merkle_root', 'tx_hash', 'proof'])):
+    '''
+        Where a transaction was confirmed: the block it landed in and the merkle
+        proof of its inclusion
+    '''
+    __slots__ = ()
+
+    def verify(self):
+        '''
+            Whether the merkle proof links the transaction to the merkle root of the block
+        '''
+        return Block.verify_merkle_proof(self.tx_hash, self.proof, self.merkle_root)
+
+
+class AsyncClient:
+    '''
+        An asyncio interface to a Client
+
+        submit() returns a future that resolves with a Confirmation once the
+        transaction is appended to the local chain. Transactions submitted
+        together are sent to the validators in batches from a worker thread, and
+        confirmations are matched by transaction id as blocks arrive, so the
+        number of transactions in flight is only bounded by memory.
+    '''
+
+    def __init__(self, client=None, loop=None, batch_size=BATCH_SIZE, flush_interval=BATCH_FLUSH_INTERVAL):
+        '''
+            :param Client client: The client to send through, a new one is created if not given
+            :param loop: The event loop the futures belong to. Defaults to the running loop,
+                         so without one the client has to be created from a coroutine.
+            :param int batch_size: The most transactions sent in one message
+            :param float flush_interval: Longest time a transaction waits for its batch to fill up
+        '''
+        self.client = client or Client()
+        self.loop = loop or asyncio.get_running_loop()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = dict()  # transaction id -> future
+        self.outbox = list()  # transactions waiting to be sent
+        self.flush_handle = None
+        # Blocks are appended by the client's receive thread
+        self.client.blockchain.listeners.append(self.block_appended)
+
+    def start(self):
+        '''
+            Start receiving blocks from the validators in the background, and ask
+            them for the blocks after the end of the local chain
+
+            :return: asyncio.Future of the sync request being sent
+        '''
+        Thread(target=self.client.receive, daemon=True).start()
+        chain = self.client.blockchain
+        last_block = chain.last_block
+        request = self.client.sync_request(last_block.id if last_block else max(chain.pki.height, 0))
+        return self.loop.run_in_executor(None, self.client.broadcast_transaction, request)
+
+    def submit(self, tx):
+        '''
+            Send a transaction to the validator network
+
+            :param Transaction tx: The transaction to send
+            :return: asyncio.Future resolving with the Confirmation of tx
+        '''
+        future = self.pending.get(tx.transaction_id)
+        if future is not None:
+            return future
+        future = self.loop.create_future()
+        height = self.client.blockchain.transaction_height(tx.transaction_id)
+        if height is not None:
+            # Already committed, there is nothing to send
+            block = self.client.blockchain.block_at(height, archived=True)
+            if block is None or block.pruned:
+                future.set_exception(LookupError(
+                    "Transaction %s was committed at height %d, its block is not available" % (
+                        tx.transaction_id, height)))
+            else:
+                index = next(i for i, t in enumerate(block.transactions) if t.transaction_id == tx.transaction_id)
+                future.set_result(self.confirmation(block, index))
+            return future
+        self.pending[tx.transaction_id] = future
+        self.outbox.append(tx)
+        if len(self.outbox) >= self.batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.flush_interval, self.flush)
+        return future
+
+    async def confirm(self, tx, timeout=None):
+        '''
+            Submit a transaction and wait for its confirmation
+
+            :param float timeout: Seconds to wait before raising asyncio.TimeoutError
+            :return: Confirmation
+        '''
+        return await asyncio.wait_for(asyncio.shield(self.submit(tx)), timeout)
+
+    def flush(self):
+        '''
+            Send the transactions waiting in the outbox as one batch
+        '''
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.outbox = self.outbox, list()
+        if batch:
+            # The sockets block, so the batch is sent from the default executor
+            sending = self.loop.run_in_executor(None, self.client.deliver, batch)
+            sending.add_done_callback(lambda sent: self.sent(batch, sent))
+
+    def sent(self, batch, sending):
+        '''
+            Fail the futures of a batch that could not be sent or that no validator
+            took, the others wait for their block
+        '''
+        if sending.cancelled():
+            return
+        error = sending.exception()
+        if error is None:
+            if sending.result():
+                return
+            error = ConnectionError("No validator took the transactions")
+        for tx in batch:
+            future = self.pending.pop(tx.transaction_id, None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def block_appended(self, block):
+        # Called from the receive thread, futures may only be touched on the loop
+        self.loop.call_soon_threadsafe(self.resolve, block)
+
+    def resolve(self, block):
+        '''
+            Resolve the futures of the pending transactions included in block
+        '''
+        if not self.pending:
+            return
+        for index, tx in enumerate(block.transactions):
+            future = self.pending.pop(getattr(tx, 'transaction_id', None), None)
+            if future is None or future.done():
+                continue
+            future.set_result(self.confirmation(block, index))
+
+    @staticmethod
+    def confirmation(block, index):
+        '''
+            The Confirmation of the transaction at index in block
+        '''
+        return Confirmation(block.id, block.hash, block.merkle_root,
+                            block.sha256_txs[index], block.merkle_proof(index))
+
+    def close(self):
+        '''
+            Send any waiting transactions and cancel the ones that were never confirmed
+        '''
+        self.flush()
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.client.blockchain.listeners.remove(self.block_appended)
@@ -76,7 +76,8 @@ class Block:
 
         return self.compute_merkle_root(new_tx_hashes)
 
-    def hash_2_txs(self, hash1, hash2):
+    @staticmethod
+    def hash_2_txs(hash1, hash2):
         # Reverse inputs before and after hashing because of the big-edian and little-endian problem
         h1 = hash1[::-1]
         h2 = hash2[::-1]
@@ -84,11 +85,92 @@ class Block:
 
         return hash_return.hexdigest()[::-1]
 
+    def merkle_proof(self, index):
+        '''
+            The sibling hashes linking transaction index to the merkle root
+
+            :param int index: The position of the transaction in the block
+            :return: list of (sibling hash, bool) pairs from the leaf up, the bool
+                     is True when the sibling is the left side of the pair
+        '''
+        proof = []
+        level = list(self.sha256_txs)
+        while len(level) > 1:
+            if len(level) % 2 == 1:
+                # The last item of an odd level is paired with itself
+                level.append(level[-1])
+            sibling = index ^ 1
+            proof.append((level[sibling], sibling < index))
+            level = [self.hash_2_txs(level[i], level[i + 1])
+                     for i in range(0, len(level), 2)]
+            index //= 2
+        return proof
+
+    @classmethod
+    def verify_merkle_proof(cls, tx_hash, proof, merkle_root):
+        '''
+            Whether proof links tx_hash to merkle_root
+
+            :param str tx_hash: The hash of the transaction
+            :param list proof: The proof returned by merkle_proof()
+            :param str merkle_root: The merkle root of the block
+        '''
+        for sibling, is_left in proof:
+            if is_left:
+                tx_hash = cls.hash_2_txs(sibling, tx_hash)
+            else:
+                tx_hash = cls.hash_2_txs(tx_hash, sibling)
+        return tx_hash == merkle_root
+
     def compute_hash(self):
         block_info = str(pickle.dumps(self))
         hash_256 = sha256(block_info.encode()).hexdigest()
         return hash_256
 
+    @property
+    def pruned(self):
+        '''
+            Whether the transaction bodies of the block were dropped
+        '''
+        return self.transactions is None
+
+    def header(self):
+        '''
+            A copy of the block without its transaction bodies
+
+            The hash, merkle root and transaction hashes are kept, so the copy still
+            links the chain and proves which transactions the block held.
+        '''
+        header = object.__new__(type(self))
+        header.__dict__.update(self.__dict__)
+        header.transactions = None
+        return header
+
+    def verify(self):
+        '''
+            Whether the merkle root and the hash of the block match its contents
+
+            The hash of a pruned block covers the dropped bodies and cannot be
+            recomputed, only its merkle root is checked against the transaction hashes.
+        '''
+        if self.pruned:
+            return self.merkle_root == (self.compute_merkle_root(self.sha256_txs) if self.sha256_txs
+                                        else sha256("0".encode()).hexdigest())
+        tx_hashes = [tx.compute_hash() for tx in self.transactions]
+        if tx_hashes != self.sha256_txs:
+            return False
+        if tx_hashes:
+            merkle_root = self.compute_merkle_root(tx_hashes)
+        else:
+            merkle_root = sha256("0".encode()).hexdigest()
+        if merkle_root != self.merkle_root:
+            return False
+        # The hash was computed over every other attribute
+        unhashed = object.__new__(type(self))
+        unhashed.__dict__.update((attr, value) for attr, value in self.__dict__.items()
+                                 if attr != 'hash')
+        return unhashed.compute_hash() == self.hash
+
     def __eq__(self, other):
         return self.compute_hash() == other.compute_hash()
 
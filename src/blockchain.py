@@ -1,9 +1,13 @@
 from block import Block
 from transaction import Transaction
+from pkistate import PKIState
 
 import json
 import time
 
+# Blocks between two prunes of a chain kept with a pruning horizon
+PRUNE_INTERVAL = 1000
+
 NOAH_PUBLIC_KEY = """-----BEGIN PUBLIC KEY-----
                      MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDQYD1K9cQt+FLYL4WsiiuDhsE6
                      ut40BWhbkpk0yIfuZX13bg4sQ1aL5AKFswzvEGMM9ACNg6AYh2DOdWDKEkQVGLdD
@@ -28,9 +32,34 @@ class Blockchain:
     chain = []
     block_index = 0
 
-    def __init__(self):
+    def __init__(self, store=None, checkpoints=None, prune_horizon=None):
+        '''
+            :param ChainStore store: Where appended blocks are persisted, if anywhere
+            :param CheckpointStore checkpoints: Where PKI state checkpoints are kept, if anywhere.
+                                                When given, only the blocks after the latest
+                                                checkpoint are loaded from the store.
+            :param int prune_horizon: If given, the transaction bodies of blocks this many
+                                      blocks deep are archived every PRUNE_INTERVAL blocks
+        '''
         self.unconfirmed_transactions = []
+        # Replaying blocks that are already stored writes neither blocks nor checkpoints,
+        # so loading a chain to read it (client.py query) leaves the disk as it was
+        self.store = None
+        self.checkpoints = None
+        self.prune_horizon = prune_horizon
         self.chain = []
+        self.pki = PKIState()
+        # Callables notified with every block appended to the chain
+        self.listeners = []
+
+        if store is not None:
+            if checkpoints is not None:
+                self.pki = checkpoints.latest(store) or self.pki
+            # Resume from the blocks that were persisted by a previous run
+            for block in store.read(self.pki.height + 1):
+                self.append(block)
+        self.store = store
+        self.checkpoints = checkpoints
         # self.create_genesis_block()
 
     def create_genesis_block(self):
@@ -72,7 +101,148 @@ class Blockchain:
             nonce=0,
             status="Confirmed"
         )
-        self.chain.append(genesis_block)
+        self.append(genesis_block)
+
+    def append(self, block):
+        '''
+            Append a block to the end of the chain, update the PKI state and persist both
+
+            :param Block block: The block to append
+        '''
+        self.chain.append(block)
+        self.pki.apply_block(block)
+        if self.store is not None:
+            self.store.append(block)
+        if self.checkpoints is not None and self.checkpoints.due(self.pki):
+            self.checkpoints.save(self.pki)
+        if self.prune_horizon is not None and (self.pki.height + 1) % PRUNE_INTERVAL == 0:
+            self.prune(self.prune_horizon)
+        for listener in self.listeners:
+            listener(block)
+
+    def validate(self, block, verified=False):
+        '''
+            Whether block extends the chain and matches its own hashes
+
+            :param Block block: A block received for the end of the chain
+            :param bool verified: Whether the hashes of block were checked already,
+                                  then only its place in the chain is
+        '''
+        if block.pruned:
+            # Received blocks are applied to the PKI state, they need their bodies
+            return False
+        if block.id != self.pki.height + 1:
+            # Its id would not match the height it is applied at
+            return False
+        last_block = self.last_block
+        # Without loaded blocks the chain ends at the checkpointed state, if any
+        expected = last_block.hash if last_block else self.pki.hash
+        if expected is not None and block.previous_hash != expected:
+            return False
+        if verified:
+            return True
+        return block.verify() and all(tx.verify() for tx in block.transactions)
+
+    def block_at(self, height, archived=False):
+        '''
+            The block at position height, from memory or from the store
+
+            :param bool archived: Whether a pruned block is read back whole from the archive
+            :return: Block, or None if the block is neither loaded nor stored
+        '''
+        # The loaded blocks are the last ones of the chain, the rest were covered by a checkpoint
+        first = self.pki.height - len(self.chain) + 1
+        block = None
+        if first <= height <= self.pki.height:
+            block = self.chain[height - first]
+        elif self.store is not None and 0 <= height:
+            block = next(self.store.read(height, height + 1), None)
+        if archived and block is not None and block.pruned and self.store is not None:
+            return self.store.archived_block(height) or block
+        return block
+
+    def blocks(self, start=0):
+        '''
+            Yield the blocks from position start to the end of the chain, reading the
+            ones that are not loaded from the store
+
+            :param int start: The height of the first block
+        '''
+        first = self.pki.height - len(self.chain) + 1
+        if start < first and self.store is not None:
+            yield from self.store.read(max(0, start), first)
+        yield from self.chain[max(0, start - first):]
+
+    def transaction_height(self, tx_id):
+        '''
+            The height of the block holding a committed transaction
+
+            :param str tx_id: The transaction id
+            :return: int, or None if the transaction has not been committed
+        '''
+        return self.pki.transactions.get(tx_id)
+
+    def is_committed(self, tx_id):
+        return tx_id in self.pki.transactions
+
+    def get_transaction(self, tx_id):
+        '''
+            Look up a committed transaction by id
+
+            :param str tx_id: The transaction id
+            :return: Transaction, or None if it is unknown
+        '''
+        height = self.transaction_height(tx_id)
+        block = self.block_at(height, archived=True) if height is not None else None
+        if block is None or block.pruned:
+            return None
+        for tx in block.transactions:
+            if tx.transaction_id == tx_id:
+                return tx
+        return None
+
+    def prune(self, horizon, archive=True):
+        '''
+            Drop the transaction bodies of the blocks more than horizon blocks deep
+
+            Headers, merkle roots and the PKI state, including the transaction index,
+            are kept. A stored chain is replayed from its latest checkpoint at startup,
+            so the store is only pruned up to that checkpoint.
+
+            :param int horizon: Number of blocks at the end of the chain left whole
+            :param bool archive: Whether to archive the bodies so they can be restored
+            :return: int, the height of the first block of the chain left whole
+        '''
+        stop = max(0, self.pki.height + 1 - horizon)
+        first = self.pki.height - len(self.chain) + 1
+        for i in range(max(0, stop - first)):
+            if not self.chain[i].pruned:
+                self.chain[i] = self.chain[i].header()
+        if self.store is not None:
+            heights = self.checkpoints.heights() if self.checkpoints is not None else []
+            self.store.prune(min(stop, heights[0] + 1 if heights else 0), archive)
+        return stop
+
+    def restore(self, start=0, stop=None):
+        '''
+            Put back the archived transaction bodies of the blocks from start up to stop
+
+            Whole archived ranges are restored, see ChainStore.restore.
+
+            :return: int, the number of blocks restored
+        '''
+        if self.store is None:
+            return 0
+        restored = self.store.restore(start, stop)
+        first = self.pki.height - len(self.chain) + 1
+        stop = self.pki.height + 1 if stop is None else stop
+        pruned = [i for i, block in enumerate(self.chain) if block.pruned and start <= first + i < stop]
+        if pruned:
+            blocks = self.store.read(first + pruned[0], first + pruned[-1] + 1)
+            for i, block in enumerate(blocks, pruned[0]):
+                if self.chain[i].pruned and not block.pruned:
+                    self.chain[i] = block
+        return restored
 
     # last_block() returns the last block of the chain
     @property
@@ -109,7 +279,7 @@ class Blockchain:
          #   return False
 
         if block.hash == consensus_hash:
-            self.chain.append(block)
+            self.append(block)
             self.block_index = self.block_index + 1
             return True
         else:
@@ -0,0 +1,86 @@
+from hashlib import sha256
+
+import os
+
+
+class CAStore:
+    '''
+        An index of the CA certificates in a capath directory, keyed by fingerprint
+
+        The directory is scanned once; after that duplicate detection is a dict
+        lookup and new certificates are added without rereading the others.
+    '''
+
+    def __init__(self, capath):
+        '''
+            :param str capath: The directory holding the Validators CAs
+        '''
+        self.capath = capath
+        self.fingerprints = dict()  # fingerprint -> path of the certificate file
+        self.paths = set()  # files that have already been indexed
+
+    @staticmethod
+    def fingerprint(data):
+        '''
+            The SHA-256 fingerprint of a certificate
+
+            PEM certificates are fingerprinted over their DER encoding so that
+            differences in line endings or trailing whitespace do not matter.
+
+            :param bytes data: The certificate file contents
+        '''
+        import ssl
+
+        try:
+            data = ssl.PEM_cert_to_DER_cert(data.decode().strip())
+        except (ValueError, UnicodeDecodeError):
+            pass
+        return sha256(data).hexdigest()
+
+    def scan(self):
+        '''
+            Index any .pem files in capath that have not been seen yet
+
+            :return: list of paths that were newly indexed
+        '''
+        new = list()
+        if not os.path.exists(self.capath):
+            return new
+        for name in os.listdir(self.capath):
+            path = os.path.join(self.capath, name)
+            if not name.endswith('.pem') or path in self.paths:
+                continue
+            with open(path, 'rb') as f:
+                fp = self.fingerprint(f.read())
+            self.paths.add(path)
+            self.fingerprints.setdefault(fp, path)
+            new.append(path)
+        return new
+
+    def __contains__(self, data):
+        return self.fingerprint(data) in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __iter__(self):
+        return iter(self.fingerprints.values())
+
+    def add(self, data):
+        '''
+            Save a certificate into capath unless it is already indexed
+
+            :param bytes data: The certificate file contents
+            :return: str (the path of the existing or new file), bool (whether it was added)
+        '''
+        fp = self.fingerprint(data)
+        if fp in self.fingerprints:
+            return self.fingerprints[fp], False
+
+        # Name the file after its fingerprint so the name can never clash
+        path = os.path.join(self.capath, "%s.pem" % fp[:32])
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.paths.add(path)
+        self.fingerprints[fp] = path
+        return path, True
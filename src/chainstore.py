@@ -0,0 +1,265 @@
+import codec
+
+import os
+import json
+import shutil
+import struct
+
+# Each record in the data file is a 4 byte length followed by the encoded block
+RECORD_HEADER = struct.Struct('!I')
+# The index file holds the 8 byte offset of every record, so block n is at n * 8
+INDEX_ENTRY = struct.Struct('!Q')
+# Bytes copied at a time when a store is rewritten
+COPY_SIZE = 1 << 20
+
+
+class ChainStore:
+    '''
+        Append-only on-disk storage of the blocks of a chain
+
+        Blocks are kept in order in chain.dat and located through the fixed-size
+        offsets in chain.idx, so reading from any height is a single seek.
+        A store is written by one process and can be followed by others.
+
+        The transaction bodies of old blocks can be pruned, leaving their headers
+        in place. Pruned ranges are listed in pruned.json, and the full blocks of a
+        range are kept in archive/ unless they were dropped outright.
+    '''
+
+    def __init__(self, path="~/.BlockchainPKI/chain/", compress=True):
+        '''
+            :param str path: The directory holding the chain files
+            :param bool compress: Whether to compress the stored blocks
+        '''
+        self.path = os.path.expanduser(path)
+        self.compress = compress
+        self.data_path = os.path.join(self.path, "chain.dat")
+        self.index_path = os.path.join(self.path, "chain.idx")
+        self.pruned_path = os.path.join(self.path, "pruned.json")
+        self.archive_path = os.path.join(self.path, "archive")
+        # Present while the new files of a rewrite are being swapped in
+        self.rewrite_path = os.path.join(self.path, "rewrite")
+        if os.path.exists(self.rewrite_path):
+            self.finish_rewrite()
+
+    def create(self):
+        '''
+            Create the directory of the store, which waits for the first write so
+            that reading a store that does not exist leaves no trace
+        '''
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def __len__(self):
+        '''
+            The number of blocks in the store
+        '''
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+    def append(self, block):
+        '''
+            Append a block to the end of the store
+
+            :param Block block: The block to store
+        '''
+        payload = codec.encode(block, compress=self.compress)
+        self.create()
+        with open(self.data_path, 'ab') as data:
+            offset = data.tell()
+            data.write(RECORD_HEADER.pack(len(payload)) + payload)
+        # The index is written last, so readers never see a partially written block
+        with open(self.index_path, 'ab') as index:
+            index.write(INDEX_ENTRY.pack(offset))
+
+    def extend(self, blocks):
+        '''
+            Append several blocks with a single write to each file
+
+            :param list blocks: The blocks to store, in chain order
+        '''
+        if not blocks:
+            return
+        records, offsets = bytearray(), bytearray()
+        self.create()
+        with open(self.data_path, 'ab') as data:
+            offset = data.tell()
+            for block in blocks:
+                payload = codec.encode(block, compress=self.compress)
+                offsets += INDEX_ENTRY.pack(offset + len(records))
+                records += RECORD_HEADER.pack(len(payload)) + payload
+            data.write(records)
+        with open(self.index_path, 'ab') as index:
+            index.write(offsets)
+
+    def read(self, start=0, stop=None):
+        '''
+            Yield the blocks from position start up to (not including) stop
+
+            :param int start: The position of the first block
+            :param int stop: The position to stop at, defaults to the end of the store
+        '''
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return
+        with open(self.index_path, 'rb') as index:
+            index.seek(start * INDEX_ENTRY.size)
+            offset, = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+        with open(self.data_path, 'rb') as data:
+            data.seek(offset)
+            for _ in range(start, stop):
+                length, = RECORD_HEADER.unpack(data.read(RECORD_HEADER.size))
+                # The store is written by this node only, so blocks it pickled are trusted
+                yield codec.decode(data.read(length), accept_pickle=True)
+
+    def load(self):
+        '''
+            Read every block in the store
+
+            :return: list of Blocks
+        '''
+        return list(self.read())
+
+    def rewrite(self, start, blocks):
+        '''
+            Replace the blocks from position start with blocks for the same positions
+
+            The data file is copied around the replaced records and both files are
+            swapped in afterwards, so the rest of the store is left byte for byte.
+            Once both new files are written the swap is marked as started, and a
+            store opened after a crash during the swap completes it.
+
+            :param int start: The position of the first replaced block
+            :param list blocks: The new blocks, in chain order
+        '''
+        stop = start + len(blocks)
+        with open(self.index_path, 'rb') as index:
+            offsets = [offset for offset, in INDEX_ENTRY.iter_unpack(index.read())]
+        end = os.path.getsize(self.data_path)
+        head = offsets[start]
+        tail = offsets[stop] if stop < len(offsets) else end
+
+        records, new_offsets = bytearray(), list()
+        for block in blocks:
+            payload = codec.encode(block, compress=self.compress)
+            new_offsets.append(head + len(records))
+            records += RECORD_HEADER.pack(len(payload)) + payload
+        shift = len(records) - (tail - head)
+
+        with open(self.data_path, 'rb') as data, open(self.data_path + ".tmp", 'wb') as new_data:
+            copy(data, new_data, head)
+            new_data.write(records)
+            data.seek(tail)
+            copy(data, new_data, end - tail)
+        offsets[start:] = new_offsets + [offset + shift for offset in offsets[stop:]]
+        with open(self.index_path + ".tmp", 'wb') as new_index:
+            new_index.write(b''.join(INDEX_ENTRY.pack(offset) for offset in offsets))
+        open(self.rewrite_path, 'wb').close()
+        self.finish_rewrite()
+
+    def finish_rewrite(self):
+        '''
+            Swap in the new data and index files of a rewrite, see rewrite()
+        '''
+        for path in (self.data_path, self.index_path):
+            try:
+                os.replace(path + ".tmp", path)
+            except FileNotFoundError:
+                # Swapped in before the crash, or by another process following the store
+                pass
+        try:
+            os.remove(self.rewrite_path)
+        except FileNotFoundError:
+            pass
+
+    def pruned(self):
+        '''
+            The ranges of blocks whose transaction bodies were pruned
+
+            :return: list of (int start, int stop, bool archived), in chain order
+        '''
+        if not os.path.exists(self.pruned_path):
+            return []
+        with open(self.pruned_path, 'r') as f:
+            return [tuple(entry) for entry in json.load(f)]
+
+    def save_pruned(self, ranges):
+        with open(self.pruned_path + ".tmp", 'w') as f:
+            json.dump(sorted(ranges), f)
+        os.replace(self.pruned_path + ".tmp", self.pruned_path)
+
+    def archive(self, start, stop):
+        '''
+            The store holding the full blocks of an archived range
+        '''
+        return ChainStore(os.path.join(self.archive_path, "%012d-%012d" % (start, stop)), self.compress)
+
+    def prune(self, stop, archive=True):
+        '''
+            Drop the transaction bodies of every block below stop, keeping the headers
+
+            :param int stop: The position of the first block left whole
+            :param bool archive: Whether to keep the full blocks so they can be restored
+            :return: int, the number of blocks pruned
+        '''
+        stop = min(stop, len(self))
+        ranges = self.pruned()
+        # The runs of blocks below stop that still hold their bodies
+        runs, start = list(), 0
+        for begin, end, _ in ranges + [(stop, stop, False)]:
+            if start < min(begin, stop):
+                runs.append((start, min(begin, stop)))
+            start = max(start, end)
+
+        for start, end in runs:
+            blocks = list(self.read(start, end))
+            if archive:
+                self.archive(start, end).extend(blocks)
+            self.rewrite(start, [block.header() for block in blocks])
+            ranges.append((start, end, archive))
+            self.save_pruned(ranges)
+        return sum(end - start for start, end in runs)
+
+    def archived_block(self, height):
+        '''
+            The full block at height from the archive, without restoring it
+
+            :return: Block, or None if the block is not archived
+        '''
+        for start, stop, archived in self.pruned():
+            if archived and start <= height < stop:
+                return next(self.archive(start, stop).read(height - start, height - start + 1), None)
+        return None
+
+    def restore(self, start=0, stop=None):
+        '''
+            Put back the transaction bodies of the archived ranges overlapping start up to stop
+
+            Whole archived ranges are restored. Ranges pruned without an archive stay pruned.
+
+            :return: int, the number of blocks restored
+        '''
+        stop = len(self) if stop is None else stop
+        ranges, restored = self.pruned(), 0
+        for begin, end, archived in list(ranges):
+            if archived and begin < stop and start < end:
+                archive = self.archive(begin, end)
+                self.rewrite(begin, archive.load())
+                restored += end - begin
+                ranges.remove((begin, end, archived))
+                self.save_pruned(ranges)
+                shutil.rmtree(archive.path)
+        return restored
+
+
+def copy(source, destination, length):
+    '''
+        Copy length bytes from the position of source to destination
+    '''
+    while length > 0:
+        chunk = source.read(min(length, COPY_SIZE))
+        if not chunk:
+            break
+        destination.write(chunk)
+        length -= len(chunk)
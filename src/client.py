@@ -1,40 +1,63 @@
-from node import Node
+import time
+
+# Started before the other modules are imported, to time cold starts
+STARTED = time.perf_counter()
+
+from node import Node, Peer
 from block import Block
 from blockchain import Blockchain
 from transaction import Transaction
-import validator
+from chainstore import ChainStore
+from pkistate import CheckpointStore
+from peers import PeerDirectory
+import codec
 
-from Crypto import Random
-from Crypto.PublicKey import RSA
 from os.path import expanduser
 from threading import Thread
 
 import os
-import ssl
+import sys
 import json
-import time
 import errno
+import queue
+import shlex
 import socket
-import base64
 import pickle
+import contextlib
 
 BUFF_SIZE = 2048
+# The most transactions sent to the validators in one batch message
+BATCH_SIZE = 256
+# Seconds a transaction waits for its batch to fill up before it is sent anyway
+BATCH_FLUSH_INTERVAL = 0.05
+# How many more times a batch every validator was too busy for is sent, and the
+# seconds waited before the first retry (doubled after each one)
+BATCH_RETRIES = 3
+BATCH_RETRY_DELAY = 0.5
+# Commands accepted in batch mode and how many arguments they take
+BATCH_COMMANDS = {'register': 3, 'query': 2,
+                  'validate': 3, 'update': 4, 'revoke': 2}
 
 
 class Client(Node):
     def __init__(self, hostname=None, addr="0.0.0.0", port=4848, bind=True, capath="~/.BlockchainPKI/validators/",
-                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key"):
+                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key", compression=True):
         '''
             :param str name: A canonical name
             :param str addr: The ip address for serving inbound connections
             :param int port: The port for serving inbound connections
             :param str capath:
+            :param bool compression: Whether to offer compressed block and batch payloads
         '''
-        super().__init__(hostname=hostname, addr=addr, port=port,
-                         bind=bind, capath=capath, certfile=certfile, keyfile=keyfile)
+        super().__init__(hostname=hostname, addr=addr, port=port, bind=bind, capath=capath,
+                         certfile=certfile, keyfile=keyfile, compression=compression)
 
         self.blockchain = Blockchain()
         self.connections = list()
+        # The file the other validators are listed in, once create_connections() has read it
+        self.peer_directory = None
+        # Verified public key files keyed by path, with the mtime they were read at
+        self.key_cache = dict()
 
     def message(self, t):
         '''
@@ -51,65 +74,76 @@ class Client(Node):
         while True:
             try:
                 conn, addr = self.net.accept()
+            except socket.timeout:
+                continue
+            try:
                 s = self.receive_context.wrap_socket(conn, server_side=True)
-                DATA = bytearray()  # used to store the incoming data
                 with s:
-                    data = s.recv(BUFF_SIZE)
-                    while data:
-                        # Continue receiving chunks of the data until the buffer is empty
-                        # (until the client sends empty data)
-                        DATA += data
-                        data = s.recv(BUFF_SIZE)
-
-                    decoded_message = pickle.loads(DATA)
-                    #print(decoded_message)
-                    if type(decoded_message) == Block:
-                        if decoded_message.id > self.blockchain.last_block.id:
-                            self.blockchain.chain.append(decoded_message)
+                    # Blocks sent while syncing arrive as a single batch, each one
+                    # is appended as soon as it has been received
+                    for blk in self.recv_buffer.stream(s):
+                        self.handle_block(blk)
             except socket.timeout:
-                pass
-
-    def create_connections(self):
+                print("Dropped the connection from %s:%d: timed out" % (addr[0], addr[1]))
+            except codec.DecodeError as e:
+                # The blocks received before the malformed one are kept
+                print("Dropped a malformed message from %s:%d: %s" % (addr[0], addr[1], e))
+            except (ValueError, OSError) as e:
+                # Oversized or truncated messages and failed handshakes only cost
+                # the connection they arrived on
+                print("Dropped the connection from %s:%d: %s" % (addr[0], addr[1], e))
+            finally:
+                conn.close()
+
+    def handle_block(self, blk):
         '''
-            Create the connection objects from the validators info file and store them as a triple
-            arr[0] = hostname, arr[1] = ip, int(arr[2]) = port
+            Append a block received from a validator if it extends the local chain
         '''
-        f = open('../validators_temp.txt', 'r')
-        for line in f:
-            arr = line.split(' ')
-            if self.hostname == arr[0] and self.address == (arr[1], int(arr[2])):
-                continue
-            else:
-                v = validator.Validator(
-                    hostname=arr[0], addr=arr[1], port=int(arr[2]), bind=False)
-                self.connections.append(v)
-        f.close()
+        if type(blk) == Block:
+            # Blocks up to the loaded checkpoint are already part of the PKI state
+            last_block = self.blockchain.last_block
+            last_id = last_block.id if last_block else self.blockchain.pki.height
+            if blk.id > last_id and self.blockchain.validate(blk):
+                self.blockchain.append(blk)
+
+    def create_connections(self, path='../validators_temp.txt'):
+        '''
+            Create the connection objects from the validators info file, one
+            "hostname ip port" line per validator. The file is watched for changes,
+            see PeerDirectory.
+        '''
+        self.peer_directory = PeerDirectory(path, exclude=(self.hostname,) + tuple(self.address))
+        # Connections made before are kept alongside
+        self.peer_directory.peers.extend(self.connections)
+        self.connections = self.peer_directory.peers
 
     def send_transaction(self, val, tx):
         '''
             Send a transaction to the validator network
-            :param Transaction tx: The transaction to send
+            :param Transaction tx: The transaction to send, or a list (batch) of transactions
+            :return: bool, False if the validator was too busy to take every transaction
         '''
         if self.net and self != val:
             # Connect to validators's inbound net using client's outbound net
-            address = val.address
-            # Serialize the transaction as a bytes object
-            txn = pickle.dumps(tx)
-            # Create a new socket (the outbound net)
             # print("Attempting to send to %s:%s" % val.address)
-            with self.context.wrap_socket(socket.socket(socket.AF_INET, socket.SOCK_STREAM), server_hostname=val.hostname) as s:
-                try:
-                    # Connect to the validator
-                    s.connect(address)
+            try:
+                # Connect to the validator, resuming a previous TLS session if possible
+                with self.connect(val) as s:
+                    # Serialize the transaction with the encoding negotiated during the handshake
+                    txn = codec.encode(
+                        tx, compress=codec.negotiated_compression(s))
                     # Send the entirety of the message
-                    s.sendall(txn)
-                except OSError as e:
-                    # Except cases for if the send fails
-                    if e.errno == errno.ECONNREFUSED:
-                        print(e)
-                        # return -1, e
-                except socket.error as e:
+                    self.send_message(s, txn)
+                    reply = self.read_reply(s)
+                    self.cache_session(val, s)
+                    return reply != codec.REPLY_BUSY
+            except OSError as e:
+                # Except cases for if the send fails
+                if e.errno == errno.ECONNREFUSED:
                     print(e)
+                    # return -1, e
+            except socket.error as e:
+                print(e)
         else:
             raise Exception(
                 "The validator must be initialized and listening for connections")
@@ -117,31 +151,62 @@ class Client(Node):
     def broadcast_transaction(self, tx):
         '''
             Broadcast the creation of a transaction to the network
+
+            :return: list, per validator True if it took tx, False if it was too busy
+                     and None if it could not be reached
+        '''
+        if self.peer_directory is not None:
+            self.peer_directory.refresh()
+        return [self.send_transaction(i, tx) for i in self.connections]
+
+    def deliver(self, tx, retries=BATCH_RETRIES, delay=BATCH_RETRY_DELAY):
         '''
-        for i in self.connections:
-            self.send_transaction(i, tx)
+            Broadcast a transaction or batch until a validator takes it
+
+            One validator is enough, it relays the transactions to the others. The
+            broadcast is retried with a growing delay while the validators that
+            answered were all too busy.
+
+            :return: bool, whether a validator took tx
+        '''
+        for attempt in range(retries + 1):
+            results = self.broadcast_transaction(tx)
+            if any(results):
+                return True
+            if False not in results or attempt == retries:
+                # Nobody could be reached, or nobody made room in time
+                return False
+            time.sleep(delay * 2 ** attempt)
 
     def update_blockchain(self):
         '''
             Update blockchain to be current
+
+            The PKI state is restored from the latest checkpoint, so only the
+            blocks stored after it are read and replayed.
         '''
-        block_path = expanduser("~")
-        block_path = os.path.join(block_path, ".BlockchainPKI/chain/")
-        chain = None
+        home_path = expanduser("~")
+        block_path = os.path.join(home_path, ".BlockchainPKI/chain/")
         if os.path.exists(block_path):
             print("Loading local blockchain files...")
-            # Need to implement this
-        else:
-            # Else make the block path and initialize a chain
-            # Uncomment next line when serialization is finished
-            # os.path.mkdir(block_path)
-            chain = Blockchain()
+        chain = load_local_blockchain()
+        print("Loaded PKI state at height %d (%d blocks replayed)" %
+              (chain.pki.height, len(chain.chain)))
         # Broadcast the last block of our current chain to let the network know we need blocks after this point
-        # Uncomment next line before going live
-        self.broadcast_transaction(chain.last_block)
+        last_block = chain.last_block
+        self.broadcast_transaction(self.sync_request(last_block.id if last_block else max(chain.pki.height, 0)))
         # receive until we are updated ???
         return chain
 
+    def sync_request(self, height):
+        '''
+            A request for the blocks from height onwards
+
+            Validators answer a block that is already on their chain with the chain
+            from its id, sent to the port named by its generator address.
+        '''
+        return Block(id=height, block_generator_address=self.address)
+
     def pki_register(self, generator_public_key, name, public_key):
         '''
             Creates a register transaction
@@ -157,20 +222,20 @@ class Client(Node):
 
         gen, pub = '', ''
         if generator_public_key == public_key:
-            temp = self.verify_public_key(open(generator_public_key, 'r'))
+            temp = self.read_public_key(generator_public_key)
             if not temp:
                 print("Public key is incorrectly formated. Please try again.")
                 return -1
             gen, pub = temp, temp
         else:
             # public key verification
-            gen = self.verify_public_key(open(generator_public_key, 'r'))
+            gen = self.read_public_key(generator_public_key)
             if not gen:
                 print(
                     "The generator public key is incorrectly formatted. Please try again.")
                 return -1
 
-            pub = self.verify_public_key(open(public_key, 'r'))
+            pub = self.read_public_key(public_key)
             if not pub:
                 print(
                     "The register public key is incorrectly formatted. Please try again.")
@@ -178,24 +243,8 @@ class Client(Node):
 
         inputs = {"REGISTER": {"name": name, "public_key": pub}}
 
-        # Validate that the name is not already in the blockchain, break if found
-        flag = False
-        for block in reversed(self.blockchain.chain):
-            for tx in block.transactions:
-                inp = json.loads(tx.inputs)
-                for key in inp.keys():
-                    try:
-                        if key == "REVOKE":
-                            continue
-                        if name == inp[key]["name"] or pub == inp[key]["public_key"]:
-                            flag = True
-                            break
-                    except:
-                        continue
-                if flag == True:
-                    break
-            if flag == True:
-                break
+        # Validate that the name or key is not already in the blockchain
+        flag = self.blockchain.pki.is_registered(name, pub)
 
         outputs = dict()
         if flag == False:
@@ -220,30 +269,13 @@ class Client(Node):
             Query the blockchain for a public key given a name
         '''
         # input verification
-        gen = self.verify_public_key(open(generator_public_key, 'r'))
+        gen = self.read_public_key(generator_public_key)
         if not gen:
             print("The generator public key is incorrectly formatted. Please try again.")
             return -1
 
-        revoke_dict = dict()
-
-        # Query blockchain, break if we find our public key
-        public_key = None
-        for blk in reversed(self.blockchain.chain):
-            for tx in blk.transactions:
-                inputs = json.loads(tx.inputs)
-                for key in inputs.keys():  # should only be 1 top level key - still O(1)
-                    try:
-                        if key == "REVOKE":
-                            revoke_dict[inputs[key]["name"]] = inputs[key]["public_key"]
-                        if name == inputs[key]["name"] and name not in revoke_dict:
-                            public_key = inputs[key]["public_key"]
-                    except:
-                        continue
-                if public_key:
-                    break
-            if public_key:
-                break
+        # Query the PKI state for the current, unrevoked key of name
+        public_key = self.blockchain.pki.lookup(name)
 
         inputs = {"QUERY": {"name": name}}
 
@@ -270,19 +302,19 @@ class Client(Node):
         '''
         gen, pub = '', ''
         if generator_public_key == public_key:
-            temp = self.verify_public_key(open(generator_public_key, 'r'))
+            temp = self.read_public_key(generator_public_key)
             if not temp:
                 print("Public key is incorrectly formated. Please try again.")
                 return -1
             gen, pub = temp, temp
         else:
-            gen = self.verify_public_key(open(generator_public_key, 'r'))
+            gen = self.read_public_key(generator_public_key)
             if not gen:
                 print(
                     "The generator public key is incorrectly formatted. Please try again.")
                 return - 1
 
-            pub = self.verify_public_key(open(public_key, 'r'))
+            pub = self.read_public_key(public_key)
             if not pub:
                 print(
                     "The register public key is incorrectly formatted. Please try again.")
@@ -294,23 +326,8 @@ class Client(Node):
 
         inputs = {"VALIDATE": {"name": name, "public_key": pub}}
 
-        flag = False
-        for blk in reversed(self.blockchain.chain):
-            for tx in blk.transactions:
-                inp = json.loads(tx.inputs)
-                for key in inp.keys():
-                    try:
-                        if key == "REVOKE":
-                            continue
-                        if name == inp[key]["name"] and pub == inp[key]["public_key"]:
-                            flag = True
-                            break
-                    except:
-                        continue
-                if flag == True:
-                    break
-            if flag == True:
-                break
+        # The pair is valid if pub is the current key of name
+        flag = self.blockchain.pki.lookup(name) == pub
 
         outputs = dict()
         if flag == True:
@@ -332,37 +349,23 @@ class Client(Node):
             Returns the transaction with the new public key
         '''
         # verify the old_public_key
-        gen = self.verify_public_key(open(generator_public_key, 'r'))
+        gen = self.read_public_key(generator_public_key)
         if not gen:
             print("The generator public key is not formatted correctly.")
             return -1
 
-        old_key = self.verify_public_key(open(old_public_key, 'r'))
+        old_key = self.read_public_key(old_public_key)
         if not old_key:
             print('This old public key is not formatted correctly')
             return -1
         # verify the new_public_key
-        new_key = self.verify_public_key(open(new_public_key, 'r'))
+        new_key = self.read_public_key(new_public_key)
         if not new_key:
             print('This new public key is not formatted correctly')
             return -1
 
-        flag = False
-        for block in reversed(self.blockchain.chain):
-            for tx in block.transactions:
-                inputs = json.loads(tx.inputs)
-                for key in inputs.keys():
-                    try:
-                        if key == "REVOKE":
-                            continue
-                        if name == inputs[key]['name'] and old_key == inputs[key]['public_key']:
-                            flag = True
-                    except:
-                        continue
-                if flag == True:
-                    break
-            if flag == True:
-                break
+        # The old key must be the current key of name
+        flag = self.blockchain.pki.lookup(name) == old_key
 
         # Create the input for the update, for the input we have the name, old_public_key and the new_public_key
         inputs = {"UPDATE": {"name": name,
@@ -389,20 +392,20 @@ class Client(Node):
         '''
         gen, pub = '', ''
         if generator_public_key == public_key:
-            temp = self.verify_public_key(open(generator_public_key, 'r'))
+            temp = self.read_public_key(generator_public_key)
             if not temp:
                 print("Public key is incorrectly formated. Please try again.")
                 return -1
             gen, pub = temp, temp
         else:
             # input verification
-            gen = self.verify_public_key(open(generator_public_key, 'r'))
+            gen = self.read_public_key(generator_public_key)
             if not gen:
                 print(
                     "The generator public key is incorrectly formatted. Please try again.")
                 return -1
 
-            pub = self.verify_public_key(open(public_key, 'r'))
+            pub = self.read_public_key(public_key)
             if not pub:
                 print(
                     "The entered public key is incorrectly formatted. Please try again.")
@@ -410,22 +413,8 @@ class Client(Node):
 
         inputs = {"REVOKE": {"public_key": pub}}
 
-        # Query blockchain, break if we find our public key
-        flag = False
-        for block in reversed(self.blockchain.chain):
-            for tx in block.transactions:
-                inps = json.loads(tx.inputs)
-                for key in inps.keys():  # should only be 1 top level key - still O(1)
-                    try:
-                        if pub == inps[key]["public_key"]:
-                            flag = True
-                            break
-                    except:
-                        continue
-                if flag == True:
-                    break
-            if flag == True:
-                break
+        # The key can be revoked if it was ever registered
+        flag = pub in self.blockchain.pki.owners
 
         outputs = dict()
         if flag == True:
@@ -555,11 +544,137 @@ class Client(Node):
             else:
                 print("\nCommand not understood. Type 'help' for a list of commands.\n")
 
+    def run_command(self, command):
+        '''
+            Create the transactions of a single non-interactive PKI command
+
+            :param list command: The command name followed by its arguments:
+                register <generator key path> <name> <public key path>
+                query    <generator key path> <name>
+                validate <generator key path> <name> <public key path>
+                update   <generator key path> <name> <old key path> <new key path>
+                revoke   <generator key path> <public key path>
+            :return: list of Transactions, in the order they should be sent
+        '''
+        name, args = command[0], command[1:]
+        if name not in BATCH_COMMANDS:
+            raise ValueError("Unknown command %s" % name)
+        if len(args) != BATCH_COMMANDS[name]:
+            raise ValueError("%s takes %d arguments (%d given)" %
+                             (name, BATCH_COMMANDS[name], len(args)))
+
+        if name == 'register':
+            txs = [self.pki_register(*args)]
+        elif name == 'query':
+            txs = [self.pki_query(*args)]
+        elif name == 'validate':
+            txs = [self.pki_validate(*args)]
+        elif name == 'update':
+            # Like the interactive command, revoke the old key before updating
+            generator, _, old_key, _ = args
+            txs = [self.pki_revoke(generator, old_key), self.pki_update(*args)]
+        else:
+            txs = [self.pki_revoke(*args)]
+
+        # The pki_ methods return -1 when their input is invalid
+        if not all(isinstance(tx, Transaction) for tx in txs):
+            raise ValueError("Invalid input")
+        return txs
+
+    def batch_loop(self, stream, out=None, batch_size=BATCH_SIZE, flush_interval=BATCH_FLUSH_INTERVAL):
+        '''
+            Run PKI commands read from a stream, one command per line
+
+            Transactions are handed to a sender thread that broadcasts them to the
+            validators in batches, so reading and building transactions overlaps
+            with the network. A JSON result line is written to out for every command.
+            Blank lines and lines starting with # are skipped.
+
+            :param stream: A file object to read commands from
+            :param out: A file object to write results to, defaults to stdout
+            :param int batch_size: The most transactions sent in one message
+            :param float flush_interval: Longest time a transaction waits for its batch to fill up
+            :return: (int, int) the number of commands that succeeded and failed
+        '''
+        out = out or sys.stdout
+        pending = queue.Queue()
+        unsent = list()
+        sender = Thread(target=self.batch_sender, args=(
+            pending, batch_size, flush_interval, unsent), daemon=True)
+        sender.start()
+
+        succeeded, failed = 0, 0
+        # Keep the results stream clean of the messages printed along the way. This
+        # redirects sys.stdout for the whole process, other threads included, until
+        # the batch is done.
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                for number, line in enumerate(stream, 1):
+                    result = {"line": number}
+                    try:
+                        command = shlex.split(line, comments=True)
+                        if not command:
+                            continue
+                        result["command"] = command[0]
+                        txs = self.run_command(command)
+                    except (ValueError, OSError) as e:
+                        result["error"] = str(e)
+                        failed += 1
+                    else:
+                        for tx in txs:
+                            pending.put((number, tx))
+                        result["transactions"] = [{"transaction_id": tx.transaction_id,
+                                                   "outputs": json.loads(tx.outputs)} for tx in txs]
+                        succeeded += 1
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+        finally:
+            # Wait until every transaction has been sent
+            pending.put(None)
+            sender.join()
+        # The commands whose transactions no validator took failed after all
+        for number in sorted(set(number for number, tx in unsent)):
+            out.write(json.dumps({"line": number, "error": "No validator took the transactions",
+                                  "transactions": [tx.transaction_id for n, tx in unsent if n == number]}) + "\n")
+            succeeded -= 1
+            failed += 1
+        out.flush()
+        return succeeded, failed
+
+    def batch_sender(self, pending, batch_size, flush_interval, unsent):
+        '''
+            Broadcast the (line number, transaction) pairs put on the pending queue
+            in batches until a None is received. The pairs of the batches no
+            validator took are added to unsent.
+        '''
+        done = False
+        while not done:
+            batch = [pending.get()]
+            deadline = time.time() + flush_interval
+            while len(batch) < batch_size and batch[-1] is not None:
+                try:
+                    batch.append(pending.get(
+                        timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if batch and not self.deliver([tx for number, tx in batch]):
+                unsent.extend(batch)
+
     @staticmethod
     def generate_keys():
         '''
             Generate public and private keys using RSA key generation
+
+            This generates a single keypair interactively. Use KeyPool (or
+            `client.py keygen <count>`) to generate keys in bulk.
         '''
+        # pycryptodome is only needed here, keep it out of the startup path
+        from Crypto import Random
+        from Crypto.PublicKey import RSA
+
         # Specify the IP size of the key modulus
         modulus_length = 256 * 8
         # Using a Random Number Generator and the modulus length as parameters
@@ -598,6 +713,22 @@ class Client(Node):
         public_key = private_key.publickey()
         return private_key, public_key
 
+    def read_public_key(self, path):
+        '''
+            Read and verify the public key file at path
+
+            Keys are cached until the file changes, so commands that keep
+            using the same key files do not reopen them every time.
+            :params: path - the path of the public key file
+        '''
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.key_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as public_key:
+                cached = (mtime, self.verify_public_key(public_key))
+            self.key_cache[path] = cached
+        return cached[1]
+
     @staticmethod
     def verify_public_key(public_key):
         '''
@@ -612,10 +743,96 @@ class Client(Node):
             return None
 
 
-if __name__ == '__main__':
+def load_local_blockchain():
+    '''
+        Load the local chain store, starting from the latest PKI checkpoint
+    '''
+    home_path = os.path.join(expanduser("~"), ".BlockchainPKI")
+    checkpoints = CheckpointStore(os.path.join(home_path, "checkpoints/"))
+    return Blockchain(store=ChainStore(os.path.join(home_path, "chain/")), checkpoints=checkpoints)
+
+
+def query(name):
+    '''
+        Look up the current public key of name in the local chain.
+
+        This is the fast-start path for scripted queries: no sockets are bound,
+        no CAs are loaded and neither ssl nor pycryptodome is imported.
+
+        :return: str, or None if the name is unknown or its key is revoked
+    '''
+    return load_local_blockchain().pki.lookup(name)
+
+
+def main(argv):
+    '''
+        python3 client.py                         -Start the interactive client
+        python3 client.py query <name> [--timing] -Print the public key of name from the local chain
+        python3 client.py batch [file]            -Run PKI commands from file (or stdin) and print results
+        python3 client.py keygen <count> [dir]    -Write count RSA keypairs to dir (~/.BlockchainPKI/keys)
+        python3 client.py revocations <file> [fp] -Export a revocation filter with false positive rate fp
+    '''
+    if len(argv) > 2 and argv[1] == 'query':
+        public_key = query(argv[2])
+        if public_key is None:
+            print("Name not found.")
+        else:
+            print(public_key)
+        if '--timing' in argv:
+            print("Cold start to result: %.1f ms" %
+                  ((time.perf_counter() - STARTED) * 1000), file=sys.stderr)
+        return 0 if public_key is not None else 1
+
+    if len(argv) > 2 and argv[1] == 'revocations':
+        state = load_local_blockchain().pki
+        if len(argv) > 3:
+            revocation_filter = state.revocation_filter(float(argv[3]))
+        else:
+            revocation_filter = state.revocation_filter()
+        revocation_filter.save(argv[2])
+        print("Exported %d revoked keys at height %d to %s (%d bytes)" % (
+            revocation_filter.count, state.height, argv[2], len(revocation_filter.to_bytes())))
+        return 0
+
+    if len(argv) > 2 and argv[1] == 'keygen':
+        # Key generation needs no network, only the process pool
+        from keypool import KeyPool, POOL_SIZE
+
+        count = int(argv[2])
+        key_path = argv[3] if len(argv) > 3 else os.path.join(
+            expanduser("~"), ".BlockchainPKI", "keys")
+        start = time.perf_counter()
+        with KeyPool(size=min(count, POOL_SIZE)) as pool:
+            paths = pool.write_keys(count, key_path)
+        for private_path, public_path in paths:
+            print(public_path)
+        print("Generated %d keypairs in %.1f s" %
+              (count, time.perf_counter() - start), file=sys.stderr)
+        return 0
+
+    if len(argv) > 1 and argv[1] == 'batch':
+        cli = Client()
+        cli.create_connections()
+        cli.blockchain = cli.update_blockchain()
+        Thread(target=cli.receive, daemon=True).start()
+        if len(argv) > 2 and argv[2] != '-':
+            with open(argv[2], 'r') as stream:
+                succeeded, failed = cli.batch_loop(stream)
+        else:
+            succeeded, failed = cli.batch_loop(sys.stdin)
+        print("%d commands succeeded, %d failed" %
+              (succeeded, failed), file=sys.stderr)
+        cli.close()
+        return 0 if failed == 0 else 1
+
     cli = Client()
     cli.create_connections()
     cli.blockchain = cli.update_blockchain()
     recv = Thread(target=cli.receive)
     recv.start()
     cli.command_loop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
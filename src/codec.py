@@ -0,0 +1,527 @@
+from block import Block
+from transaction import Transaction
+from compact import CompactBlock, TransactionsRequest, BlockTransactions
+
+import sys
+import zlib
+import pickle
+import struct
+
+# Flag prepended to compressed payloads, in the same spirit as the b'/cert' flag
+FLAG_ZLIB = b'/zlib'
+
+# Messages are sent behind a flag and their length, so receivers can size their buffer up front
+FLAG_FRAME = b'/frm'
+FRAME_HEADER = struct.Struct('!4sQ')
+# Larger frames are refused rather than buffered
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+# Replies a validator sends back once it has handled a message. Busy means transactions
+# were refused because its mempool is full, and the sender should back off.
+REPLY_OK = b'/ok'
+REPLY_BUSY = b'/busy'
+
+# Schema encoded payloads start with this flag and a version, anything else is a legacy pickle
+FLAG_SCHEMA = b'/pks'
+SCHEMA_VERSION = 1
+# Legacy pickled payloads are refused unless the caller passes accept_pickle=True.
+# Unpickling runs arbitrary code, so only trusted local stores may do that.
+
+# A payload holds a single message or a batch, followed by each item behind its length
+KIND_SINGLE = b'1'
+KIND_BATCH = b'L'
+PAYLOAD_HEADER = struct.Struct('!4sBc')
+ITEM_HEADER = struct.Struct('!I')
+
+# Attributes of the objects that can be sent, in the order their __init__ sets them.
+# Decoded objects get their attributes back in the same order and with the same
+# sharing of values, so pickling them (and therefore their hash) is unchanged.
+TRANSACTION_FIELDS = ('version', 'transaction_type', 'tx_generator_address', 'inputs', 'outputs',
+                      'lock_time', 'time_stamp', 'transaction_id', 'status')
+BLOCK_FIELDS = ('version', 'id', 'transactions', 'sha256_txs', 'previous_hash', 'merkle_root',
+                'block_generator_address', 'block_generation_proof', 'nonce', 'status',
+                't_counter', 'timestamp', 'hash')
+COMPACT_BLOCK_FIELDS = ('header', 'short_ids', 'sender')
+TRANSACTIONS_REQUEST_FIELDS = ('block_hash', 'indexes', 'sender')
+BLOCK_TRANSACTIONS_FIELDS = ('block_hash', 'transactions')
+
+# Value tags
+TAG_NONE, TAG_TRUE, TAG_FALSE = b'N', b'T', b'F'
+TAG_INT, TAG_BIGINT, TAG_FLOAT = b'i', b'I', b'f'
+TAG_STR, TAG_BYTES, TAG_LIST, TAG_TUPLE, TAG_DICT = b's', b'b', b'l', b't', b'd'
+TAG_REF = b'r'  # a value already decoded earlier in the same item
+TAG_TRANSACTION, TAG_BLOCK = b'X', b'B'  # objects following their schema
+TAG_COMPACT_BLOCK, TAG_TRANSACTIONS_REQUEST, TAG_BLOCK_TRANSACTIONS = b'C', b'Q', b'R'
+TAG_OBJECT = b'o'  # objects whose attributes differ from their schema, sent with names
+
+CLASSES = {b'X': (Transaction, TRANSACTION_FIELDS), b'B': (Block, BLOCK_FIELDS),
+           b'C': (CompactBlock, COMPACT_BLOCK_FIELDS), b'Q': (TransactionsRequest, TRANSACTIONS_REQUEST_FIELDS),
+           b'R': (BlockTransactions, BLOCK_TRANSACTIONS_FIELDS)}
+CLASS_TAGS = {cls: tag for tag, (cls, _) in CLASSES.items()}
+# The same tags as the integers found when indexing into bytes, for the decoder
+(NONE, TRUE, FALSE, INTEGER, BIGINT, FLOATING, STR, BYTES, LIST, TUPLE, DICT, REF, OBJECT) = (
+    tag[0] for tag in (TAG_NONE, TAG_TRUE, TAG_FALSE, TAG_INT, TAG_BIGINT, TAG_FLOAT, TAG_STR,
+                       TAG_BYTES, TAG_LIST, TAG_TUPLE, TAG_DICT, TAG_REF, TAG_OBJECT))
+OBJECTS = {tag[0]: schema for tag, schema in CLASSES.items()}
+
+# The types each attribute of a decoded object may have, anything else is malformed.
+# Exact types are compared, so a bool is not taken for an int.
+NONE_TYPE = type(None)
+NUMBER = (int, float, NONE_TYPE)
+TEXT = (str, NONE_TYPE)
+ADDRESS = (tuple, list, str, NONE_TYPE)
+FIELD_TYPES = {
+    b'X': {'version': NUMBER, 'transaction_type': TEXT, 'tx_generator_address': TEXT, 'inputs': TEXT,
+           'outputs': TEXT, 'lock_time': (int, NONE_TYPE), 'time_stamp': (int,), 'transaction_id': (str,),
+           'status': TEXT},
+    b'B': {'version': NUMBER, 'id': (int, NONE_TYPE), 'transactions': (list, NONE_TYPE),
+           'sha256_txs': (list, NONE_TYPE), 'previous_hash': TEXT, 'merkle_root': (str,),
+           'block_generator_address': ADDRESS, 'block_generation_proof': TEXT, 'nonce': (int, NONE_TYPE),
+           'status': TEXT, 't_counter': (int,), 'timestamp': (int,), 'hash': (str,)},
+    b'C': {'header': (Block,), 'short_ids': (list,), 'sender': ADDRESS},
+    b'Q': {'block_hash': (str,), 'indexes': (list,), 'sender': ADDRESS},
+    b'R': {'block_hash': (str,), 'transactions': (list,)},
+}
+# The type of the items of list attributes
+ITEM_TYPES = {'transactions': Transaction, 'sha256_txs': str, 'short_ids': bytes, 'indexes': int}
+OBJECT_TYPES = {tag[0]: types for tag, types in FIELD_TYPES.items()}
+
+INT = struct.Struct('!q')
+FLOAT = struct.Struct('!d')
+LENGTH = ITEM_HEADER
+
+# Errors decode_item can hit on a malformed payload, all reported as a DecodeError
+MALFORMED = (ValueError, TypeError, LookupError, struct.error, RecursionError)
+
+# ALPN protocol names used to negotiate the payload encoding during the TLS handshake
+ALPN_COMPRESSED = 'pkchain-zlib'
+ALPN_PLAIN = 'pkchain'
+
+COMPRESSION_LEVEL = 6
+
+# Shared zlib dictionary. Transactions repeat the same PEM armour, RSA key prefixes,
+# JSON inputs/outputs keys and pickled attribute names, so priming the compressor with
+# them lets even a single small transaction compress well. zlib favours matches near
+# the end of the dictionary, so the most common strings go last.
+# NOTE: changing this dictionary breaks decoding between nodes running different versions.
+ZDICT = b''.join([
+    b'"VALIDATE": {"success": true, "name": ',
+    b'"UPDATE": {"name": ', b'"old_public_key": ', b'"new_public_key": ',
+    b'{"REVOKE": {"public_key": ', b'{"QUERY": {"name": ',
+    b'{"REGISTER": {"success": false, "message": "This name is already registered."}}',
+    b'{"QUERY": {"success": true, "public_key": ',
+    b'{"REGISTER": {"success": true}}',
+    b'block\nBlock\x94', b'block_generator_address\x94', b'block_generation_proof\x94',
+    b'previous_hash\x94', b'merkle_root\x94', b'sha256_txs\x94', b't_counter\x94',
+    b'transaction\nTransaction\x94', b'transaction_type\x94', b'tx_generator_address\x94',
+    b'lock_time\x94', b'time_stamp\x94', b'transaction_id\x94', b'Standard\x94',
+    b'inputs\x94', b'outputs\x94', b'version\x94', b'status\x94', b'Open\x94',
+    b'MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQ',
+    b'MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEA',
+    b'\\n-----END PUBLIC KEY-----', b'-----BEGIN PUBLIC KEY-----\\n',
+    b'\n-----END PUBLIC KEY-----', b'-----BEGIN PUBLIC KEY-----\n',
+    b'{"REGISTER": {"name": ', b'"public_key": "-----BEGIN PUBLIC KEY-----\\n',
+])
+
+
+def alpn_protocols(compression=True):
+    '''
+        The ALPN protocols a node offers, in order of preference
+
+        :param bool compression: Whether compressed payloads are accepted
+    '''
+    return [ALPN_COMPRESSED, ALPN_PLAIN] if compression else [ALPN_PLAIN]
+
+
+def negotiated_compression(sock):
+    '''
+        Whether both ends of a TLS connection agreed to compressed payloads
+
+        :param SSLSocket sock: A connected TLS socket
+    '''
+    try:
+        return sock.selected_alpn_protocol() == ALPN_COMPRESSED
+    except AttributeError:
+        # Plain sockets cannot negotiate anything
+        return False
+
+
+class DecodeError(ValueError):
+    '''
+        A payload that cannot be decoded, whatever part of it is malformed
+    '''
+
+
+def frame_header(length):
+    '''
+        The header to send ahead of a payload of length bytes
+    '''
+    return FRAME_HEADER.pack(FLAG_FRAME, length)
+
+
+def frame_length(header):
+    '''
+        The payload length announced by a frame header
+
+        :param bytes header: The first FRAME_HEADER.size bytes of a message
+        :return: int, or None if the message is not framed
+    '''
+    if len(header) < FRAME_HEADER.size or header[:len(FLAG_FRAME)] != FLAG_FRAME:
+        return None
+    return FRAME_HEADER.unpack_from(header)[1]
+
+
+def encode_value(value, out, memo):
+    '''
+        Append the encoding of value to out
+
+        :param bytearray out: The buffer to append to
+        :param dict memo: id -> position of the values encoded so far, so shared
+                          values are sent once and decoded as one object again
+    '''
+    kind = type(value)
+    if value is None:
+        out += TAG_NONE
+        return
+    if kind is bool:
+        out += TAG_TRUE if value else TAG_FALSE
+        return
+    if kind is int:
+        if -2 ** 63 <= value < 2 ** 63:
+            out += TAG_INT + INT.pack(value)
+        else:
+            digits = str(value).encode()
+            out += TAG_BIGINT + LENGTH.pack(len(digits)) + digits
+        return
+    if kind is float:
+        out += TAG_FLOAT + FLOAT.pack(value)
+        return
+
+    index = memo.get(id(value))
+    if index is not None:
+        out += TAG_REF + LENGTH.pack(index)
+        return
+    memo[id(value)] = len(memo)
+
+    if kind is str:
+        data = value.encode('utf-8', 'surrogatepass')
+        out += TAG_STR + LENGTH.pack(len(data)) + data
+    elif kind is bytes:
+        out += TAG_BYTES + LENGTH.pack(len(value)) + value
+    elif kind is list or kind is tuple:
+        out += (TAG_LIST if kind is list else TAG_TUPLE) + LENGTH.pack(len(value))
+        for item in value:
+            encode_value(item, out, memo)
+    elif kind is dict:
+        out += TAG_DICT + LENGTH.pack(len(value))
+        for key, item in value.items():
+            encode_value(key, out, memo)
+            encode_value(item, out, memo)
+    elif kind in CLASS_TAGS:
+        tag = CLASS_TAGS[kind]
+        attributes = value.__dict__
+        if tuple(attributes) == CLASSES[tag][1]:
+            out += tag
+            for item in attributes.values():
+                encode_value(item, out, memo)
+        else:
+            out += TAG_OBJECT + tag + LENGTH.pack(len(attributes))
+            for name, item in attributes.items():
+                encode_value(name, out, memo)
+                encode_value(item, out, memo)
+    else:
+        raise TypeError("Cannot encode values of type %s" % kind.__name__)
+
+
+def check_fields(obj, types):
+    '''
+        Raise a DecodeError unless every attribute of a decoded object has an expected type
+    '''
+    attributes = obj.__dict__
+    for name, allowed in types.items():
+        if name not in attributes:
+            raise DecodeError("%s without %s" % (type(obj).__name__, name))
+        value = attributes[name]
+        if type(value) not in allowed:
+            raise DecodeError("%s.%s of type %s" % (type(obj).__name__, name, type(value).__name__))
+        item_type = ITEM_TYPES.get(name)
+        if item_type is not None and type(value) is list:
+            for item in value:
+                if type(item) is not item_type:
+                    raise DecodeError("%s.%s holding a %s" % (type(obj).__name__, name, type(item).__name__))
+
+
+def decode_item(data):
+    '''
+        Decode a single item of a schema encoded payload
+
+        :param bytes data: The item, without its length
+    '''
+    memo = []  # decoded values that later ones may refer to, in encoding order
+    remember = memo.append
+    unpack_length = LENGTH.unpack_from
+    pos = 0
+
+    def value():
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        # The most common tags are tested first
+        if tag == STR:
+            n, = unpack_length(data, pos)
+            start = pos + LENGTH.size
+            pos = start + n
+            decoded = str(data[start:pos], 'utf-8', 'surrogatepass')
+            remember(decoded)
+            return decoded
+        if tag == REF:
+            n, = unpack_length(data, pos)
+            pos += LENGTH.size
+            return memo[n]
+        if tag == INTEGER:
+            decoded, = INT.unpack_from(data, pos)
+            pos += INT.size
+            return decoded
+        if tag == NONE:
+            return None
+        if tag == FLOATING:
+            decoded, = FLOAT.unpack_from(data, pos)
+            pos += FLOAT.size
+            return decoded
+        if tag in OBJECTS:
+            cls, fields = OBJECTS[tag]
+            obj = cls.__new__(cls)
+            remember(obj)
+            attributes = obj.__dict__
+            for name in fields:
+                attributes[name] = value()
+            check_fields(obj, OBJECT_TYPES[tag])
+            return obj
+        if tag == LIST:
+            decoded = []
+            remember(decoded)
+            n, = unpack_length(data, pos)
+            pos += LENGTH.size
+            for _ in range(n):
+                decoded.append(value())
+            return decoded
+        if tag == TUPLE:
+            # Reserve the position of the tuple, it can only be built after its items
+            index = len(memo)
+            remember(None)
+            n, = unpack_length(data, pos)
+            pos += LENGTH.size
+            decoded = tuple([value() for _ in range(n)])
+            memo[index] = decoded
+            return decoded
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == DICT:
+            decoded = {}
+            remember(decoded)
+            n, = unpack_length(data, pos)
+            pos += LENGTH.size
+            for _ in range(n):
+                key = value()
+                decoded[key] = value()
+            return decoded
+        if tag == BYTES:
+            n, = unpack_length(data, pos)
+            start = pos + LENGTH.size
+            pos = start + n
+            decoded = bytes(data[start:pos])
+            remember(decoded)
+            return decoded
+        if tag == BIGINT:
+            n, = unpack_length(data, pos)
+            start = pos + LENGTH.size
+            pos = start + n
+            return int(data[start:pos])
+        if tag == OBJECT:
+            start = pos
+            cls, fields = OBJECTS[data[pos]]
+            n, = unpack_length(data, pos + 1)
+            pos += 1 + LENGTH.size
+            obj = cls.__new__(cls)
+            remember(obj)
+            for _ in range(n):
+                # Attribute names are interned, as they are for objects built by __init__
+                name = sys.intern(value())
+                obj.__dict__[name] = value()
+            check_fields(obj, OBJECT_TYPES[data[start]])
+            return obj
+        raise DecodeError("Unknown value tag %r at offset %d" % (bytes([tag]), pos - 1))
+
+    try:
+        decoded = value()
+    except DecodeError:
+        raise
+    except MALFORMED as e:
+        raise DecodeError("Malformed item: %r" % e) from e
+    if pos != len(data):
+        raise DecodeError("%d trailing bytes after item" % (len(data) - pos))
+    return decoded
+
+
+def encode(obj, compress=False):
+    '''
+        Serialize a Transaction, Block or a batch (list) of them for the wire
+
+        Each item of a batch is encoded on its own so receivers can decode it
+        as soon as it has arrived, see StreamDecoder.
+
+        :param obj: The object to serialize
+        :param bool compress: Whether to compress the payload with the shared dictionary
+        :return: bytes
+    '''
+    batch = isinstance(obj, list)
+    payload = bytearray(PAYLOAD_HEADER.pack(FLAG_SCHEMA, SCHEMA_VERSION, KIND_BATCH if batch else KIND_SINGLE))
+    for item in (obj if batch else [obj]):
+        start = len(payload)
+        payload += ITEM_HEADER.pack(0)
+        encode_value(item, payload, dict())
+        ITEM_HEADER.pack_into(payload, start, len(payload) - start - ITEM_HEADER.size)
+    if not compress:
+        return bytes(payload)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=ZDICT)
+    return FLAG_ZLIB + compressor.compress(payload) + compressor.flush()
+
+
+class StreamDecoder:
+    '''
+        Decodes a payload produced by encode() incrementally, as its bytes arrive
+
+        feed() returns the items of a batch as soon as each one is complete,
+        decompressing on the fly if needed. Legacy pickled payloads can only be
+        decoded once whole, so they are returned by close(). Anything malformed
+        raises a DecodeError.
+    '''
+
+    def __init__(self, accept_pickle=False, max_size=MAX_FRAME_SIZE):
+        '''
+            :param bool accept_pickle: Whether legacy pickled payloads are decoded, only
+                                       for data this node wrote itself
+            :param int max_size: The most bytes a payload may decompress to
+        '''
+        self.accept_pickle = accept_pickle
+        self.max_size = max_size
+        self.size = 0  # payload bytes received so far, once decompressed
+        self.pending = bytearray()  # received bytes not decompressed yet
+        self.decompressor = None
+        self.compressed = None  # unknown until the first bytes arrive
+        self.buffer = bytearray()  # payload bytes not decoded yet
+        self.kind = None
+        self.items = 0
+
+    def feed(self, data):
+        '''
+            Add received bytes
+
+            :param bytes data: The next bytes of the payload
+            :return: list of the items completed by data
+        '''
+        if self.compressed is None:
+            self.pending += data
+            if len(self.pending) < len(FLAG_ZLIB):
+                return []
+            self.compressed = self.pending[:len(FLAG_ZLIB)] == FLAG_ZLIB
+            if self.compressed:
+                self.decompressor = zlib.decompressobj(zdict=ZDICT)
+                data = self.pending[len(FLAG_ZLIB):]
+            else:
+                data = self.pending
+            self.pending = None
+        if self.compressed:
+            data = self.decompress(data)
+        self.buffer += data
+        return self.parse()
+
+    def decompress(self, data):
+        # Never inflate more than max_size, however small the compressed bytes are
+        limit = self.max_size - self.size
+        try:
+            data = self.decompressor.decompress(data, limit + 1)
+        except zlib.error as e:
+            raise DecodeError("Corrupt compressed payload: %s" % e) from e
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise DecodeError("Payload decompresses to more than %d bytes" % self.max_size)
+        return data
+
+    def parse(self):
+        buffer = self.buffer
+        if self.kind is None:
+            if len(buffer) < PAYLOAD_HEADER.size:
+                return []
+            flag, version, kind = PAYLOAD_HEADER.unpack_from(buffer)
+            if flag != FLAG_SCHEMA:
+                # A legacy pickle, wait for all of it
+                self.kind = b''
+                return []
+            if version != SCHEMA_VERSION:
+                raise DecodeError("Unsupported schema version %d" % version)
+            self.kind = kind
+            del buffer[:PAYLOAD_HEADER.size]
+        if not self.kind:
+            return []
+
+        items, pos = [], 0
+        while len(buffer) - pos >= ITEM_HEADER.size:
+            length, = ITEM_HEADER.unpack_from(buffer, pos)
+            end = pos + ITEM_HEADER.size + length
+            if len(buffer) < end:
+                break
+            items.append(decode_item(bytes(buffer[pos + ITEM_HEADER.size:end])))
+            pos = end
+        del buffer[:pos]
+        self.items += len(items)
+        return items
+
+    def close(self):
+        '''
+            Signal the end of the payload
+
+            :return: list of the items completed by the last bytes
+        '''
+        if self.compressed is None:
+            # Too short to tell, then it cannot be compressed
+            self.compressed = False
+            self.buffer += self.pending
+        elif self.compressed:
+            self.buffer += self.decompress(b'')
+            if not self.decompressor.eof:
+                raise DecodeError("Compressed payload ended early")
+        items = self.parse()
+        if self.kind == b'' or self.kind is None:
+            if not self.accept_pickle:
+                raise DecodeError("Refusing a pickled payload")
+            try:
+                message = pickle.loads(self.buffer)
+            except Exception as e:
+                raise DecodeError("Corrupt pickled payload: %r" % e) from e
+            self.kind = KIND_BATCH if isinstance(message, list) else KIND_SINGLE
+            return message if self.kind == KIND_BATCH else [message]
+        if self.buffer:
+            raise DecodeError("Payload ended inside an item")
+        return items
+
+
+def decode(data, accept_pickle=False):
+    '''
+        Deserialize a payload produced by encode(), compressed or not
+
+        :param bytes data: The received payload
+        :param bool accept_pickle: Whether a legacy pickled payload is decoded, see StreamDecoder
+        :return: The Transaction or Block, or a list of them for a batch
+        :raises DecodeError: if the payload is malformed
+    '''
+    decoder = StreamDecoder(accept_pickle)
+    items = decoder.feed(data)
+    items += decoder.close()
+    if decoder.kind == KIND_BATCH:
+        return items
+    if len(items) != 1:
+        raise DecodeError("Expected a single message, got %d" % len(items))
+    return items[0]
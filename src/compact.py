@@ -0,0 +1,109 @@
+from block import Block
+from transaction import Transaction
+
+# Bytes of a transaction id that stand for it in a compact block
+SHORT_ID_LENGTH = 8
+
+
+def list_of(values, item_type):
+    '''
+        Whether values is a list holding only items of exactly item_type
+    '''
+    return type(values) is list and all(type(value) is item_type for value in values)
+
+
+def short_id(tx_id):
+    '''
+        The short id of a transaction id, its leading bytes
+    '''
+    return bytes.fromhex(tx_id[:2 * SHORT_ID_LENGTH])
+
+
+class CompactBlock:
+    '''
+        A new block announced by its header and the short ids of its transactions
+
+        The validators receiving it already hold nearly every transaction in their
+        mempools, so they rebuild the block from those and fetch only the ones
+        they miss from the sender, see TransactionsRequest. The hashes of the
+        transactions are left out of the header as well, they are recomputed
+        from the transactions and checked against the merkle root.
+    '''
+
+    def __init__(self, header=None, short_ids=None, sender=None):
+        '''
+            :param Block header: The block without its transactions or their hashes
+            :param list short_ids: The short ids of its transactions, in block order
+            :param tuple sender: (hostname, port) to request missing transactions from
+        '''
+        self.header = header
+        self.short_ids = short_ids
+        self.sender = sender
+
+    @classmethod
+    def from_block(cls, block, sender):
+        header = block.header()
+        header.sha256_txs = None
+        return cls(header, [short_id(tx.transaction_id) for tx in block.transactions], sender)
+
+    @property
+    def hash(self):
+        return self.header.hash
+
+    def well_formed(self):
+        '''
+            Whether the message has the shape of one built by from_block, checked
+            before any of it is used
+        '''
+        return (type(self.header) is Block and type(self.header.id) is int and type(self.header.hash) is str
+                and list_of(self.short_ids, bytes))
+
+    def assemble(self, transactions):
+        '''
+            The full block, given its transactions
+
+            :param list transactions: The transactions, in block order
+            :return: Block, to be checked with Blockchain.validate before it is trusted
+        '''
+        block = object.__new__(Block)
+        # Copying the attributes keeps their order, which the block hash depends on
+        block.__dict__.update(self.header.__dict__)
+        block.transactions = list(transactions)
+        block.sha256_txs = [tx.compute_hash() for tx in block.transactions]
+        return block
+
+
+class TransactionsRequest:
+    '''
+        A request for the transactions of a compact block the receiver could not find
+    '''
+
+    def __init__(self, block_hash=None, indexes=None, sender=None):
+        '''
+            :param str block_hash: The hash of the block
+            :param list indexes: The positions of the transactions in the block
+            :param tuple sender: (hostname, port) to send the transactions to
+        '''
+        self.block_hash = block_hash
+        self.indexes = indexes
+        self.sender = sender
+
+    def well_formed(self):
+        return type(self.block_hash) is str and list_of(self.indexes, int)
+
+
+class BlockTransactions:
+    '''
+        The transactions asked for by a TransactionsRequest
+    '''
+
+    def __init__(self, block_hash=None, transactions=None):
+        '''
+            :param str block_hash: The hash of the block
+            :param list transactions: The transactions, in the order they were requested
+        '''
+        self.block_hash = block_hash
+        self.transactions = transactions
+
+    def well_formed(self):
+        return type(self.block_hash) is str and list_of(self.transactions, Transaction)
@@ -0,0 +1,210 @@
+from collections import OrderedDict, deque
+from threading import BoundedSemaphore
+
+import time
+import contextlib
+
+# Defaults of the per-peer rate limits
+MESSAGE_RATE = 200  # messages per second
+MESSAGE_BURST = 400
+BYTE_RATE = 8 * 1024 * 1024  # bytes per second
+BYTE_BURST = 32 * 1024 * 1024
+
+
+class TokenBucket:
+    '''
+        Tokens refilled at a fixed rate up to a burst size
+    '''
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self, now):
+        '''
+            Whether there is a token to spend
+        '''
+        self.refill(now)
+        return self.tokens >= 1
+
+    def wait(self, now):
+        '''
+            Seconds until there is a token to spend
+        '''
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def spend(self, amount, now):
+        '''
+            Take amount tokens. The bucket can go into debt, which keeps it empty
+            until the debt has been refilled, so a message larger than the burst
+            still gets through once.
+        '''
+        self.refill(now)
+        self.tokens -= amount
+
+
+class ConnectionManager:
+    '''
+        Caps the connections of a node and shares its attention fairly between peers
+
+        Inbound connections are taken off the listen backlog and queued per peer
+        (by IP address) instead of being served in arrival order. Peers are then
+        served in turn, each limited by a token bucket on messages and one on bytes,
+        so a single noisy peer can neither fill every inbound slot nor hold up the
+        others. Outbound connections are limited by a semaphore, which only caps
+        anything when several threads send at once.
+    '''
+
+    def __init__(self, max_inbound, max_outbound, message_rate=MESSAGE_RATE, message_burst=MESSAGE_BURST,
+                 byte_rate=BYTE_RATE, byte_burst=BYTE_BURST, clock=time.monotonic):
+        '''
+            :param int max_inbound: The most inbound connections waiting or being served at once
+            :param int max_outbound: The most outbound connections open at once
+            :param float message_rate: Messages per second served from one peer
+            :param int message_burst: Messages one peer can send at once after being idle
+            :param float byte_rate: Bytes per second received from one peer
+            :param int byte_burst: Bytes one peer can send at once after being idle
+            :param clock: Callable returning the current time in seconds
+        '''
+        self.max_inbound = max_inbound
+        self.max_outbound = max_outbound
+        self.message_rate = message_rate
+        self.message_burst = message_burst
+        self.byte_rate = byte_rate
+        self.byte_burst = byte_burst
+        self.clock = clock
+        self.queues = OrderedDict()  # peer -> deque of (connection, address), in serving order
+        self.waiting = 0
+        self.buckets = dict()  # peer -> (message TokenBucket, byte TokenBucket)
+        self.outbound_slots = BoundedSemaphore(max_outbound)
+        self.counters = {'accepted': 0, 'rejected': 0, 'dropped': 0, 'served': 0, 'throttled': 0,
+                         'bytes': 0, 'outbound': 0, 'outbound_waits': 0}
+
+    def __len__(self):
+        '''
+            The number of inbound connections waiting to be served
+        '''
+        return self.waiting
+
+    def limits(self, peer):
+        buckets = self.buckets.get(peer)
+        if buckets is None:
+            now = self.clock()
+            buckets = self.buckets[peer] = (TokenBucket(self.message_rate, self.message_burst, now),
+                                            TokenBucket(self.byte_rate, self.byte_burst, now))
+        return buckets
+
+    def admit(self, conn, addr):
+        '''
+            Queue an accepted inbound connection
+
+            When every inbound slot is taken, the newest connection of the peer with
+            the most waiting makes room, unless that is the peer of conn itself.
+
+            :return: list of the connections to close, conn itself if it was refused
+        '''
+        peer = addr[0]
+        closed = list()
+        if len(self.buckets) > 4 * self.max_inbound:
+            self.forget_idle()
+        if self.waiting >= self.max_inbound:
+            busiest = max(self.queues, key=lambda other: len(self.queues[other]))
+            if len(self.queues[busiest]) <= len(self.queues.get(peer, ())) + 1:
+                self.counters['rejected'] += 1
+                return [conn]
+            closed.append(self.queues[busiest].pop()[0])
+            self.waiting -= 1
+            self.counters['dropped'] += 1
+        self.queues.setdefault(peer, deque()).append((conn, addr))
+        self.waiting += 1
+        self.counters['accepted'] += 1
+        return closed
+
+    def forget_idle(self):
+        '''
+            Drop the buckets of peers with nothing waiting whose buckets are full again,
+            a new bucket would be in the same state
+        '''
+        now = self.clock()
+        for peer, (messages, data) in list(self.buckets.items()):
+            if peer in self.queues:
+                continue
+            messages.refill(now)
+            data.refill(now)
+            if messages.tokens >= messages.burst and data.tokens >= data.burst:
+                del self.buckets[peer]
+
+    def next(self):
+        '''
+            The next inbound connection to serve, taking peers in turn
+
+            Peers that have used up their rate are skipped until their buckets refill.
+
+            :return: (connection, address), or None if no peer can be served
+        '''
+        now = self.clock()
+        for peer in list(self.queues):
+            messages, data = self.limits(peer)
+            if not (messages.ready(now) and data.ready(now)):
+                self.counters['throttled'] += 1
+                continue
+            queue = self.queues.pop(peer)
+            conn, addr = queue.popleft()
+            if queue:
+                # Back of the line until every other peer has had its turn
+                self.queues[peer] = queue
+            self.waiting -= 1
+            messages.spend(1, now)
+            self.counters['served'] += 1
+            return conn, addr
+        return None
+
+    def wait(self):
+        '''
+            Seconds until a waiting connection can be served
+
+            :return: float, 0 if one can be served now, or None if none is waiting
+        '''
+        now = self.clock()
+        waits = [max(messages.wait(now), data.wait(now))
+                 for messages, data in (self.limits(peer) for peer in self.queues)]
+        return min(waits) if waits else None
+
+    def received(self, addr, size):
+        '''
+            Charge a message of size bytes received from addr to its peer
+        '''
+        self.limits(addr[0])[1].spend(size, self.clock())
+        self.counters['bytes'] += size
+
+    @contextlib.contextmanager
+    def outbound(self):
+        '''
+            Hold one of the outbound slots, waiting for one to be released if needed
+
+            A single-threaded node never holds more than one, the cap is for
+            callers sending from several threads.
+        '''
+        if not self.outbound_slots.acquire(blocking=False):
+            self.counters['outbound_waits'] += 1
+            self.outbound_slots.acquire()
+        self.counters['outbound'] += 1
+        try:
+            yield
+        finally:
+            self.outbound_slots.release()
+
+    def stats(self):
+        '''
+            The counters, with the connections waiting per peer
+        '''
+        stats = dict(self.counters)
+        stats['waiting'] = {peer: len(queue) for peer, queue in self.queues.items()}
+        return stats
@@ -0,0 +1,114 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import os
+
+# Specify the IP size of the key modulus
+MODULUS_LENGTH = 256 * 8
+# Number of keypairs kept ready or in progress
+POOL_SIZE = 32
+
+
+def generate_keypair(modulus_length=MODULUS_LENGTH):
+    '''
+        Generate an RSA keypair, run inside the worker processes
+
+        :return: (bytes, bytes) the PEM encoded private and public keys
+    '''
+    from Crypto.PublicKey import RSA
+
+    private_key = RSA.generate(modulus_length)
+    return private_key.export_key('PEM'), private_key.publickey().export_key('PEM')
+
+
+class KeyPool:
+    '''
+        A bounded pool of RSA keypairs generated ahead of time in a process pool
+
+        Prime generation runs on every core while keys are being used, and each
+        key taken from the pool is immediately replaced by a new job.
+    '''
+
+    def __init__(self, size=POOL_SIZE, workers=None, modulus_length=MODULUS_LENGTH):
+        '''
+            :param int size: Number of keypairs kept ready or in progress
+            :param int workers: Number of worker processes, defaults to the number of cores
+            :param int modulus_length: Size of the RSA modulus in bits
+        '''
+        self.modulus_length = modulus_length
+        self.executor = ProcessPoolExecutor(workers)
+        self.closing = False
+        # Oldest job first, so keys are handed out in the order they were started
+        self.jobs = deque(self.submit() for _ in range(size))
+
+    def submit(self):
+        return self.executor.submit(generate_keypair, self.modulus_length)
+
+    def ready(self):
+        '''
+            The number of keypairs that can be taken without waiting
+        '''
+        return sum(1 for job in self.jobs if job.done())
+
+    def get(self):
+        '''
+            Take a keypair from the pool, waiting for one if none is ready
+
+            :return: (bytes, bytes) the PEM encoded private and public keys
+        '''
+        job = self.jobs.popleft()
+        if not self.closing:
+            self.jobs.append(self.submit())
+        return job.result()
+
+    def take(self, count):
+        '''
+            Take count keypairs from the pool
+
+            :return: list of (private key, public key) PEM pairs
+        '''
+        return [self.get() for _ in range(count)]
+
+    def write_keys(self, count, key_path, prefix="key"):
+        '''
+            Write count new keypairs out to key_path
+
+            Files are named <prefix>_<n>_private.pem and <prefix>_<n>_public.pem,
+            numbered after any keys with the same prefix already in key_path.
+
+            :return: list of (private key path, public key path)
+        '''
+        if not os.path.exists(key_path):
+            os.makedirs(key_path)
+        start = 0
+        while os.path.exists(os.path.join(key_path, "%s_%d_public.pem" % (prefix, start))):
+            start += 1
+
+        paths = list()
+        for n in range(start, start + count):
+            private_pem, public_pem = self.get()
+            private_path = os.path.join(key_path, "%s_%d_private.pem" % (prefix, n))
+            public_path = os.path.join(key_path, "%s_%d_public.pem" % (prefix, n))
+            with open(private_path, 'wb') as f:
+                f.write(private_pem)
+            with open(public_path, 'wb') as f:
+                f.write(public_pem)
+            paths.append((private_path, public_path))
+        return paths
+
+    def close(self):
+        '''
+            Stop the worker processes, dropping the keypairs that were not taken
+
+            Jobs that have not started are cancelled, so this only waits for the
+            keys being generated at the time.
+        '''
+        self.closing = True
+        self.jobs.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
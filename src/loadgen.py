@@ -0,0 +1,211 @@
+from node import Peer
+from transaction import Transaction
+from simulator import percentile, ms
+import codec
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import sys
+import json
+import time
+import argparse
+
+# Workers sending transactions, so slow sends do not hold back the schedule
+CONCURRENCY = 64
+# A send that starts later than this after its scheduled time counts as late
+LATE_THRESHOLD = 0.01
+# Below this fraction of the offered rate the validators are reported as saturated
+SATURATION_RATIO = 0.95
+
+# Operations a workload record can hold and the fields they need
+OPERATIONS = {'register': ('name', 'public_key'), 'query': ('name',),
+              'update': ('name', 'old_public_key', 'new_public_key'), 'revoke': ('public_key',)}
+
+
+def read_peers(path):
+    '''
+        The validators listed in a validators.txt file, one "hostname ip port" per line
+    '''
+    peers = list()
+    with open(path, 'r') as f:
+        for line in f:
+            arr = line.split()
+            if len(arr) >= 3:
+                peers.append(Peer(hostname=arr[0], port=int(arr[2])))
+    return peers
+
+
+def read_workload(path):
+    '''
+        Read a workload file
+
+        Each line is a JSON record such as
+            {"t": 0.25, "op": "register", "name": "alice", "public_key": "..."}
+        where t is the offset in seconds at which it is replayed.
+
+        :return: list of (float offset or None, dict record)
+    '''
+    workload = list()
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            operation = record.get('op')
+            if operation not in OPERATIONS:
+                raise ValueError("Line %d: unknown operation %r" % (number, operation))
+            missing = [field for field in OPERATIONS[operation] if field not in record]
+            if missing:
+                raise ValueError("Line %d: %s needs %s" % (number, operation, ", ".join(missing)))
+            workload.append((record.get('t'), record))
+    return workload
+
+
+def build_transaction(record):
+    '''
+        The Transaction a workload record stands for, shaped like the ones the Client builds
+    '''
+    operation = record['op'].upper()
+    inputs = {operation: {field: record[field] for field in OPERATIONS[record['op']]}}
+    outputs = {operation: {"success": True}}
+    return Transaction(transaction_type="Standard", tx_generator_address=record.get('generator'),
+                       inputs=json.dumps(inputs), outputs=json.dumps(outputs))
+
+
+class LoadGenerator:
+    '''
+        Replays a workload against validators at a fixed offered rate
+
+        Sends are scheduled up front and handed to a pool of workers when they
+        are due, whether or not earlier ones have completed (an open loop).
+        Latency is measured from the scheduled time, so time spent waiting for
+        a free worker counts against the validators rather than being hidden.
+    '''
+
+    def __init__(self, peers, send, concurrency=CONCURRENCY):
+        '''
+            :param list peers: The validators to send to, in turn
+            :param send: Callable sending a Transaction to a peer, raising on failure and
+                         returning False if the peer was too busy to take it
+            :param int concurrency: Number of sends that can be in progress at once
+        '''
+        self.peers = peers
+        self.send = send
+        self.concurrency = concurrency
+        self.lock = Lock()
+        self.latencies = list()
+        self.lags = list()  # how late each send started
+        self.errors = 0
+        self.busy = 0  # sends refused by a validator with a full mempool
+
+    def schedule(self, workload, rate=None):
+        '''
+            The offset of every record of the workload
+
+            :param float rate: Records per second, overrides the offsets in the workload
+            :return: list of (float offset, dict record), in order
+        '''
+        if rate is not None:
+            return [(i / rate, record) for i, (_, record) in enumerate(workload)]
+        if any(offset is None for offset, _ in workload):
+            raise ValueError("The workload has records without a time, give a rate")
+        return sorted(workload, key=lambda item: item[0])
+
+    def run(self, workload, rate=None):
+        '''
+            Replay a workload
+
+            :return: dict, see report()
+        '''
+        schedule = [(offset, build_transaction(record)) for offset, record in self.schedule(workload, rate)]
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            start = time.perf_counter()
+            for i, (offset, tx) in enumerate(schedule):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.timed_send, self.peers[i % len(self.peers)], tx, start + offset)
+        elapsed = time.perf_counter() - start
+        return self.report(schedule[-1][0] if schedule else 0.0, elapsed)
+
+    def timed_send(self, peer, tx, scheduled):
+        started = time.perf_counter()
+        try:
+            accepted = self.send(peer, tx) is not False
+            failed = False
+        except Exception:
+            # Whatever went wrong, the send is counted rather than lost in its future
+            accepted, failed = False, True
+        done = time.perf_counter()
+        with self.lock:
+            self.lags.append(started - scheduled)
+            if failed:
+                self.errors += 1
+            elif not accepted:
+                self.busy += 1
+            else:
+                self.latencies.append(done - scheduled)
+
+    def report(self, span, elapsed):
+        '''
+            :param float span: Seconds between the first and the last scheduled send
+            :param float elapsed: Seconds until every send completed
+            :return: dict with the offered and achieved rates, the sends refused as busy,
+                     latency percentiles, the lateness of the sends and whether the
+                     validators kept up
+        '''
+        latencies, lags = sorted(self.latencies), sorted(self.lags)
+        sent = len(latencies) + self.errors + self.busy
+        offered = (sent - 1) / span if span else None
+        achieved = len(latencies) / elapsed if elapsed else None
+        return {'sent': sent, 'errors': self.errors, 'busy': self.busy,
+                'offered_rate': offered, 'achieved_rate': achieved,
+                'p50': percentile(latencies, 0.5), 'p90': percentile(latencies, 0.9),
+                'p99': percentile(latencies, 0.99), 'max': latencies[-1] if latencies else None,
+                'late': sum(1 for lag in lags if lag > LATE_THRESHOLD) / len(lags) if lags else 0.0,
+                'max_lag': lags[-1] if lags else None,
+                'saturated': offered is not None and achieved is not None and achieved < offered * SATURATION_RATIO}
+
+
+def tls_sender(node):
+    '''
+        A send function for LoadGenerator delivering transactions over TLS from node
+    '''
+    def send(peer, tx):
+        with node.connect(peer) as s:
+            node.send_message(s, codec.encode(tx, compress=codec.negotiated_compression(s)))
+            reply = node.read_reply(s)
+            node.cache_session(peer, s)
+        return reply != codec.REPLY_BUSY
+    return send
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay a workload of PKI operations against the validators")
+    parser.add_argument('workload', help='JSONL file of register/query/update/revoke records')
+    parser.add_argument('--rate', type=float, help='Transactions per second, instead of the times in the workload')
+    parser.add_argument('--validators', default='../validators.txt', help='File listing the validators')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='Sends in progress at once')
+    parser.add_argument('--port', type=int, default=4849, help='Local port of the sending client')
+    options = parser.parse_args(argv[1:])
+
+    from client import Client
+
+    client = Client(port=options.port)
+    generator = LoadGenerator(read_peers(options.validators), tls_sender(client), options.concurrency)
+    report = generator.run(read_workload(options.workload), options.rate)
+    client.close()
+
+    print("Sent %d transactions (%d errors, %d busy): offered %.1f tx/s, achieved %.1f tx/s%s" % (
+        report['sent'], report['errors'], report['busy'], report['offered_rate'] or 0, report['achieved_rate'] or 0,
+        " -- SATURATED" if report['saturated'] else ""))
+    print("Latency: p50 %s  p90 %s  p99 %s  max %s" % (
+        ms(report['p50']), ms(report['p90']), ms(report['p99']), ms(report['max'])))
+    print("%.1f%% of sends started more than %s late, the latest by %s" % (
+        report['late'] * 100, ms(LATE_THRESHOLD), ms(report['max_lag'])))
+    return 1 if report['saturated'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,196 @@
+from compact import short_id
+from collections import OrderedDict
+from itertools import islice
+
+import time
+import heapq
+
+# Default limits of a Mempool
+MAX_COUNT = 50000
+MAX_BYTES = 64 * 1024 * 1024
+# Seconds a transaction waits for a block before it is dropped
+EXPIRY = 3600
+
+# What add() did with a transaction
+ADDED = 'added'
+DUPLICATE = 'duplicate'
+BUSY = 'busy'  # refused for lack of room, the submitter should back off
+
+# Eviction policies, which transaction makes room when the pool is full
+REJECT = 'reject'  # none, new transactions are refused
+OLDEST = 'oldest'  # the one that has waited longest
+LARGEST = 'largest'  # the largest one, unless it is the new one
+POLICIES = (REJECT, OLDEST, LARGEST)
+
+
+def transaction_size(tx):
+    '''
+        The approximate size of a transaction in bytes, from the lengths of its attributes
+    '''
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in tx.__dict__.values())
+
+
+class Mempool:
+    '''
+        Transactions waiting to be included in a block, bounded in count and bytes
+
+        Transactions are kept in arrival order keyed by id, so duplicate checks and
+        removals are O(1) and expiry only looks at the transactions that expire.
+        Once a limit is reached the eviction policy decides between refusing the
+        new transaction, which add() reports as BUSY, and dropping another one.
+    '''
+
+    def __init__(self, max_count=MAX_COUNT, max_bytes=MAX_BYTES, expiry=EXPIRY, policy=REJECT,
+                 clock=time.monotonic):
+        '''
+            :param int max_count: The most transactions held at once
+            :param int max_bytes: The most bytes of transactions held at once
+            :param float expiry: Seconds after which a waiting transaction is dropped, None to keep them
+            :param str policy: One of POLICIES
+            :param clock: Callable returning the current time in seconds
+        '''
+        if policy not in POLICIES:
+            raise ValueError("Unknown eviction policy %r" % policy)
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.expiry = expiry
+        self.policy = policy
+        self.clock = clock
+        self.entries = OrderedDict()  # transaction id -> (Transaction, size, arrival time)
+        self.short_ids = dict()  # short id -> transaction id, see CompactBlock
+        self.bytes = 0
+        self.by_size = []  # heap of (-size, sequence, transaction id), may hold removed ids
+        self.sequence = 0
+        self.counters = {'added': 0, 'duplicate': 0, 'busy': 0, 'evicted': 0, 'expired': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, tx):
+        return tx.transaction_id in self.entries
+
+    def __iter__(self):
+        return (tx for tx, _, _ in self.entries.values())
+
+    def __getitem__(self, index):
+        '''
+            The transactions at a position or slice of the arrival order
+        '''
+        if isinstance(index, slice):
+            return list(islice(self, index.start, index.stop, index.step))
+        if index < 0:
+            index += len(self.entries)
+        for tx in islice(self, index, None):
+            return tx
+        raise IndexError("Mempool index out of range")
+
+    def get(self, tx_id):
+        entry = self.entries.get(tx_id)
+        return entry[0] if entry is not None else None
+
+    def find(self, short):
+        '''
+            The transaction held with a short id, or None
+        '''
+        return self.get(self.short_ids.get(short))
+
+    def __repr__(self):
+        return "<Mempool %d transactions, %d bytes>" % (len(self.entries), self.bytes)
+
+    def add(self, tx):
+        '''
+            Add a transaction, making room for it according to the eviction policy
+
+            :param Transaction tx: The transaction to add
+            :return: ADDED, DUPLICATE, or BUSY if there was no room for it
+        '''
+        self.expire()
+        if tx.transaction_id in self.entries:
+            self.counters['duplicate'] += 1
+            return DUPLICATE
+        size = transaction_size(tx)
+        if not self.make_room(size):
+            self.counters['busy'] += 1
+            return BUSY
+        self.entries[tx.transaction_id] = (tx, size, self.clock())
+        self.short_ids[short_id(tx.transaction_id)] = tx.transaction_id
+        self.bytes += size
+        if self.policy == LARGEST:
+            heapq.heappush(self.by_size, (-size, self.sequence, tx.transaction_id))
+            self.sequence += 1
+        self.counters['added'] += 1
+        return ADDED
+
+    def make_room(self, size):
+        '''
+            Evict transactions until one of size bytes fits
+
+            :return: bool, whether it fits
+        '''
+        if size > self.max_bytes:
+            return False
+        while len(self.entries) >= self.max_count or self.bytes + size > self.max_bytes:
+            if self.policy == OLDEST:
+                tx_id = next(iter(self.entries))
+            elif self.policy == LARGEST:
+                tx_id = self.largest()
+                if self.entries[tx_id][1] <= size:
+                    return False
+            else:
+                return False
+            self.discard(tx_id)
+            self.counters['evicted'] += 1
+        return True
+
+    def largest(self):
+        '''
+            The id of the largest transaction held
+        '''
+        # Entries of transactions that are gone are skipped lazily
+        while self.by_size[0][2] not in self.entries:
+            heapq.heappop(self.by_size)
+        return self.by_size[0][2]
+
+    def discard(self, tx_id):
+        '''
+            Remove a transaction if it is held
+
+            :param str tx_id: The transaction id
+        '''
+        entry = self.entries.pop(tx_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            if self.short_ids.get(short_id(tx_id)) == tx_id:
+                del self.short_ids[short_id(tx_id)]
+        if len(self.by_size) > 2 * len(self.entries) + 64:
+            # Too many removed transactions left in the heap, rebuild it
+            self.by_size = [item for item in self.by_size if item[2] in self.entries]
+            heapq.heapify(self.by_size)
+
+    def remove_block(self, block):
+        '''
+            Remove the transactions of a block appended to the chain
+        '''
+        for tx in block.transactions or ():
+            self.discard(tx.transaction_id)
+
+    def expire(self):
+        '''
+            Drop the transactions that have waited longer than the expiry
+        '''
+        if self.expiry is None:
+            return
+        deadline = self.clock() - self.expiry
+        # The oldest transactions are at the front
+        while self.entries:
+            tx_id, (_, _, arrival) = next(iter(self.entries.items()))
+            if arrival > deadline:
+                break
+            self.discard(tx_id)
+            self.counters['expired'] += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.short_ids.clear()
+        self.by_size = []
+        self.bytes = 0
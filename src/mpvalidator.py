@@ -0,0 +1,243 @@
+from validator import Validator
+from node import Peer
+from block import Block
+from transaction import Transaction
+from compact import CompactBlock, TransactionsRequest, BlockTransactions
+from mempool import ADDED, BUSY
+import codec
+
+from threading import Thread
+
+import os
+import sys
+import queue
+import multiprocessing
+
+# Seconds a worker waits on its queue before checking whether it should stop
+POLL_INTERVAL = 0.1
+# The most messages waiting between two stages before the earlier stage blocks
+QUEUE_SIZE = 10000
+
+
+def verify_item(msg):
+    '''
+        Whether a deserialized message is one a validator handles and its hashes match
+    '''
+    kind = type(msg)
+    if kind is Transaction:
+        return msg.verify()
+    if kind is Block:
+        # The ledger skips these checks for blocks that come out of the verifiers
+        return msg.verify() and all(tx.verify() for tx in msg.transactions or [])
+    if kind is BlockTransactions:
+        return msg.well_formed() and all(tx.verify() for tx in msg.transactions)
+    if kind is CompactBlock or kind is TransactionsRequest:
+        # Compact blocks are checked once the ledger has assembled them from its mempool
+        return msg.well_formed()
+    return False
+
+
+def verify_message(data):
+    '''
+        Deserialize a received message and check the hashes of everything in it
+
+        :param bytes data: The message as received
+        :return: (list, int) the verified messages, and the number of rejected items
+    '''
+    try:
+        decoded_message = codec.decode(data)
+    except Exception:
+        return [], 1
+    if not isinstance(decoded_message, list):
+        decoded_message = [decoded_message]
+    verified = [msg for msg in decoded_message if verify_item(msg)]
+    return verified, len(decoded_message) - len(verified)
+
+
+class NetworkValidator(Validator):
+    '''
+        The network stage: accepts TLS connections and sends outbound messages
+
+        Received messages are queued as raw bytes for the verification stage,
+        so this process never deserializes or hashes anything. All the messages of
+        a peer go to the same verifier, which keeps them in the order they arrived.
+    '''
+
+    def __init__(self, inbound, outbound, busy, **kwargs):
+        '''
+            :param list inbound: The queues of the verifiers
+            :param outbound: The queue of the messages to send
+            :param busy: Shared flag the ledger sets while its mempool refuses transactions
+        '''
+        super().__init__(**kwargs)
+        self.inbound = inbound
+        self.outbound = outbound
+        self.busy = busy
+        self.peers = dict()  # (hostname, port) -> Peer
+
+    def dispatch(self, data, addr, start_time):
+        verifier = self.inbound[hash(addr[0]) % len(self.inbound)]
+        try:
+            verifier.put_nowait((bytes(data), addr, start_time))
+        except queue.Full:
+            # The pipeline is saturated, the sender should back off
+            return codec.REPLY_BUSY
+        return codec.REPLY_BUSY if self.busy.value else codec.REPLY_OK
+
+    def send_loop(self, stop):
+        '''
+            Send the messages queued by the ledger stage until stop is set
+        '''
+        while not stop.is_set():
+            try:
+                (hostname, port), msg = self.outbound.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            peer = self.peers.get((hostname, port))
+            if peer is None:
+                peer = self.peers[(hostname, port)] = Peer(hostname, port)
+            self.message(peer, msg)
+
+
+class LedgerValidator(Validator):
+    '''
+        The ledger stage: runs the mempool and builds and appends blocks
+
+        It holds no sockets, messages to other nodes are queued for the network stage.
+    '''
+
+    def __init__(self, outbound, addr="0.0.0.0", **kwargs):
+        super().__init__(bind=False, **kwargs)
+        self.outbound = outbound
+        # Blocks are signed off with the identity of the network stage
+        self.address = (addr, self.address[1])
+
+    def message(self, v, msg):
+        self.outbound.put(((v.hostname, v.address[1]), msg))
+
+
+def network_main(options, inbound, outbound, busy, stop):
+    val = NetworkValidator(inbound, outbound, busy, **options)
+    sender = Thread(target=val.send_loop, args=(stop,), daemon=True)
+    sender.start()
+    try:
+        while not stop.is_set():
+            val.receive()
+    finally:
+        sender.join()
+        val.close()
+        # Do not wait for queued messages nobody is left to read
+        for verifier in inbound:
+            verifier.cancel_join_thread()
+
+
+def verifier_main(inbound, verified, rejected, stop):
+    while not stop.is_set():
+        try:
+            data, addr, start_time = inbound.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        messages, count = verify_message(data)
+        if count:
+            with rejected.get_lock():
+                rejected.value += count
+        if messages:
+            verified.put((messages, addr, start_time))
+    verified.cancel_join_thread()
+
+
+def ledger_main(options, verified, outbound, busy, stop, connect):
+    val = LedgerValidator(outbound, **options)
+    if connect:
+        val.create_connections()
+    while not stop.is_set():
+        try:
+            messages, addr, start_time = verified.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        # The verifiers checked every hash already
+        statuses = [val.handle_message(msg, addr, start_time, verified=True) for msg in messages]
+        if BUSY in statuses:
+            busy.value = 1
+        elif ADDED in statuses:
+            busy.value = 0
+    outbound.cancel_join_thread()
+
+
+class MultiProcessValidator:
+    '''
+        A Validator split into processes connected by queues
+
+        network -> inbound -> verifiers -> verified -> ledger -> outbound -> network
+
+        TLS and socket I/O, deserialization and hash checks, and the mempool and
+        chain each get their own interpreter, so hashing never holds up the
+        network loop. The verification stage runs one process per spare core,
+        each with its own inbound queue, and the ledger does not hash the
+        messages again.
+    '''
+
+    def __init__(self, hostname="localhost", addr="0.0.0.0", port=4848, chain_path=None, verifiers=None,
+                 connect=False, **kwargs):
+        '''
+            :param str chain_path: The directory the ledger persists the chain in
+            :param int verifiers: Number of verification processes, defaults to the cores
+                                  left over by the network and ledger processes
+            :param bool connect: Whether the ledger reads the other validators from validators.txt
+            :param kwargs: Passed on to the network Validator (certfile, keyfile, capath, compression)
+        '''
+        if verifiers is None:
+            verifiers = max(1, (os.cpu_count() or 1) - 2)
+        self.stop_event = multiprocessing.Event()
+        self.inbound = [multiprocessing.Queue(QUEUE_SIZE) for _ in range(verifiers)]
+        self.verified = multiprocessing.Queue(QUEUE_SIZE)
+        self.outbound = multiprocessing.Queue(QUEUE_SIZE)
+        self.rejected = multiprocessing.Value('l', 0)
+        self.busy = multiprocessing.Value('b', 0)
+
+        network_options = dict(kwargs, hostname=hostname, addr=addr, port=port)
+        ledger_options = dict(hostname=hostname, addr=addr, port=port, chain_path=chain_path)
+        if 'certfile' in kwargs:
+            ledger_options['certfile'] = kwargs['certfile']
+        self.processes = [multiprocessing.Process(
+            target=network_main, name="network",
+            args=(network_options, self.inbound, self.outbound, self.busy, self.stop_event))]
+        self.processes += [multiprocessing.Process(
+            target=verifier_main, name="verifier-%d" % i,
+            args=(inbound, self.verified, self.rejected, self.stop_event))
+            for i, inbound in enumerate(self.inbound)]
+        self.processes.append(multiprocessing.Process(
+            target=ledger_main, name="ledger",
+            args=(ledger_options, self.verified, self.outbound, self.busy, self.stop_event, connect)))
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def stats(self):
+        '''
+            The current depth of each queue and the number of rejected messages
+        '''
+        return {'inbound': sum(inbound.qsize() for inbound in self.inbound), 'verified': self.verified.qsize(),
+                'outbound': self.outbound.qsize(), 'rejected': self.rejected.value}
+
+    def stop(self):
+        '''
+            Stop every stage and wait for the processes to exit
+        '''
+        self.stop_event.set()
+        for process in self.processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    port = int(input("Enter a port number: "))
+    verifiers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    val = MultiProcessValidator(hostname="localhost", port=port, verifiers=verifiers,
+                                chain_path="~/.BlockchainPKI/validator/chain/")
+    val.start()
+    try:
+        for process in val.processes:
+            process.join()
+    except KeyboardInterrupt:
+        val.stop()
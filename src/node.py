@@ -1,12 +1,179 @@
-from random import randint, choice
+from random import randint
 from abc import ABC, abstractmethod
-from string import ascii_uppercase, ascii_lowercase, digits
+from castore import CAStore
+from threading import Lock
+
+import codec
 
 import os
-import ssl
+import time
 import socket
 import errno
 
+# How long to wait for a TLS 1.3 session ticket on the first connection to a peer
+SESSION_TICKET_WAIT = 0.05
+# How long a sender waits for the reply to a message
+REPLY_TIMEOUT = 5.0
+# Initial size of the receive buffer, it grows to fit the largest message seen
+RECV_BUFFER_SIZE = 64 * 1024
+# Largest receive buffer kept between messages, larger ones are given back after use
+RECV_BUFFER_KEPT = 4 * 1024 * 1024
+
+
+class ReceiveBuffer:
+    '''
+        A reusable buffer that messages are received into without intermediate copies
+
+        Framed messages are read straight into place with recv_into, in as few
+        calls as the socket allows, after sizing the buffer from the frame header.
+        Unframed messages (older nodes, certificates) are read until the sender
+        closes the connection. Both are limited to codec.MAX_FRAME_SIZE, and reading
+        one can be limited in time as well, however slowly its bytes arrive.
+    '''
+
+    def __init__(self, size=RECV_BUFFER_SIZE, kept=RECV_BUFFER_KEPT):
+        '''
+            :param int size: The initial size of the buffer
+            :param int kept: The largest size the buffer keeps between messages
+        '''
+        self.size = size
+        self.kept = kept
+        self.buffer = bytearray(size)
+        self.deadline = None  # time.monotonic() the message being read must be done by
+
+    def reserve(self, size, keep=0):
+        '''
+            Make room for at least size bytes, keeping the first keep bytes
+        '''
+        if size <= len(self.buffer):
+            return
+        capacity = len(self.buffer)
+        while capacity < size:
+            capacity *= 2
+        # Views handed out earlier keep the old buffer alive, so it is replaced rather than resized
+        buffer = bytearray(capacity)
+        buffer[:keep] = self.buffer[:keep]
+        self.buffer = buffer
+
+    def release(self):
+        '''
+            Go back to the initial size if a large message grew the buffer past kept
+
+            Views of the message handed out keep the large buffer alive until they are dropped.
+        '''
+        if len(self.buffer) > self.kept:
+            self.buffer = bytearray(self.size)
+
+    def fill(self, s, start, stop):
+        '''
+            Receive into the buffer from start until stop or until the connection is closed
+
+            :return: int, the position reached
+        '''
+        view = memoryview(self.buffer)
+        while start < stop:
+            if self.deadline is not None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("Message not received in time")
+                s.settimeout(remaining)
+            received = s.recv_into(view[start:stop])
+            if not received:
+                break
+            start += received
+        return start
+
+    def read_header(self, s):
+        '''
+            Receive the start of a message
+
+            :return: (int, int) the number of bytes received and the announced length,
+                     None if the message is not framed
+        '''
+        received = self.fill(s, 0, codec.FRAME_HEADER.size)
+        length = codec.frame_length(self.buffer[:received])
+        if length is not None and length > codec.MAX_FRAME_SIZE:
+            raise ValueError("Refusing a %d byte message" % length)
+        return received, length
+
+    def read_unframed(self, s, received):
+        '''
+            Receive the rest of an unframed message, until the sender closes the connection
+        '''
+        if received == codec.FRAME_HEADER.size:
+            received = self.fill(s, received, len(self.buffer))
+        while received == len(self.buffer):
+            if received >= codec.MAX_FRAME_SIZE:
+                raise ValueError("Refusing an unframed message of %d bytes or more" % received)
+            self.reserve(len(self.buffer) * 2, keep=received)
+            received = self.fill(s, received, len(self.buffer))
+        return memoryview(self.buffer)[:received]
+
+    def read(self, s, timeout=None):
+        '''
+            Receive one message from s
+
+            :param socket s: The connection to read from
+            :param float timeout: Seconds the whole message may take, None to wait as
+                                  long as the socket does
+            :return: memoryview of the message, valid until the next read
+        '''
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            received, length = self.read_header(s)
+            if length is None:
+                return self.read_unframed(s, received)
+            self.reserve(length)
+            received = self.fill(s, 0, length)
+            if received < length:
+                raise ConnectionError("Connection closed after %d of %d bytes" % (received, length))
+            return memoryview(self.buffer)[:length]
+        finally:
+            self.deadline = None
+            self.release()
+
+    def stream(self, s):
+        '''
+            Receive one message from s, yielding its items as soon as each one is complete
+
+            A batch of blocks can then be handled while the rest of it is still arriving.
+
+            :param socket s: The connection to read from
+        '''
+        decoder = codec.StreamDecoder()
+        received, length = self.read_header(s)
+        if length is None:
+            data = self.read_unframed(s, received)
+            self.release()
+            yield from decoder.feed(data)
+        else:
+            view = memoryview(self.buffer)
+            while length:
+                received = s.recv_into(view, min(length, len(view)))
+                if not received:
+                    raise ConnectionError("Connection closed %d bytes before the end of the message" % length)
+                length -= received
+                yield from decoder.feed(view[:received])
+        yield from decoder.close()
+
+
+class Peer:
+    '''
+        A remote node that messages can be sent to
+
+        Only the hostname is resolved, so peers are cheap to create and
+        do not need the Validator or Client classes.
+    '''
+
+    def __init__(self, hostname, port=4848, ip=None):
+        '''
+            :param str hostname: The fully qualified domain name
+            :param int port: The port the node is listening on
+            :param str ip: The address of hostname if it is already known
+        '''
+        self.hostname = hostname
+        self.address = (ip or socket.gethostbyname(self.hostname), port)
+
 
 class Node(ABC):
     '''
@@ -14,7 +181,7 @@ class Node(ABC):
     '''
 
     def __init__(self, hostname=None, addr="0.0.0.0", port=4848, bind=True, capath="~/.BlockchainPKI/validators/",
-                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key"):
+                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key", compression=True):
         '''
             Initialize the Node object
 
@@ -23,9 +190,23 @@ class Node(ABC):
             :param int port: The port to bind to
             :param bool bind: Whether or not to bind a socket
             :param str capath: The path to the Validators CAs
+            :param bool compression: Whether to offer compressed block and batch payloads
         '''
         self.address = (addr, port)
+        self.compression = compression
         self.capath = capath.replace('~', os.environ['HOME'])
+        self.ca_store = CAStore(self.capath)
+        # The SSLContext every CA of ca_store has been loaded into
+        self.ca_context = None
+        # TLS sessions of outbound connections keyed by peer address, so reconnects can resume them
+        self.sessions = dict()
+        self.handshakes = {'full': 0, 'resumed': 0,
+                           'full_time': 0.0, 'resumed_time': 0.0}
+        # connect() may be called from several threads, see loadgen
+        self.handshake_lock = Lock()
+        self.recv_buffer = ReceiveBuffer()
+        self.certfile = certfile.replace('~', os.environ['HOME'])
+        self.keyfile = keyfile.replace('~', os.environ['HOME'])
 
         if not bind:
             assert hostname != None, "Hostname must be specified when not binding"
@@ -35,11 +216,14 @@ class Node(ABC):
             self.hostname = hostname or socket.getfqdn(socket.gethostname())
             self._init_net()
 
-            self.certfile = certfile.replace('~', os.environ['HOME'])
-            self.keyfile = keyfile.replace('~', os.environ['HOME'])
+            # ssl is only imported once a node actually serves or opens connections
+            import ssl
+
             self.receive_context = ssl.create_default_context(
                 ssl.Purpose.CLIENT_AUTH)
             self.receive_context.load_cert_chain(self.certfile, self.keyfile)
+            self.receive_context.set_alpn_protocols(
+                codec.alpn_protocols(self.compression))
 
     def _init_net(self):
         '''
@@ -66,9 +250,13 @@ class Node(ABC):
                 self.address = addr, new_port
                 self._init_net()  # Try to initialize the net again
         finally:
+            import ssl
+
             # Create a context for encrypting/decrypting network connections
             self.context = ssl.create_default_context()
             self.context.check_hostname = False
+            self.context.set_alpn_protocols(
+                codec.alpn_protocols(self.compression))
             self.load_other_ca()
 
     @abstractmethod
@@ -95,6 +283,14 @@ class Node(ABC):
         elif len(os.listdir(capath)) == 0:
             # The capath directory contains no files
             raise FileNotFoundError("Directory %s is empty.")
+        elif capath == self.capath:
+            # Index any new files and load only those, unless the context is new
+            new = self.ca_store.scan()
+            if self.ca_context is not self.context:
+                new = list(self.ca_store)
+                self.ca_context = self.context
+            for abspath in new:
+                self.context.load_verify_locations(abspath)
         else:
             # Load all the CAs
             cafiles = [path for path in os.listdir(
@@ -103,6 +299,99 @@ class Node(ABC):
                 abspath = os.path.join(capath, path)
                 self.context.load_verify_locations(abspath)
 
+    def connect(self, peer):
+        '''
+            Open a TLS connection to peer, resuming a cached session when there is one
+
+            :param Node peer: The node to connect to
+            :return: SSLSocket
+        '''
+        session = self.sessions.get(peer.address)
+        s = self.context.wrap_socket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
+                                     server_hostname=peer.hostname, session=session)
+        start = time.perf_counter()
+        try:
+            s.connect(peer.address)
+        except OSError:
+            # The session may be the reason the handshake failed, do not offer it again
+            self.sessions.pop(peer.address, None)
+            s.close()
+            raise
+        elapsed = time.perf_counter() - start
+
+        kind = 'resumed' if s.session_reused else 'full'
+        with self.handshake_lock:
+            self.handshakes[kind] += 1
+            self.handshakes[kind + '_time'] += elapsed
+        return s
+
+    @staticmethod
+    def send_message(s, payload):
+        '''
+            Send a payload behind a frame header so the receiver can read it in place
+
+            :param socket s: The connection to send on
+            :param bytes payload: The encoded message
+        '''
+        s.sendall(codec.frame_header(len(payload)))
+        s.sendall(payload)
+
+    @staticmethod
+    def read_reply(s, timeout=REPLY_TIMEOUT):
+        '''
+            Wait for the reply to a message sent on s
+
+            :return: bytes, empty if the receiver closed the connection without replying
+        '''
+        s.settimeout(timeout)
+        try:
+            return s.recv(len(codec.REPLY_BUSY))
+        except (socket.timeout, OSError):
+            return b''
+
+    @staticmethod
+    def send_reply(s, reply):
+        '''
+            Reply to a received message, senders that do not wait for it are ignored
+        '''
+        try:
+            s.sendall(reply)
+        except OSError:
+            pass
+
+    def cache_session(self, peer, s):
+        '''
+            Remember the TLS session of a connection so the next one to peer can resume it.
+            Call this once done with s and before closing it.
+
+            :param Node peer: The node s is connected to
+            :param SSLSocket s: The connection
+        '''
+        if s.version() == 'TLSv1.3':
+            # TLS 1.3 session tickets arrive after the handshake and are only processed
+            # on a read. Wait briefly for them when there is no session for peer yet,
+            # otherwise just poll the socket so a fresh ticket replaces the used one.
+            s.settimeout(SESSION_TICKET_WAIT if peer.address not in self.sessions else 0)
+            try:
+                s.recv(1)
+            except (socket.timeout, OSError):
+                pass
+            if s.session is None or not s.session.has_ticket:
+                return
+        if s.session is not None:
+            self.sessions[peer.address] = s.session
+
+    def handshake_report(self):
+        '''
+            A summary of the outbound TLS handshakes made so far
+        '''
+        report = "TLS handshakes to %d peers:" % len(self.sessions)
+        for kind in ('full', 'resumed'):
+            count = self.handshakes[kind]
+            avg = self.handshakes[kind + '_time'] / count * 1000 if count else 0
+            report += " %d %s (avg %.2f ms)" % (count, kind, avg)
+        return report
+
     def send_certificate(self, addr, port):
         '''
             Sends the certificate to addr:port through 
@@ -130,32 +419,18 @@ class Node(ABC):
 
             :param bytearray data: The certificate file
         '''
-        def newfilename(namelength): return ''.join(
-            choice(ascii_uppercase + ascii_lowercase + digits) for _ in range(namelength))
-
-        # Create a random filename of length 15
-        filename = newfilename(15)
-        path = os.path.join(
-            self.capath, "%s.pem" % filename)
-
-        # Make sure a file doesn't already exist with that name. If it does, make a new name.
-        while os.path.exists(path):
-            path = os.path.join(self.capath, "%s.pem" % newfilename(15))
-
-        # Save the certificate and remake the context with the new certificate included
-        for p in os.listdir(self.capath):
-            if p.endswith('.pem'):
-                p = os.path.join(self.capath, p)
-                content = open(p, 'rb').read()
-                if content == data:
-                    print("This certificate already exists at %s" % p)
-                    return
-        with open(path, 'wb') as f:
-            f.write(data)
+        # Duplicates are found through the fingerprint index instead of comparing every file
+        path, added = self.ca_store.add(bytes(data))
+        if not added:
+            print("This certificate already exists at %s" % path)
+            return
         print("New CA added at %s" % path)
-        self.load_other_ca(self.capath)
-        print("Reloaded Validator CAs")
+        # Only the new certificate has to be loaded into the live context
+        self.context.load_verify_locations(path)
+        print("Loaded the new Validator CA")
 
     def close(self):
+        if self.handshakes['full'] or self.handshakes['resumed']:
+            print(self.handshake_report())
         if self.net != None:
             self.net.close()
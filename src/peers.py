@@ -0,0 +1,149 @@
+from node import Peer
+
+import os
+import time
+import socket
+
+# Seconds a resolved hostname is trusted before it is looked up again
+DNS_TTL = 300
+# Seconds between two checks of the peers file for changes
+CHECK_INTERVAL = 1.0
+
+
+class PeerDirectory:
+    '''
+        The nodes listed in a peers file such as validators.txt, kept current while running
+
+        Each line is "hostname ip port". Hostnames are resolved through a cache with a
+        TTL, falling back to the listed ip when they do not resolve. The file is checked
+        for changes at most every CHECK_INTERVAL seconds and reloaded incrementally:
+        the Peer objects of unchanged entries are kept, so TLS sessions cached for them
+        stay valid, and only added or removed entries touch the peer list.
+
+        Malformed lines are skipped. A read that fails or finds no entry at all, as
+        while an editor rewrites the file, leaves the peers as they are until the
+        next check.
+    '''
+
+    def __init__(self, path, exclude=None, ttl=DNS_TTL, check_interval=CHECK_INTERVAL,
+                 clock=time.monotonic, resolve=socket.gethostbyname):
+        '''
+            :param str path: The peers file, resolved against the current directory once
+            :param tuple exclude: (hostname, ip, port) of the node itself, left out of the peers
+            :param float ttl: Seconds a resolved address is cached
+            :param float check_interval: Seconds between two checks of the file
+            :param clock: Callable returning the current time in seconds
+            :param resolve: Callable turning a hostname into an ip address
+        '''
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.exclude = exclude
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.clock = clock
+        self.resolve_host = resolve
+        # The peers, in file order. Nodes may add peers of their own to this list,
+        # reloads leave those alone.
+        self.peers = list()
+        self.entries = dict()  # (hostname, ip, port) -> Peer
+        self.addresses = dict()  # hostname -> (ip, time the lookup expires)
+        self.mtime = None
+        self.checked = None
+        self.refresh(force=True)
+
+    def __iter__(self):
+        return iter(self.peers)
+
+    def __len__(self):
+        return len(self.peers)
+
+    def resolve(self, hostname, fallback):
+        '''
+            The ip address of hostname, from the cache while it has not expired
+
+            :param str fallback: The address used if hostname does not resolve
+        '''
+        now = self.clock()
+        cached = self.addresses.get(hostname)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            ip = self.resolve_host(hostname)
+        except OSError:
+            ip = fallback
+        self.addresses[hostname] = (ip, now + self.ttl)
+        return ip
+
+    def read(self):
+        '''
+            The entries of the peers file
+
+            :return: list of (hostname, ip, port)
+        '''
+        entries = list()
+        with open(self.path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                arr = line.split()
+                if len(arr) < 3:
+                    continue
+                try:
+                    entry = (arr[0], arr[1], int(arr[2]))
+                except ValueError:
+                    print("Skipping line %d of %s, the port is not a number: %r" % (number, self.path, line))
+                    continue
+                if entry != self.exclude and entry not in entries:
+                    entries.append(entry)
+        return entries
+
+    def refresh(self, force=False):
+        '''
+            Reload the peers file if it changed, and look up again the hostnames whose
+            addresses expired
+
+            :param bool force: Whether to check the file even if it was checked recently
+            :return: bool, whether peers were added or removed
+        '''
+        now = self.clock()
+        if not force and self.checked is not None and now - self.checked < self.check_interval:
+            return False
+        self.checked = now
+        changed = False
+        try:
+            stat = os.stat(self.path)
+            mtime = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.mtime:
+            changed = self.reload(mtime)
+        for (hostname, ip, port), peer in self.entries.items():
+            peer.address = (self.resolve(hostname, ip), port)
+        return changed
+
+    def reload(self, mtime):
+        '''
+            Bring the peers in line with the file, keeping the Peer objects of unchanged entries
+
+            :param tuple mtime: The modification time and size of the file, None if it is missing
+            :return: bool, whether peers were added or removed
+        '''
+        try:
+            entries = self.read() if mtime is not None else []
+        except (OSError, ValueError) as e:
+            print("Could not read %s, keeping the current peers: %s" % (self.path, e))
+            return False
+        if not entries and self.entries:
+            # Most likely truncated to be written again, the file is read at the next check
+            return False
+        self.mtime = mtime
+        removed = [entry for entry in self.entries if entry not in entries]
+        for entry in removed:
+            try:
+                self.peers.remove(self.entries.pop(entry))
+            except ValueError:
+                # The node already took it out of the list
+                pass
+        added = [entry for entry in entries if entry not in self.entries]
+        for hostname, ip, port in added:
+            peer = Peer(hostname, port, ip=self.resolve(hostname, ip))
+            self.entries[(hostname, ip, port)] = peer
+            self.peers.append(peer)
+        return bool(removed or added)
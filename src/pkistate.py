@@ -0,0 +1,272 @@
+from revocation import RevocationFilter, normalize_key, FALSE_POSITIVE_RATE
+
+import os
+import copy
+import json
+import pickle
+import struct
+
+# Blocks between two checkpoints
+CHECKPOINT_INTERVAL = 1000
+# Number of checkpoints kept on disk
+CHECKPOINTS_KEPT = 3
+# Each record of the transaction index log is a transaction id and the height of its block
+INDEX_RECORD = struct.Struct('!32sQ')
+
+
+class PKIState:
+    '''
+        The PKI state derived from the REGISTER, UPDATE and REVOKE transactions of a chain,
+        along with the height every transaction was committed at
+
+        The transaction index holds every transaction ever committed, so unlike the
+        rest of the state it grows with the chain, by about 180 bytes per transaction
+        in memory. Checkpoints keep it in a log beside them rather than in each
+        snapshot, see CheckpointStore.
+    '''
+
+    def __init__(self):
+        self.keys = dict()  # name -> current public key
+        self.owners = dict()  # public key -> name it was registered to
+        self.revoked = set()  # revoked public keys, normalized with normalize_key
+        self.transactions = dict()  # transaction id -> height of the block holding it
+        self.height = -1  # position of the last applied block
+        self.hash = None  # hash of the last applied block
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Checkpoints taken before revoked keys were normalized hold them as submitted
+        self.revoked = set(normalize_key(key) for key in self.revoked)
+
+    @staticmethod
+    def parse(tx):
+        '''
+            Split a transaction into its operation, inputs and success flag
+
+            :return: (str, dict, bool), or (None, None, False) if the inputs are not a PKI operation
+        '''
+        try:
+            inputs = json.loads(tx.inputs)
+            # There is a single top level key naming the operation
+            operation = next(iter(inputs))
+            inputs = inputs[operation]
+        except (TypeError, ValueError, AttributeError, StopIteration):
+            return None, None, False
+        try:
+            success = json.loads(tx.outputs)[operation]["success"]
+        except (TypeError, ValueError, KeyError):
+            # Transactions without a result are taken as successful
+            success = True
+        return operation, inputs, success
+
+    def apply_transaction(self, tx):
+        '''
+            Update the state with a single transaction
+
+            :param Transaction tx: The transaction to apply
+        '''
+        operation, inputs, success = self.parse(tx)
+        if not success or not isinstance(inputs, dict):
+            return
+        try:
+            if operation == "REGISTER":
+                self.keys[inputs["name"]] = inputs["public_key"]
+                self.owners[inputs["public_key"]] = inputs["name"]
+            elif operation == "UPDATE":
+                self.keys[inputs["name"]] = inputs["new_public_key"]
+                self.owners[inputs["new_public_key"]] = inputs["name"]
+            elif operation == "REVOKE":
+                self.revoked.add(normalize_key(inputs["public_key"]))
+        except (KeyError, TypeError):
+            pass
+
+    def apply_block(self, block):
+        '''
+            Update the state with every transaction of the next block of the chain
+
+            :param Block block: The block to apply
+        '''
+        if block.pruned:
+            raise ValueError("Block %d was pruned, its transactions cannot be applied" % block.id)
+        self.height += 1
+        for tx in block.transactions:
+            self.apply_transaction(tx)
+            # Moved to the end if it was committed before, the index stays in height order
+            self.transactions.pop(tx.transaction_id, None)
+            self.transactions[tx.transaction_id] = self.height
+        self.hash = block.hash
+
+    def lookup(self, name):
+        '''
+            The current public key of name, None if it is unknown or revoked
+        '''
+        key = self.keys.get(name)
+        if key is None or self.is_revoked(key):
+            return None
+        return key
+
+    def is_revoked(self, public_key):
+        '''
+            Whether public_key has been revoked
+        '''
+        return normalize_key(public_key) in self.revoked
+
+    def revocation_filter(self, false_positive_rate=FALSE_POSITIVE_RATE):
+        '''
+            A compact probabilistic filter of the revoked keys for downstream services
+
+            :param float false_positive_rate: Chance that an unrevoked key is reported as revoked
+            :return: RevocationFilter
+        '''
+        return RevocationFilter.from_keys(self.revoked, false_positive_rate)
+
+    def is_registered(self, name, public_key):
+        '''
+            Whether name or public_key has already been registered
+        '''
+        return name in self.keys or public_key in self.owners
+
+
+class CheckpointStore:
+    '''
+        Periodic on-disk snapshots of a PKIState, tagged with block height and hash
+
+        The transaction indexes of the snapshots are kept in a single append-only log,
+        transactions.idx, so each checkpoint only writes the transactions committed
+        since the previous one.
+    '''
+
+    def __init__(self, path="~/.BlockchainPKI/checkpoints/", interval=CHECKPOINT_INTERVAL, kept=CHECKPOINTS_KEPT):
+        '''
+            :param str path: The directory holding the checkpoints
+            :param int interval: Blocks between two checkpoints
+            :param int kept: Number of checkpoints to keep
+        '''
+        self.path = os.path.expanduser(path)
+        self.interval = interval
+        self.kept = kept
+        self.index_path = os.path.join(self.path, "transactions.idx")
+
+    def heights(self):
+        '''
+            The heights of the stored checkpoints, newest first
+        '''
+        if not os.path.exists(self.path):
+            return []
+        return sorted((int(name[:-5]) for name in os.listdir(self.path) if name.endswith('.ckpt')),
+                      reverse=True)
+
+    def due(self, state):
+        '''
+            Whether a checkpoint should be taken of state
+        '''
+        return (state.height + 1) % self.interval == 0
+
+    def save(self, state):
+        '''
+            Write a checkpoint of state and drop the oldest ones
+
+            :param PKIState state: The state to snapshot
+        '''
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        previous = [height for height in self.heights() if height < state.height]
+        self.log_transactions(state, previous[0] if previous else -1)
+        snapshot = copy.copy(state)
+        # The index is read back from the log when the checkpoint is loaded
+        snapshot.transactions = None
+        path = os.path.join(self.path, "%012d.ckpt" % state.height)
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        with open(path + ".tmp", 'wb') as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        for height in self.heights()[self.kept:]:
+            os.remove(os.path.join(self.path, "%012d.ckpt" % height))
+
+    def log_transactions(self, state, previous):
+        '''
+            Bring the index log up to date with the transactions of state
+
+            Records above the previous checkpoint may come from a checkpoint that was
+            never completed, they are written again from state.
+
+            :param int previous: The height of the checkpoint before the one being taken
+        '''
+        with open(self.index_path, 'ab+') as f:
+            f.seek(0, os.SEEK_END)
+            # Records are in height order, find the first one above previous
+            low, high = 0, f.tell() // INDEX_RECORD.size
+            while low < high:
+                middle = (low + high) // 2
+                f.seek(middle * INDEX_RECORD.size)
+                if INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))[1] <= previous:
+                    low = middle + 1
+                else:
+                    high = middle
+            f.truncate(low * INDEX_RECORD.size)
+            logged = -1
+            if low:
+                f.seek((low - 1) * INDEX_RECORD.size)
+                logged = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))[1]
+
+            records = list()
+            for tx_id, height in reversed(state.transactions.items()):
+                if height <= logged:
+                    break
+                records.append(INDEX_RECORD.pack(bytes.fromhex(tx_id), height))
+            f.seek(0, os.SEEK_END)
+            f.write(b''.join(reversed(records)))
+
+    def read_transactions(self, height):
+        '''
+            The transaction index up to height, from the log
+
+            :return: dict of transaction id -> height
+        '''
+        transactions = dict()
+        if not os.path.exists(self.index_path):
+            return transactions
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        for tx_id, tx_height in INDEX_RECORD.iter_unpack(data[:len(data) - len(data) % INDEX_RECORD.size]):
+            if tx_height > height:
+                break
+            transactions[tx_id.hex()] = tx_height
+        return transactions
+
+    def load(self, height):
+        with open(os.path.join(self.path, "%012d.ckpt" % height), 'rb') as f:
+            state = pickle.load(f)
+        if getattr(state, 'transactions', {}) is None:
+            state.transactions = self.read_transactions(height)
+        return state
+
+    def latest(self, store=None):
+        '''
+            The newest checkpoint, optionally checked against the blocks of a chain store
+
+            :param ChainStore store: If given, a checkpoint is only used if the store
+                                     holds the same block at its height. Checkpoints
+                                     below the blocks pruned from the store are never
+                                     used, their blocks cannot be replayed.
+            :return: PKIState, or None if there is no usable checkpoint
+            :raises ValueError: if the store was pruned and no checkpoint covers it
+        '''
+        # The first block still holding its transactions
+        floor = max((stop for _, stop, _ in store.pruned()), default=0) if store is not None else 0
+        for height in self.heights():
+            if height + 1 < floor:
+                break
+            state = self.load(height)
+            if not hasattr(state, 'transactions'):
+                # Taken before transactions were indexed, the chain has to be replayed
+                continue
+            if store is None:
+                return state
+            block = next(store.read(height, height + 1), None)
+            if block is not None and block.hash == state.hash:
+                return state
+        if floor:
+            raise ValueError("No usable checkpoint in %s covers the blocks pruned from the store, "
+                             "below height %d" % (self.path, floor))
+        return None
@@ -0,0 +1,103 @@
+from hashlib import sha256
+
+import math
+import struct
+
+# Magic number and version at the start of an exported filter
+MAGIC = b'PKRF'
+VERSION = 1
+# magic, version, number of hash functions, number of bits, number of keys
+HEADER = struct.Struct('!4sBBQQ')
+
+FALSE_POSITIVE_RATE = 0.001
+
+
+def normalize_key(public_key):
+    '''
+        Strip the indentation and line endings of a PEM key so that the same
+        key always hashes the same way, however it was formatted
+    '''
+    if isinstance(public_key, bytes):
+        public_key = public_key.decode()
+    return ''.join(line.strip() for line in public_key.splitlines())
+
+
+class RevocationFilter:
+    '''
+        A Bloom filter of revoked public keys
+
+        It answers "is this key revoked?" locally in microseconds and is small
+        enough to ship to services that cannot hold the whole PKI state.
+        A key that was revoked is always reported as revoked; a key that was
+        not may be reported as revoked with the configured false positive rate,
+        so positives should be confirmed against the chain.
+
+        This module has no dependencies on the rest of the node so it can be
+        copied into downstream services.
+    '''
+
+    def __init__(self, bits, hashes):
+        '''
+            :param int bits: Size of the filter in bits
+            :param int hashes: Number of hash functions
+        '''
+        self.bits = bits
+        self.hashes = hashes
+        self.count = 0
+        self.array = bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        '''
+            Create a filter sized for capacity keys at the given false positive rate
+        '''
+        capacity = max(capacity, 1)
+        bits = int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        hashes = max(1, int(round(bits / capacity * math.log(2))))
+        return cls(bits, hashes)
+
+    @classmethod
+    def from_keys(cls, keys, false_positive_rate=FALSE_POSITIVE_RATE):
+        keys = list(keys)
+        revocation_filter = cls.for_capacity(len(keys), false_positive_rate)
+        for key in keys:
+            revocation_filter.add(key)
+        return revocation_filter
+
+    def positions(self, public_key):
+        # Double hashing: derive every bit position from two halves of one digest
+        digest = sha256(normalize_key(public_key).encode()).digest()
+        h1, h2 = struct.unpack_from('!QQ', digest)
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, public_key):
+        for position in self.positions(public_key):
+            self.array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, public_key):
+        array = self.array
+        return all(array[position >> 3] & (1 << (position & 7))
+                   for position in self.positions(public_key))
+
+    def to_bytes(self):
+        return HEADER.pack(MAGIC, VERSION, self.hashes, self.bits, self.count) + bytes(self.array)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, hashes, bits, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version %d revocation filter" % VERSION)
+        revocation_filter = cls(bits, hashes)
+        revocation_filter.count = count
+        revocation_filter.array[:] = data[HEADER.size:HEADER.size + len(revocation_filter.array)]
+        return revocation_filter
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
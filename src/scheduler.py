@@ -0,0 +1,182 @@
+from mempool import DUPLICATE, BUSY
+
+import time
+import heapq
+
+# Lock times below this are block heights, the others unix timestamps
+LOCK_TIME_THRESHOLD = 500000000
+# Default limits of a LockTimeScheduler
+MAX_COUNT = 50000
+# Lock times further ahead than this are refused, in blocks and in seconds
+MAX_HEIGHT_AHEAD = 10000
+MAX_TIME_AHEAD = 24 * 3600
+# Seconds a transaction is held before it is dropped, long enough for any lock
+# time within MAX_TIME_AHEAD to come
+EXPIRY = 2 * 24 * 3600
+
+# What hold() did with a transaction, next to the statuses of Mempool.add
+HELD = 'held'
+TOO_FAR = 'too far'  # its lock_time is further ahead than the scheduler accepts
+
+
+def is_height(lock_time):
+    return lock_time < LOCK_TIME_THRESHOLD
+
+
+class LockTimeScheduler:
+    '''
+        Transactions waiting for their lock_time before they can go into a block
+
+        A lock_time below LOCK_TIME_THRESHOLD is the first block height the transaction
+        can be included at, any other is the unix time it can be included from. The
+        transactions are kept in a heap per kind ordered by lock_time, so releasing the
+        ones that became eligible only looks at those, never at the whole set.
+
+        Like a Mempool, the scheduler is bounded: lock times too far ahead are refused
+        and transactions held longer than the expiry are dropped.
+    '''
+
+    def __init__(self, max_count=MAX_COUNT, max_height_ahead=MAX_HEIGHT_AHEAD, max_time_ahead=MAX_TIME_AHEAD,
+                 expiry=EXPIRY, clock=time.time):
+        '''
+            :param int max_count: The most transactions held at once
+            :param int max_height_ahead: The most blocks a height lock_time can be ahead of the next block
+            :param float max_time_ahead: The most seconds a time lock_time can be ahead of the clock
+            :param float expiry: Seconds a transaction is held at most, None to keep them until released
+            :param clock: Callable returning the current unix time
+        '''
+        self.max_count = max_count
+        self.max_height_ahead = max_height_ahead
+        self.max_time_ahead = max_time_ahead
+        self.expiry = expiry
+        self.clock = clock
+        self.held = dict()  # transaction id -> (Transaction, time it was held), oldest first
+        # Heaps of (lock_time, sequence, transaction id), may hold removed ids
+        self.by_height = []
+        self.by_time = []
+        self.sequence = 0
+        self.counters = {'held': 0, 'released': 0, 'too_far': 0, 'expired': 0}
+
+    def __len__(self):
+        return len(self.held)
+
+    def __contains__(self, tx):
+        return tx.transaction_id in self.held
+
+    def __repr__(self):
+        return "<LockTimeScheduler %d transactions>" % len(self.held)
+
+    def eligible(self, tx, height):
+        '''
+            Whether tx can go into the block at height
+
+            :param Transaction tx: The transaction
+            :param int height: The id of the next block
+        '''
+        if tx.lock_time is None:
+            return True
+        if is_height(tx.lock_time):
+            return tx.lock_time <= height
+        return tx.lock_time <= self.clock()
+
+    def too_far(self, tx, height):
+        '''
+            Whether the lock_time of tx is further ahead than the scheduler accepts
+
+            :param int height: The id of the next block
+        '''
+        if is_height(tx.lock_time):
+            return tx.lock_time > height + self.max_height_ahead
+        return tx.lock_time > self.clock() + self.max_time_ahead
+
+    def hold(self, tx, height):
+        '''
+            Keep a transaction until it becomes eligible, see release()
+
+            :param int height: The id of the next block
+            :return: HELD, DUPLICATE, TOO_FAR, or BUSY if the scheduler is full
+        '''
+        if tx.transaction_id in self.held:
+            return DUPLICATE
+        if self.too_far(tx, height):
+            self.counters['too_far'] += 1
+            return TOO_FAR
+        self.expire()
+        if len(self.held) >= self.max_count:
+            return BUSY
+        self.push(tx)
+        self.counters['held'] += 1
+        return HELD
+
+    def push(self, tx):
+        self.held[tx.transaction_id] = (tx, self.clock())
+        heap = self.by_height if is_height(tx.lock_time) else self.by_time
+        heapq.heappush(heap, (tx.lock_time, self.sequence, tx.transaction_id))
+        self.sequence += 1
+
+    def restore(self, transactions):
+        '''
+            Hold again transactions returned by release() that could not be used, such
+            as those a full mempool refused. They are released again the next time.
+        '''
+        for tx in transactions:
+            if tx.transaction_id not in self.held:
+                self.push(tx)
+        self.counters['released'] -= len(transactions)
+
+    def release(self, height):
+        '''
+            Remove the transactions that can go into the block at height
+
+            :param int height: The id of the next block
+            :return: list of the transactions, by lock_time
+        '''
+        self.expire()
+        released = self.pop(self.by_height, height) + self.pop(self.by_time, self.clock())
+        self.counters['released'] += len(released)
+        return released
+
+    def pop(self, heap, limit):
+        released = list()
+        while heap and heap[0][0] <= limit:
+            entry = self.held.pop(heapq.heappop(heap)[2], None)
+            # Entries of transactions that are gone are skipped
+            if entry is not None:
+                released.append(entry[0])
+        return released
+
+    def expire(self):
+        '''
+            Drop the transactions that have been held longer than the expiry
+        '''
+        if self.expiry is None:
+            return
+        deadline = self.clock() - self.expiry
+        # The oldest transactions are at the front
+        while self.held:
+            tx_id, (_, held) = next(iter(self.held.items()))
+            if held > deadline:
+                break
+            self.discard(tx_id)
+            self.counters['expired'] += 1
+
+    def discard(self, tx_id):
+        '''
+            Remove a transaction if it is held
+
+            :param str tx_id: The transaction id
+        '''
+        self.held.pop(tx_id, None)
+        if len(self.by_height) + len(self.by_time) > 2 * len(self.held) + 64:
+            # Too many removed transactions left in the heaps, rebuild them
+            for heap in (self.by_height, self.by_time):
+                heap[:] = [item for item in heap if item[2] in self.held]
+                heapq.heapify(heap)
+
+    def remove_block(self, block):
+        '''
+            Remove the transactions of a block appended to the chain, a validator
+            that did not wait for them may have included them
+        '''
+        for tx in block.transactions or ():
+            self.discard(tx.transaction_id)
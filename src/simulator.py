@@ -0,0 +1,263 @@
+from validator import Validator
+from client import Client
+from block import Block
+from transaction import Transaction
+import codec
+
+from collections import deque
+
+import sys
+import json
+import time
+import heapq
+import random
+import contextlib
+
+# Default link: 5 ms one way, unlimited bandwidth, no loss
+LINK_LATENCY = 0.005
+VALIDATOR_PORT = 10000
+CLIENT_PORT = 20000
+
+
+def percentile(values, fraction):
+    '''
+        The value below which fraction of the sorted values fall
+    '''
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def ms(seconds):
+    '''
+        A duration for reports, in milliseconds
+    '''
+    return "%.1f ms" % (seconds * 1000) if seconds is not None else "-"
+
+
+class Link:
+    '''
+        The characteristics of every connection between two simulated nodes
+    '''
+
+    def __init__(self, latency=LINK_LATENCY, bandwidth=None, loss=0.0):
+        '''
+            :param float latency: One way delay in seconds
+            :param float bandwidth: Bytes per second, None for unlimited
+            :param float loss: Probability that a message is dropped
+        '''
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.loss = loss
+
+
+class SimValidator(Validator):
+    '''
+        A Validator whose messages go through the simulated network
+    '''
+
+    def __init__(self, simulation, port, **kwargs):
+        super().__init__(hostname="localhost", port=port, bind=False, **kwargs)
+        self.simulation = simulation
+
+    def message(self, v, msg):
+        self.simulation.send(self, v, msg)
+
+
+class SimClient(Client):
+    '''
+        A Client whose transactions go through the simulated network
+    '''
+
+    def __init__(self, simulation, port, **kwargs):
+        super().__init__(hostname="localhost", port=port, bind=False, **kwargs)
+        self.simulation = simulation
+
+    def send_transaction(self, val, tx):
+        self.simulation.send(self, val, tx)
+
+    def dispatch(self, data, addr, start_time):
+        decoded_message = codec.decode(data)
+        for blk in decoded_message if isinstance(decoded_message, list) else [decoded_message]:
+            self.handle_block(blk)
+
+
+class Simulation:
+    '''
+        Validators and clients in one process, connected by an in-memory network
+
+        Time is simulated: messages are delivered by a discrete event loop after
+        the link latency, their serialization time at the link bandwidth, or not
+        at all. Each node handles its messages one at a time with the real
+        Validator code, and the simulated clock advances by the time that took,
+        so CPU bound changes show up in the results.
+    '''
+
+    def __init__(self, validators=4, clients=1, link=None, compression=True, seed=0):
+        '''
+            :param int validators: Number of validators
+            :param int clients: Number of clients
+            :param Link link: The characteristics of every connection
+            :param bool compression: Whether messages are compressed
+            :param int seed: Seed for the loss decisions
+        '''
+        self.link = link or Link()
+        self.compression = compression
+        self.random = random.Random(seed)
+        self.now = 0.0
+        self.events = []  # heap of (time, sequence, callback, args)
+        self.sequence = 0
+
+        self.validators = [SimValidator(self, VALIDATOR_PORT + i) for i in range(validators)]
+        self.clients = [SimClient(self, CLIENT_PORT + i) for i in range(clients)]
+        self.nodes = {node.address: node for node in self.validators + self.clients}
+        self.inbox = {node.address: deque() for node in self.nodes.values()}
+        self.busy = set()  # addresses of the nodes handling a message
+        self.link_free = dict()  # (source, destination) -> time the link is free again
+
+        self.counters = {'messages': 0, 'dropped': 0, 'undeliverable': 0, 'bytes': 0}
+        self.depths = {address: [] for address in self.nodes}  # queue depth seen by each message
+        self.submitted = dict()  # transaction id -> submission time
+        self.holders = dict()  # transaction id -> validators that committed it
+        self.finality = dict()  # transaction id -> time to commit on every validator
+
+        genesis = codec.encode(Block(id=0, previous_hash=""))
+        for index, val in enumerate(self.validators):
+            val.connections = [v for v in self.validators if v is not val]
+            # Every validator starts from its own copy of the same genesis block
+            val.blockchain.append(codec.decode(genesis))
+            val.blockchain.listeners.append(
+                lambda block, index=index: self.committed(index, block))
+        for cli in self.clients:
+            cli.connections = list(self.validators)
+
+    def schedule(self, at, callback, *args):
+        heapq.heappush(self.events, (at, self.sequence, callback, args))
+        self.sequence += 1
+
+    def send(self, source, destination, msg):
+        '''
+            Put a message on the link from source to destination
+        '''
+        self.counters['messages'] += 1
+        if destination.address not in self.nodes:
+            self.counters['undeliverable'] += 1
+            return
+        if isinstance(msg, str):
+            data = msg.encode()
+        else:
+            # Encoding copies the message, nodes never share objects
+            data = codec.encode(msg, compress=self.compression)
+        self.counters['bytes'] += len(data)
+        if self.random.random() < self.link.loss:
+            self.counters['dropped'] += 1
+            return
+
+        # Messages on the same link are serialized one after the other
+        key = (source.address, destination.address)
+        start = max(self.now, self.link_free.get(key, 0.0))
+        if self.link.bandwidth:
+            start += len(data) / self.link.bandwidth
+        self.link_free[key] = start
+        self.schedule(start + self.link.latency, self.deliver, destination.address, data, source.address)
+
+    def deliver(self, address, data, source):
+        self.inbox[address].append((data, source))
+        if address not in self.busy:
+            self.busy.add(address)
+            self.process(address)
+
+    def process(self, address):
+        '''
+            Handle the next message waiting for a node
+        '''
+        inbox = self.inbox[address]
+        if not inbox:
+            self.busy.discard(address)
+            return
+        self.depths[address].append(len(inbox) - 1)
+        data, source = inbox.popleft()
+        start = time.perf_counter()
+        self.nodes[address].dispatch(data, source, int(time.time()))
+        self.schedule(self.now + time.perf_counter() - start, self.process, address)
+
+    def committed(self, index, block):
+        for tx in block.transactions:
+            holders = self.holders.setdefault(tx.transaction_id, set())
+            holders.add(index)
+            if len(holders) == len(self.validators) and tx.transaction_id in self.submitted:
+                self.finality.setdefault(tx.transaction_id, self.now - self.submitted[tx.transaction_id])
+
+    def submit(self, cli, tx):
+        self.submitted[tx.transaction_id] = self.now
+        cli.broadcast_transaction(tx)
+
+    def run(self, transactions=1000, rate=1000.0, until=None):
+        '''
+            Submit transactions at a fixed rate, spread over the clients, and run to completion
+
+            :param int transactions: Number of transactions to submit
+            :param float rate: Transactions submitted per simulated second
+            :param float until: Simulated time to stop at, by default once every message is handled
+            :return: dict, see report()
+        '''
+        for i in range(transactions):
+            tx = Transaction(transaction_type="Standard", inputs=json.dumps(
+                {"REGISTER": {"name": "sim_user_%d" % i, "public_key": "SIM_KEY_%d" % i}}))
+            self.schedule(i / rate, self.submit, self.clients[i % len(self.clients)], tx)
+
+        # Validators print every message they handle
+        with contextlib.redirect_stdout(None):
+            while self.events:
+                at, _, callback, args = heapq.heappop(self.events)
+                if until is not None and at > until:
+                    break
+                self.now = at
+                callback(*args)
+        return self.report()
+
+    def report(self):
+        '''
+            :return: dict with the number of submitted and finalized transactions, the
+                     finalized transactions per second, time to finality percentiles,
+                     message counters and the queue depth of every node
+        '''
+        finality = sorted(self.finality.values())
+        last = max((self.submitted[tx_id] + delay for tx_id, delay in self.finality.items()), default=0.0)
+        report = {'submitted': len(self.submitted), 'finalized': len(finality),
+                  'tx_per_sec': len(finality) / last if last else 0.0,
+                  'finality_p50': percentile(finality, 0.5), 'finality_p95': percentile(finality, 0.95),
+                  'finality_max': finality[-1] if finality else None,
+                  'duration': self.now, 'queue_depth': dict()}
+        report.update(self.counters)
+        for node in self.validators + self.clients:
+            depths = self.depths[node.address]
+            name = "%s%d" % ("validator" if node in self.validators else "client", node.address[1] % 10000)
+            report['queue_depth'][name] = (max(depths, default=0), sum(depths) / len(depths) if depths else 0.0)
+        return report
+
+
+def main(argv):
+    '''
+        python3 simulator.py [validators] [clients] [transactions] [rate] [latency ms] [bandwidth KB/s] [loss]
+    '''
+    args = [float(arg) for arg in argv[1:]]
+    defaults = [4, 1, 1000, 1000, LINK_LATENCY * 1000, 0, 0.0]
+    validators, clients, transactions, rate, latency, bandwidth, loss = args + defaults[len(args):]
+    link = Link(latency=latency / 1000, bandwidth=bandwidth * 1024 or None, loss=loss)
+    simulation = Simulation(int(validators), int(clients), link)
+    report = simulation.run(int(transactions), rate)
+
+    print("Finalized %d of %d transactions in %.2f s simulated: %.1f tx/s" % (
+        report['finalized'], report['submitted'], report['duration'], report['tx_per_sec']))
+    print("Time to finality: p50 %s  p95 %s  max %s" % (
+        ms(report['finality_p50']), ms(report['finality_p95']), ms(report['finality_max'])))
+    print("Messages: %d (%d bytes), %d dropped, %d undeliverable" % (
+        report['messages'], report['bytes'], report['dropped'], report['undeliverable']))
+    for name, (deepest, mean) in sorted(report['queue_depth'].items()):
+        print("  %-12s queue depth max %4d  mean %7.2f" % (name, deepest, mean))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
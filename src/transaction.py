@@ -36,6 +36,16 @@ class Transaction:
         hash_256 = hashlib.sha256(tx_info.encode()).hexdigest()
         return hash_256
 
+    def verify(self):
+        '''
+            Whether the transaction id matches the contents of the transaction
+        '''
+        # The id was computed before it and the status were set
+        unhashed = object.__new__(type(self))
+        unhashed.__dict__.update((attr, value) for attr, value in self.__dict__.items()
+                                 if attr not in ('transaction_id', 'status'))
+        return unhashed.compute_hash() == self.transaction_id
+
     def __eq__(self, other):
         return self.compute_hash() == other.compute_hash()
 
@@ -1,11 +1,18 @@
-from node import Node
+from node import Node, Peer
 from block import Block
 from blockchain import Blockchain
 from transaction import Transaction
-import client
+from chainstore import ChainStore
+from pkistate import CheckpointStore
+from mempool import Mempool, ADDED, BUSY
+from scheduler import LockTimeScheduler, HELD
+from connmgr import ConnectionManager
+from peers import PeerDirectory
+from compact import CompactBlock, TransactionsRequest, BlockTransactions
+from verifier import verify_store
+import codec
 
 import os
-import ssl
 import time
 import errno
 import pickle
@@ -15,48 +22,99 @@ import hashlib
 INCONN_THRESH = 128
 OUTCONN_THRESH = 8
 BUFF_SIZE = 2048
+# Compact blocks waiting for missing transactions, older ones are given up on
+PENDING_BLOCKS = 16
+# How far back from the end of the chain transactions of a compact block are served
+RECENT_BLOCKS = 64
+# Port blocks are sent to when a request for them does not name one
+SYNC_PORT = 4848
+# Seconds an inbound connection gets for its TLS handshake, and then for its whole message
+CONNECTION_TIMEOUT = 10.0
+
+
+def sync_port(blk):
+    '''
+        The port the node asking for the chain from blk listens on, see Client.sync_request
+    '''
+    address = blk.block_generator_address
+    if isinstance(address, (tuple, list)) and len(address) == 2 and isinstance(address[1], int):
+        return address[1]
+    return SYNC_PORT
 
 
 class Validator(Node):
     def __init__(self, hostname=None, addr="0.0.0.0", port=4848, bind=True, capath="~/.BlockchainPKI/validators/",
-                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key"):
+                 certfile="~/.BlockchainPKI/rootCA.pem", keyfile="~/.BlockchainPKI/rootCA.key", compression=True,
+                 chain_path=None, verify_chain=False, trusted_checkpoint=None, prune_horizon=None,
+                 mempool=None, compact_blocks=True):
         '''
             Initialize a Validator
 
             :param str certfile: The path to the CA
             :param str keyfile: The path to the private key
+            :param bool compression: Whether to offer compressed block and batch payloads
+            :param str chain_path: The directory to persist the chain in, None keeps it in memory only
+            :param bool verify_chain: Whether to verify the persisted chain before loading it
+            :param tuple trusted_checkpoint: (height, hash) of a block known to be good,
+                                             the chain up to it is not verified
+            :param int prune_horizon: If given, transaction bodies of blocks this many blocks deep
+                                      are archived and the PKI state is checkpointed next to the
+                                      chain. Clients cannot sync blocks older than that from it.
+            :param Mempool mempool: The pool of waiting transactions, a Mempool with the default
+                                    limits if None
+            :param bool compact_blocks: Whether new blocks are announced to other validators as
+                                        CompactBlocks rather than with every transaction
         '''
-        super().__init__(hostname=hostname, addr=addr, port=port,
-                         bind=bind, capath=capath, certfile=certfile, keyfile=keyfile)
+        super().__init__(hostname=hostname, addr=addr, port=port, bind=bind, capath=capath,
+                         certfile=certfile, keyfile=keyfile, compression=compression)
 
         # Buffer to store incoming transactions
-        self.mempool = list()
-        self.blockchain = Blockchain()
+        self.mempool = mempool if mempool is not None else Mempool()
+        store = ChainStore(chain_path) if chain_path else None
+        if store is not None and verify_chain:
+            report = verify_store(store, trusted_checkpoint)
+            if report['errors']:
+                height, problem = report['errors'][0]
+                raise ValueError("Block %d of %s %s" % (height, store.path, problem))
+        checkpoints = None
+        if store is not None and prune_horizon is not None:
+            # Pruned blocks cannot be replayed, the state is loaded from a checkpoint
+            checkpoints = CheckpointStore(os.path.join(store.path, "checkpoints"))
+        self.blockchain = Blockchain(store=store, checkpoints=checkpoints, prune_horizon=prune_horizon)
+        # Transactions whose lock_time has not come yet, moved to the mempool once it has
+        self.scheduler = LockTimeScheduler()
+        # Transactions leave the pool once they are in a block, whoever built it
+        self.blockchain.listeners.append(self.mempool.remove_block)
+        self.blockchain.listeners.append(self.scheduler.remove_block)
+        # A new height can make height locked transactions eligible
+        self.blockchain.listeners.append(self.release_transactions)
         # self.blockchain.create_genesis_block(). This should only be run on first Validator.
         self.block = Block()
 
         # Buffer to store connection objects
         self.connections = list()
+        # Inbound connections waiting to be served, and the limits on them and on outbound ones
+        self.connmgr = ConnectionManager(INCONN_THRESH, OUTCONN_THRESH)
         self.client_connections = list()
+        self.compact_blocks = compact_blocks
+        # block hash -> (CompactBlock, its transactions so far, indexes of the ones requested)
+        self.pending_blocks = dict()
+        # The file the other validators are listed in, once create_connections() has read it
+        self.peer_directory = None
 
         self.first = 0  # First index of the new sent tx mempool
         self.last = 0   # Last index of the new sent tx mempool
 
-    def create_connections(self):
+    def create_connections(self, path='../validators.txt'):
         '''
-            Create the connection objects from the validators info file and store them as a triple
-            arr[0] = hostname, arr[1] = ip, int(arr[2]) = port
+            Create the connection objects from the validators info file, one
+            "hostname ip port" line per validator. The file is watched for changes,
+            see PeerDirectory.
         '''
-        f = open('../validators.txt', 'r')
-        for line in f:
-            arr = line.split(' ')
-            if self.hostname == arr[0] and self.address == (arr[1], int(arr[2])):
-                continue
-            else:
-                v = Validator(
-                    hostname=arr[0], addr=arr[1], port=int(arr[2]), bind=False)
-                self.connections.append(v)
-        f.close()
+        self.peer_directory = PeerDirectory(path, exclude=(self.hostname,) + tuple(self.address))
+        # Connections made before, such as syncing clients, are kept alongside
+        self.peer_directory.peers.extend(self.connections)
+        self.connections = self.peer_directory.peers
 
     def message(self, v, msg):
         '''
@@ -67,34 +125,41 @@ class Validator(Node):
 
             v's net should be initialized and listening for incoming connections,
             probably bound to listen for all connections (addr="0.0.0.0").
-            msg must be an instance of str or bytes.
+            msg must be an instance of str, Transaction, Block, a compact block message
+            or a list (batch) of them.
+            Transactions, Blocks and batches are compressed when v agrees to it.
         '''
         if self.net and self != v:
             # Connect to v's inbound net using self's outbound net
-            address = v.address
-            if isinstance(msg, str):
-                msg = msg.encode()  # encode the msg to binary
-            elif isinstance(msg, Transaction) or isinstance(msg, Block):
-                msg = pickle.dumps(msg)
-            else:
+            if not isinstance(msg, (str, Transaction, Block, CompactBlock, TransactionsRequest,
+                                    BlockTransactions, list)):
                 raise TypeError(
-                    "Only Transaction, Block, or str types are allowed (not %s)" % type(msg))
+                    "Only Transaction, Block, list, or str types are allowed (not %s)" % type(msg))
 
             print("Attempting to send to %s:%s" % v.address)
-            secure_conn = self.context.wrap_socket(
-                socket.socket(socket.AF_INET, socket.SOCK_STREAM), server_hostname=v.hostname)
-            try:
-                secure_conn.connect(address)  # Connect to v
-                # Send the entirety of the message
-                secure_conn.sendall(msg)
-            except OSError as e:
-                # Except cases for if the send fails
-                if e.errno == errno.ECONNREFUSED:
+            secure_conn = None
+            # At most OUTCONN_THRESH connections are open at once
+            with self.connmgr.outbound():
+                try:
+                    secure_conn = self.connect(v)  # Connect to v, resuming a previous session if possible
+                    if isinstance(msg, str):
+                        msg = msg.encode()  # encode the msg to binary
+                    else:
+                        # The encoding was negotiated during the handshake
+                        msg = codec.encode(
+                            msg, compress=codec.negotiated_compression(secure_conn))
+                    # Send the entirety of the message
+                    self.send_message(secure_conn, msg)
+                    self.cache_session(v, secure_conn)
+                except OSError as e:
+                    # Except cases for if the send fails
+                    if e.errno == errno.ECONNREFUSED:
+                        print(e)
+                except socket.error as e:
                     print(e)
-            except socket.error as e:
-                print(e)
-            finally:
-                secure_conn.close()
+                finally:
+                    if secure_conn is not None:
+                        secure_conn.close()
         else:
             raise Exception(
                 "The net must be initialized and listening for connections")
@@ -103,9 +168,50 @@ class Validator(Node):
         '''
             Broadcast a message to every other validator that is connected to this node
         '''
+        if self.peer_directory is not None:
+            self.peer_directory.refresh()
         for conn in self.connections:
             self.message(conn, tx)
 
+    def announce(self, blk):
+        '''
+            Broadcast a new block, as a CompactBlock to the other validators and whole to clients
+        '''
+        if self.compact_blocks:
+            self.broadcast(CompactBlock.from_block(blk, (self.hostname, self.address[1])))
+        else:
+            self.broadcast(blk)
+        for c in self.client_connections:
+            self.message(c, blk)
+
+    def peer(self, hostname, port):
+        '''
+            The connection object of a node, reusing a known one so its TLS session resumes
+        '''
+        for conn in self.connections + self.client_connections:
+            if conn.hostname == hostname and conn.address[1] == port:
+                return conn
+        return Peer(hostname=hostname, port=port)
+
+    def known_peer(self, sender):
+        '''
+            The validator among the connections that a message claims to come from
+
+            Compact block messages name their sender, and only known validators are
+            answered, so a message cannot make this node connect anywhere else.
+
+            :param tuple sender: The (hostname, port) given in the message
+            :return: Peer, or None if no connection matches
+        '''
+        try:
+            hostname, port = sender
+        except (TypeError, ValueError):
+            return None
+        for conn in self.connections:
+            if conn.hostname == hostname and conn.address[1] == port:
+                return conn
+        return None
+
     def receive(self, mode='secure'):
         '''
             Receive thread; handles incoming transactions
@@ -113,109 +219,318 @@ class Validator(Node):
             the number of transactions is 10 then call the Round Robin to chose
             Block Generator (Leader)
 
+            Peers are served one connection at a time in turn and within their rate
+            limits, see ConnectionManager.
+
             :param: str mode: whether or not the connection is encrypted ('secure' or None).
             mode=None specifies the connection should not be encrypted.
         '''
+        self.accept_pending()
+        pending = self.connmgr.next()
+        if pending is None:
+            return
+        conn, addr = pending
+        print("Connection from %s:%d" % (addr[0], addr[1]))
         try:
-            conn, addr = self.net.accept()
-            print("Connection from %s:%d" % (addr[0], addr[1]))
-            if mode is 'secure':
-                s = self.receive_context.wrap_socket(conn, server_side=True)
+            self.serve(conn, addr, mode)
+        except socket.timeout:
+            print("Dropped the connection from %s:%d: timed out" % (addr[0], addr[1]))
+        except (ValueError, OSError) as e:
+            # Oversized, truncated or malformed messages and failed handshakes only
+            # cost the connection they arrived on
+            print("Dropped the connection from %s:%d: %s" % (addr[0], addr[1], e))
+        except Exception as e:
+            # A message that slipped past the checks still only costs its connection,
+            # the node keeps serving the others
+            print("Failed to handle the message from %s:%d: %r" % (addr[0], addr[1], e))
+        finally:
+            conn.close()
+
+    def serve(self, conn, addr, mode='secure'):
+        '''
+            Read and handle the message of one inbound connection, then reply to it
+        '''
+        if mode is 'secure':
+            s = self.receive_context.wrap_socket(conn, server_side=True)
+        else:
+            warn = input(
+                "Warning: Are you sure you want to allow insecure connections? (y/n)")
+            warn = warn.strip().lower()
+            if warn == 'y':
+                mode = 'insecure'
+                s = conn
+            elif warn == 'n':
+                print("Setting mode=secure")
+                mode = 'secure'
+                s = self.receive_context.wrap_socket(
+                    conn, server_side=True)
             else:
-                warn = input(
-                    "Warning: Are you sure you want to allow insecure connections? (y/n)")
-                warn = warn.strip().lower()
-                if warn == 'y':
-                    mode = 'insecure'
-                    s = conn
-                elif warn == 'n':
-                    print("Setting mode=secure")
-                    mode = 'secure'
-                    s = self.receive_context.wrap_socket(
-                        conn, server_side=True)
-                else:
-                    raise ValueError("Answer must be either (y/n)")
-
-            DATA = bytearray()  # used to store the incoming data
-            with s:
-                start_time = int(time.time())
-                # Receive the initial BUFF_SIZE chunk of data
-                data = s.recv(BUFF_SIZE)
-                while data:
-                    # Continue receiving chunks of the data until the buffer is empty
-                    # (until the client sends empty data)
-                    DATA += data
-                    data = s.recv(BUFF_SIZE)
-
-                if b'/cert' in DATA:
-                    # Validator sent their certificate
-                    DATA = DATA[5:]  # Remove flag
-                    self.save_new_certfile(data=DATA)
+                raise ValueError("Answer must be either (y/n)")
+
+        with s:
+            start_time = int(time.time())
+            # Read the whole message into the reusable receive buffer
+            DATA = self.recv_buffer.read(s, CONNECTION_TIMEOUT)
+            self.connmgr.received(addr, len(DATA))
+
+            if DATA[:5] == b'/cert':
+                # Validator sent their certificate
+                DATA = DATA[5:]  # Remove flag
+                self.save_new_certfile(data=DATA)
+                return
+
+            reply = self.dispatch(DATA, addr, start_time)
+            if reply is not None:
+                self.send_reply(s, reply)
+
+    def accept_pending(self):
+        '''
+            Queue every connection waiting on the listen backlog with the connection manager
+
+            Waits for a connection as long as the socket timeout allows when none is
+            queued already, and at most until a queued one can be served when their
+            peers are throttled.
+        '''
+        timeout = self.net.gettimeout()
+        try:
+            wait = self.connmgr.wait()
+            if wait is not None:
+                self.net.settimeout(wait if timeout is None else min(wait, timeout))
+            while True:
+                try:
+                    conn, addr = self.net.accept()
+                except (socket.timeout, BlockingIOError):
                     return
+                # A peer that stalls during the handshake or its message is dropped
+                conn.settimeout(CONNECTION_TIMEOUT)
+                self.net.settimeout(0)
+                for refused in self.connmgr.admit(conn, addr):
+                    refused.close()
+        finally:
+            self.net.settimeout(timeout)
 
-                # Deserialize the entire object when data reception has ended
-                decoded_message = pickle.loads(DATA)
-                if type(decoded_message) == Transaction:
-                    # Add transaction to the pool
-                    self.add_transaction(decoded_message)
-                    print(self.mempool)
-                    # broadcast to network
-                    self.broadcast(decoded_message)
-                    end_time = int(time.time())
-
-                    # Probably need to add a leader flag here
-                    if (end_time - start_time) >= 10:
-                        start_time = int(time.time())
-                        print("Call Round Robin to chose the leader")
-                        self.create_block(self.first, self.last)
-                    elif len(self.mempool) >= 3:
-                        start_time = int(time.time())
-                        blk = self.create_block(0, 3)
-                        self.blockchain.chain.append(blk)
-                        self.broadcast(blk)
-                        self.mempool = list()
-                elif type(decoded_message) == Block:
-                    # If we are receiving an old block, we know we have received a client connection
-                    if decoded_message.id <= self.blockchain.last_block.id:
-                        h_name = socket.gethostbyaddr(addr[0])[0]
-                        c = client.Client(
-                            hostname=h_name, addr=addr[0], port=4848, bind=False)
-                        self.connections.append(c)
-                        # Send the chain from the id onwards
-                        for blk in self.blockchain.chain[decoded_message.id:]:
-                            self.message(c, blk)
-                    if decoded_message.id > self.blockchain.last_block.id:
-                        self.blockchain.chain.append(decoded_message)
-                else:
-                    print("Data received was not of type Transaction or Block, but of type %s: \n%s\n" % (
-                        type(decoded_message), decoded_message))
-        except socket.timeout:
-            pass
+    def dispatch(self, data, addr, start_time):
+        '''
+            Deserialize a received message and handle its contents
+
+            :param memoryview data: The message as received, only valid until the next receive
+            :param tuple addr: The address of the sender
+            :param int start_time: When reception of the message started
+            :return: bytes, the reply to the sender
+        '''
+        # Deserialize the entire object when data reception has ended
+        try:
+            decoded_message = codec.decode(data)
+        except codec.DecodeError as e:
+            # Only this message is lost, the node keeps serving the others
+            print("Dropped a malformed message from %s:%d: %s" % (addr[0], addr[1], e))
+            return None
+        if not isinstance(decoded_message, list):
+            decoded_message = [decoded_message]
+        # A batch holds several messages sent over a single connection
+        statuses = [self.handle_message(msg, addr, start_time) for msg in decoded_message]
+        return codec.REPLY_BUSY if BUSY in statuses else codec.REPLY_OK
+
+    def handle_message(self, decoded_message, addr, start_time, verified=False):
+        '''
+            Handle a single deserialized Transaction or Block
+
+            :param decoded_message: The received object
+            :param tuple addr: The address of the sender
+            :param int start_time: When reception of the message started
+            :param bool verified: Whether the hashes of a Block were checked already, see mpvalidator
+            :return: the mempool status of a Transaction (see Mempool.add) or HELD, None otherwise
+        '''
+        if type(decoded_message) == Transaction:
+            # Add transaction to the pool, dropping ones that are committed, already pooled
+            # or that do not fit
+            status = self.add_transaction(decoded_message)
+            if status not in (ADDED, HELD):
+                return status
+            print(self.mempool)
+            # broadcast to network, the other validators hold locked transactions as well
+            self.broadcast(decoded_message)
+            if status == HELD:
+                return status
+            end_time = int(time.time())
+
+            # Probably need to add a leader flag here
+            if (end_time - start_time) >= 10:
+                start_time = int(time.time())
+                print("Call Round Robin to chose the leader")
+                self.create_block(self.first, self.last)
+            elif len(self.mempool) >= 3:
+                start_time = int(time.time())
+                blk = self.create_block(0, 3)
+                self.blockchain.append(blk)
+                self.announce(blk)
+            return status
+        elif type(decoded_message) == Block:
+            # If we are receiving an old block, we know we have received a client connection
+            if decoded_message.id <= self.blockchain.pki.height:
+                h_name = socket.gethostbyaddr(addr[0])[0]
+                c = self.peer(h_name, sync_port(decoded_message))
+                if c not in self.client_connections:
+                    self.client_connections.append(c)
+                # Send the chain from the id onwards as a single batch, the loaded blocks
+                # may only be the last ones
+                self.message(c, list(self.blockchain.blocks(decoded_message.id)))
+            self.accept_block(decoded_message, verified)
+        elif type(decoded_message) == CompactBlock:
+            self.handle_compact_block(decoded_message)
+        elif type(decoded_message) == TransactionsRequest:
+            requester = self.known_peer(decoded_message.sender)
+            if requester is None or not decoded_message.well_formed():
+                return None
+            block = self.recent_block(decoded_message.block_hash)
+            if block is not None and not block.pruned:
+                transactions = [block.transactions[i] for i in decoded_message.indexes
+                                if 0 <= i < len(block.transactions)]
+                self.message(requester, BlockTransactions(block.hash, transactions))
+        elif type(decoded_message) == BlockTransactions:
+            if decoded_message.well_formed():
+                self.complete_block(decoded_message)
+        else:
+            print("Data received was not of type Transaction or Block, but of type %s: \n%s\n" % (
+                type(decoded_message), decoded_message))
+
+    def accept_block(self, blk, verified=False):
+        '''
+            Append a block received for the end of the chain if it extends it
+
+            :param bool verified: Whether the hashes of blk were checked already
+            :return: bool, whether it was appended
+        '''
+        if blk.id <= self.blockchain.pki.height:
+            return False
+        if not self.blockchain.validate(blk, verified):
+            return False
+        self.blockchain.append(blk)
+        return True
+
+    def recent_block(self, block_hash):
+        '''
+            One of the last RECENT_BLOCKS blocks of the chain by hash, or None
+        '''
+        for block in reversed(self.blockchain.chain[-RECENT_BLOCKS:]):
+            if block.hash == block_hash:
+                return block
+        return None
+
+    def handle_compact_block(self, compact):
+        '''
+            Rebuild a block announced as a CompactBlock from the mempool, and request
+            the transactions that are not in it from the sender
+
+            Nothing is done for senders that are not known validators, or messages
+            that are not well formed.
+        '''
+        if self.known_peer(compact.sender) is None or not compact.well_formed():
+            return
+        if compact.header.id <= self.blockchain.pki.height or compact.hash in self.pending_blocks:
+            return
+        transactions = [self.mempool.find(short) for short in compact.short_ids]
+        missing = [i for i, tx in enumerate(transactions) if tx is None]
+        if not missing:
+            block = compact.assemble(transactions)
+            if self.accept_block(block) or block.verify():
+                # Appended, or the transactions are right but the block does not fit the chain
+                return
+            # A short id matched another transaction than the one in the block, or the copies
+            # in the mempool do not hash the same way, fetch them all
+            missing = list(range(len(transactions)))
+        self.request_transactions(compact, transactions, missing)
+
+    def complete_block(self, response):
+        '''
+            Finish a compact block with the transactions received for it
+        '''
+        pending = self.pending_blocks.pop(response.block_hash, None)
+        if pending is None:
+            return
+        compact, transactions, missing = pending
+        if len(response.transactions) != len(missing):
+            return
+        for i, tx in zip(missing, response.transactions):
+            # Handled like a broadcast transaction, which also sets its status the way the
+            # sender's copy was set when the block was built (the block hash covers it)
+            self.add_transaction(tx)
+            transactions[i] = tx
+        block = compact.assemble(transactions)
+        if self.accept_block(block) or block.verify() or len(missing) == len(transactions):
+            return
+        # The block hash also covers which values its transactions share, and copies taken
+        # from different messages do not share them. Fetch them all in one message instead.
+        self.request_transactions(compact, transactions, list(range(len(transactions))))
+
+    def request_transactions(self, compact, transactions, missing):
+        '''
+            Ask the sender of a compact block for the transactions at the indexes in missing
+        '''
+        sender = self.known_peer(compact.sender)
+        if sender is None:
+            return
+        if len(self.pending_blocks) >= PENDING_BLOCKS:
+            del self.pending_blocks[next(iter(self.pending_blocks))]
+        self.pending_blocks[compact.hash] = (compact, transactions, missing)
+        self.message(sender, TransactionsRequest(compact.hash, missing, (self.hostname, self.address[1])))
 
     def add_transaction(self, tx):
         '''
-            Receive incoming transactions and add to mempool
+            Receive incoming transactions and add to mempool, or to the scheduler until
+            their lock_time has come
+
+            :return: the status returned by Mempool.add or LockTimeScheduler.hold, or None
+                     if the transaction is not wanted
         '''
+        self.release_transactions()
         if tx.status == 'YES':
             pass
         elif tx.status == 'NO':
             pass
+        elif self.blockchain.is_committed(tx.transaction_id):
+            # Replayed or rebroadcast after it was included in a block
+            pass
         else:
-            if tx not in self.mempool:
-                self.last = self.last + 1
-                tx.status = "Open"
-                self.mempool.append(tx)
+            tx.status = "Open"
+            height = self.next_height()
+            if not self.scheduler.eligible(tx, height):
+                return self.scheduler.hold(tx, height)
+            return self.pool_transaction(tx)
+        return None
+
+    def pool_transaction(self, tx):
+        status = self.mempool.add(tx)
+        if status == ADDED:
+            self.last = self.last + 1
+        return status
+
+    def next_height(self):
+        # The chain may start after a checkpoint, or hold no block at all past it
+        return self.blockchain.pki.height + 1
+
+    def release_transactions(self, block=None):
+        '''
+            Move the transactions whose lock_time has come from the scheduler to the mempool
+
+            :param Block block: The block just appended, when called as a chain listener
+        '''
+        released = self.scheduler.release(self.next_height())
+        for i, tx in enumerate(released):
+            if self.pool_transaction(tx) == BUSY:
+                # The mempool is full, the rest wait in the scheduler until it has room
+                self.scheduler.restore(released[i:])
+                break
 
     def create_block(self, first, last):
-        block_tx_pool = []
-        for tx in range(first, last):
-            block_tx_pool.append(self.mempool[tx])
+        self.release_transactions()
+        block_tx_pool = self.mempool[first:last]
 
         self.block = Block(
             version=0.1,
-            id=len(self.blockchain.chain),
+            id=self.next_height(),
             transactions=block_tx_pool,
-            previous_hash=self.blockchain.last_block.hash,
+            previous_hash=self.blockchain.pki.hash,
             block_generator_address=self.address,
             block_generation_proof=self.certfile,
             nonce=0,
@@ -244,7 +559,8 @@ class Validator(Node):
 
 if __name__ == "__main__":
     port = int(input("Enter a port number: "))
-    val = Validator(hostname="localhost", port=port)
+    val = Validator(hostname="localhost", port=port,
+                    chain_path="~/.BlockchainPKI/validator/chain/")
 
     # THIS COMMAND SHOULD ONLY BE EXECUTED ON THE VERY FIRST VALIDATOR TO GO ACTIVE
     # val.blockchain.create_genesis_block()
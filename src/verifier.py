@@ -0,0 +1,118 @@
+from chainstore import ChainStore
+
+from concurrent.futures import ProcessPoolExecutor
+
+import sys
+import time
+
+# Blocks verified by a worker in one job
+CHUNK_SIZE = 500
+
+
+def verify_block(block, height, previous_hash=None):
+    '''
+        Check a single block of a chain
+
+        :param Block block: The block to check
+        :param int height: Its position in the chain
+        :param str previous_hash: The hash of the block before it, None to skip the linkage check
+        :return: list of str describing what is wrong, empty if nothing is
+    '''
+    problems = list()
+    if block.id != height:
+        problems.append("has id %r" % block.id)
+    if previous_hash is not None and block.previous_hash != previous_hash:
+        problems.append("does not link to the previous block")
+    if not block.verify():
+        problems.append("merkle root or hash does not match its contents")
+    for tx in block.transactions or ():
+        if not tx.verify():
+            problems.append("transaction %s does not match its id" % tx.transaction_id)
+    return problems
+
+
+def verify_range(path, start, stop):
+    '''
+        Check the blocks of a chain store from start up to stop, run by the workers
+
+        Blocks are read by the worker itself, so only the results cross processes.
+        The link into the first block is left to the caller.
+
+        :return: (int start, str previous hash of the first block, str hash of the last block,
+                  list of (height, problem))
+    '''
+    errors = list()
+    first_previous, previous = None, None
+    for height, block in enumerate(ChainStore(path).read(start, stop), start):
+        if height == start:
+            first_previous = block.previous_hash
+        errors += [(height, problem) for problem in verify_block(block, height, previous)]
+        previous = block.hash
+    return start, first_previous, previous, errors
+
+
+def verify_store(store, trusted=None, workers=None, chunk_size=CHUNK_SIZE):
+    '''
+        Check the linkage, merkle roots, block hashes and transaction ids of a stored chain
+
+        The chain is split into chunks verified in a process pool. Chunk boundaries
+        are linked up afterwards. History up to a trusted checkpoint is not verified,
+        only the block at the checkpoint is compared against the trusted hash.
+
+        :param ChainStore store: The chain to check
+        :param tuple trusted: (height, hash) of a block known to be good, or None
+        :param int workers: Number of processes, defaults to the number of cores
+        :param int chunk_size: Blocks verified by a worker in one job
+        :return: dict with the height of the chain, the numbers of verified and skipped
+                 blocks, and the errors found as (height, problem) pairs
+    '''
+    length = len(store)
+    start, previous_hash, errors = 0, None, list()
+    if trusted is not None:
+        height, trusted_hash = trusted
+        block = next(store.read(height, height + 1), None)
+        if block is None or block.hash != trusted_hash:
+            errors.append((height, "does not match the trusted checkpoint"))
+            return {'height': length - 1, 'verified': 0, 'skipped': 0, 'errors': errors}
+        start, previous_hash = height + 1, trusted_hash
+
+    chunks = [(store.path, begin, min(begin + chunk_size, length)) for begin in range(start, length, chunk_size)]
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(verify_range, *zip(*chunks)))
+    else:
+        results = [verify_range(*chunk) for chunk in chunks]
+
+    for begin, first_previous, last_hash, chunk_errors in results:
+        if previous_hash is not None and first_previous != previous_hash:
+            errors.append((begin, "does not link to the previous block"))
+        errors += chunk_errors
+        previous_hash = last_hash
+    return {'height': length - 1, 'verified': length - start, 'skipped': start, 'errors': errors}
+
+
+def parse_trusted(value):
+    '''
+        Parse a HEIGHT:HASH trusted checkpoint
+    '''
+    height, _, block_hash = value.partition(':')
+    return int(height), block_hash
+
+
+def main(argv):
+    '''
+        python3 verifier.py [chain path] [HEIGHT:HASH]   -Verify a chain store above an optional trusted checkpoint
+    '''
+    path = argv[1] if len(argv) > 1 else "~/.BlockchainPKI/validator/chain/"
+    trusted = parse_trusted(argv[2]) if len(argv) > 2 else None
+    start = time.perf_counter()
+    report = verify_store(ChainStore(path), trusted)
+    print("Verified %d blocks up to height %d in %.2f s (%d skipped below the trusted checkpoint)" % (
+        report['verified'], report['height'], time.perf_counter() - start, report['skipped']))
+    for height, problem in report['errors']:
+        print("Block %d %s" % (height, problem))
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
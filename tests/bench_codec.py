@@ -0,0 +1,60 @@
+# Wire codec benchmark: schema encoding against pickle
+# Run from the tests directory: python3 bench_codec.py [runs]
+
+import sys
+import json
+import time
+import pickle
+
+sys.path.append('../src/')
+from block import Block
+from blockchain import NOAH_PUBLIC_KEY
+from transaction import Transaction
+import codec
+
+
+def register_tx(name):
+    inputs = json.dumps({"REGISTER": {"name": name, "public_key": NOAH_PUBLIC_KEY}})
+    outputs = json.dumps({"REGISTER": {"success": True}})
+    return Transaction(transaction_type="Standard", tx_generator_address=NOAH_PUBLIC_KEY,
+                       inputs=inputs, outputs=outputs)
+
+
+def timed(function, argument, runs):
+    '''
+        Average time of function(argument), in microseconds
+    '''
+    start = time.perf_counter()
+    for _ in range(runs):
+        function(argument)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages = [
+        ("transaction", register_tx("noah")),
+        ("block of 50", Block(id=1, transactions=[register_tx("user %d" % i) for i in range(50)])),
+        ("sync of 20 blocks", [Block(id=i, transactions=[register_tx("user %d %d" % (i, j)) for j in range(50)])
+                               for i in range(20)]),
+    ]
+    for name, message in messages:
+        schema, pickled = codec.encode(message), pickle.dumps(message)
+        print("%-18s schema %8d bytes  decode %9.1f us  encode %9.1f us" % (
+            name, len(schema), timed(codec.decode, schema, runs), timed(codec.encode, message, runs)))
+        print("%-18s pickle %8d bytes  decode %9.1f us  encode %9.1f us" % (
+            "", len(pickled), timed(pickle.loads, pickled, runs), timed(pickle.dumps, message, runs)))
+
+        # Time until the first block of a batch can be handled
+        if isinstance(message, list):
+            def first_item(payload):
+                decoder = codec.StreamDecoder()
+                for i in range(0, len(payload), 16384):
+                    if decoder.feed(payload[i:i + 16384]):
+                        return
+            print("%-18s first item after %.1f us (schema, streamed)  %.1f us (pickle, whole)" % (
+                "", timed(first_item, schema, runs), timed(pickle.loads, pickled, runs)))
+
+
+if __name__ == '__main__':
+    main()
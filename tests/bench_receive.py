@@ -0,0 +1,66 @@
+# Receive path benchmark for multi-megabyte messages
+# Run from the tests directory: python3 bench_receive.py [runs]
+
+import sys
+import time
+import socket
+import threading
+
+sys.path.append('../src/')
+from node import ReceiveBuffer
+import codec
+
+BUFF_SIZE = 2048
+SIZES = [1, 4, 16]  # MiB
+
+
+def send(s, payload, framed):
+    with s:
+        if framed:
+            s.sendall(codec.frame_header(len(payload)))
+        s.sendall(payload)
+
+
+def read_chunked(s):
+    '''
+        The previous receive loop: fixed size recv calls appended to a bytearray
+    '''
+    DATA = bytearray()
+    data = s.recv(BUFF_SIZE)
+    while data:
+        DATA += data
+        data = s.recv(BUFF_SIZE)
+    return DATA
+
+
+def timed(payload, read, framed, runs):
+    '''
+        Average time to receive payload over a local socket pair, in milliseconds
+    '''
+    total = 0.0
+    for _ in range(runs):
+        a, b = socket.socketpair()
+        sender = threading.Thread(target=send, args=(a, payload, framed))
+        start = time.perf_counter()
+        sender.start()
+        with b:
+            data = read(b)
+        total += time.perf_counter() - start
+        sender.join()
+        assert len(data) == len(payload)
+    return total / runs * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    buffer = ReceiveBuffer()
+    for size in SIZES:
+        payload = bytes(size * 1024 * 1024)
+        chunked = timed(payload, read_chunked, False, runs)
+        framed = timed(payload, buffer.read, True, runs)
+        print("%3d MiB  recv(%d) loop: %7.1f ms   recv_into framed: %7.1f ms   (%.1fx)" % (
+            size, BUFF_SIZE, chunked, framed, chunked / framed))
+
+
+if __name__ == '__main__':
+    main()
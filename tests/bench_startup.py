@@ -0,0 +1,40 @@
+# Cold-start benchmark for scripted PKI queries
+# Run from the tests directory: python3 bench_startup.py [name] [runs]
+
+import os
+import sys
+import time
+import subprocess
+
+CLIENT = os.path.join('..', 'src', 'client.py')
+
+
+def cold_start(args, runs):
+    '''
+        Average wall time of fresh interpreters running args, in milliseconds
+    '''
+    total = 0.0
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        total += time.perf_counter() - start
+    return total / runs * 1000
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else "noah_coomer"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    baseline = cold_start(['-c', 'pass'], runs)
+    print("Interpreter startup:            %.1f ms" % baseline)
+    print("Import client module:           %.1f ms" %
+          cold_start(['-c', 'import sys; sys.path.insert(0, "../src"); import client'], runs))
+    print("Query to first result:          %.1f ms" %
+          cold_start([CLIENT, 'query', name], runs))
+    print("Import with networking/crypto:  %.1f ms" % cold_start(
+        ['-c', 'import sys; sys.path.insert(0, "../src"); import client, ssl; import Crypto.PublicKey.RSA'], runs))
+
+
+if __name__ == '__main__':
+    main()
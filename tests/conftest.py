@@ -0,0 +1,56 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+import sys
+sys.path.append('../src/')
+from transaction import Transaction
+
+
+class Clock:
+    '''
+        A clock for the classes taking one, which only moves when now is set
+    '''
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_pki_tx(operation, success=True, **inputs):
+    return Transaction(inputs=json.dumps({operation: inputs}),
+                       outputs=json.dumps({operation: {"success": success}}))
+
+
+@pytest.fixture
+def pki_tx():
+    '''
+        Builds a PKI transaction from its operation, success flag and inputs
+    '''
+    return make_pki_tx
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def certificate(tmp_path):
+    '''
+        Generates self-signed (certfile, keyfile) pairs in a temporary directory
+    '''
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl is not installed")
+
+    def generate(name="localhost"):
+        certfile, keyfile = str(tmp_path / ("%s.pem" % name)), str(tmp_path / ("%s.key" % name))
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=%s' % name, '-keyout', keyfile, '-out', certfile],
+                       check=True, capture_output=True)
+        return certfile, keyfile
+    return generate
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+import sys
+sys.path.append('../src/')
+from aclient import AsyncClient
+from block import Block
+from blockchain import Blockchain
+from transaction import Transaction
+
+
+class LoopbackClient:
+    '''
+        Stands in for the validator network: every batch sent is confirmed in the next block
+    '''
+
+    def __init__(self):
+        self.blockchain = Blockchain()
+        self.lock = threading.Lock()
+        self.address = ("127.0.0.1", 4848)
+        self.sync_requests = list()
+
+    def receive(self):
+        pass
+
+    def sync_request(self, height):
+        return Block(id=height, block_generator_address=self.address)
+
+    def broadcast_transaction(self, request):
+        self.sync_requests.append(request)
+        return [True]
+
+    def deliver(self, batch):
+        with self.lock:
+            self.confirm(batch)
+        return True
+
+    def confirm(self, batch):
+        last_block = self.blockchain.last_block
+        self.blockchain.append(Block(id=last_block.id + 1 if last_block else 0,
+                                     transactions=batch, previous_hash=last_block.hash if last_block else ""))
+
+
+def test_merkle_proofs():
+    for count in range(1, 12):
+        block = Block(id=0, transactions=[Transaction(inputs=str(i)) for i in range(count)])
+        for index in range(count):
+            proof = block.merkle_proof(index)
+            assert Block.verify_merkle_proof(block.sha256_txs[index], proof, block.merkle_root)
+            assert not Block.verify_merkle_proof(block.sha256_txs[index - 1] + "0", proof, block.merkle_root)
+
+
+def test_submissions_resolve_with_inclusion_proofs():
+    loop = asyncio.new_event_loop()
+    client = AsyncClient(LoopbackClient(), loop=loop, batch_size=100)
+    txs = [Transaction(inputs=str(i)) for i in range(1000)]
+
+    confirmations = loop.run_until_complete(
+        asyncio.wait_for(asyncio.gather(*(client.submit(tx) for tx in txs)), 10))
+    loop.close()
+
+    assert sorted(set(c.height for c in confirmations)) == list(range(10))
+    assert all(c.verify() for c in confirmations)
+    assert not client.pending
+
+
+def test_defaults_to_the_running_loop():
+    async def confirm():
+        client = AsyncClient(LoopbackClient())
+        assert client.loop is asyncio.get_running_loop()
+        return await client.confirm(Transaction(inputs="x"), timeout=10)
+
+    assert asyncio.run(confirm()).height == 0
+
+
+def test_start_asks_for_the_missing_blocks():
+    async def start():
+        loopback = LoopbackClient()
+        loopback.confirm([Transaction(inputs="x")])
+        client = AsyncClient(loopback)
+        await client.start()
+        return loopback.sync_requests
+
+    requests = asyncio.run(start())
+    assert [(request.id, request.block_generator_address) for request in requests] == [(0, ("127.0.0.1", 4848))]
+
+
+def test_failed_sends_fail_their_futures():
+    class UnreachableClient(LoopbackClient):
+        def deliver(self, batch):
+            raise ConnectionRefusedError("no validator is listening")
+
+    class BusyClient(LoopbackClient):
+        def deliver(self, batch):
+            return False
+
+    async def confirm(client):
+        client = AsyncClient(client)
+        return await client.confirm(Transaction(inputs="x"), timeout=10)
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(confirm(UnreachableClient()))
+    with pytest.raises(ConnectionError, match="No validator took"):
+        asyncio.run(confirm(BusyClient()))
@@ -47,8 +47,10 @@ def new_block():
     
     # Format block to be sent to django
     data = {
-        "header":"Block Header X",
-        "hashValue":"{0}".format(bl.hash),
+        "height":"{0}".format(bl.id),
+        "hash":"{0}".format(bl.hash),
+        "previous_hash":"{0}".format(bl.previous_hash),
+        "timestamp":"{0}".format(bl.timestamp),
          }
     # Create new block and post to django
     requests.post("http://127.0.0.1:8000/", data=data)
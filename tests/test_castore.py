@@ -0,0 +1,80 @@
+import os
+
+import sys
+sys.path.append('../src/')
+from castore import CAStore
+from client import Client
+
+
+class RecordingContext:
+    '''
+        Records the CA files loaded into it
+    '''
+
+    def __init__(self):
+        self.loaded = list()
+
+    def load_verify_locations(self, path):
+        self.loaded.append(path)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_add_deduplicates_and_reloads(tmp_path, certificate):
+    data = read(certificate("alice")[0])
+    store = CAStore(str(tmp_path / "cas"))
+    os.mkdir(store.capath)
+
+    path, added = store.add(data)
+    assert added and os.path.dirname(path) == store.capath and read(path) == data
+    # The same certificate with other line endings has the same fingerprint
+    assert store.add(data.replace(b'\n', b'\r\n') + b'\n') == (path, False)
+    assert data in store and len(store) == 1
+
+    other, added = store.add(read(certificate("bob")[0]))
+    assert added and sorted(store) == sorted([path, other])
+
+    # A new store indexes the saved files once
+    reloaded = CAStore(store.capath)
+    assert sorted(reloaded.scan()) == sorted([path, other])
+    assert reloaded.scan() == []
+    assert data in reloaded and len(reloaded) == 2
+
+
+def test_load_other_ca_loads_only_new_certificates(tmp_path, certificate):
+    capath = tmp_path / "cas"
+    capath.mkdir()
+    (capath / "alice.pem").write_bytes(read(certificate("alice")[0]))
+    client = Client(hostname="localhost", port=4902, bind=False, capath=str(capath))
+    client.context = RecordingContext()
+
+    client.load_other_ca()
+    assert client.context.loaded == [str(capath / "alice.pem")]
+
+    (capath / "bob.pem").write_bytes(read(certificate("bob")[0]))
+    client.load_other_ca()
+    assert client.context.loaded == [str(capath / "alice.pem"), str(capath / "bob.pem")]
+    client.load_other_ca()
+    assert len(client.context.loaded) == 2
+
+    # A new context is given every known CA
+    client.context = RecordingContext()
+    client.load_other_ca()
+    assert sorted(client.context.loaded) == [str(capath / "alice.pem"), str(capath / "bob.pem")]
+
+
+def test_save_new_certfile_loads_only_new_certificates(tmp_path, certificate):
+    capath = tmp_path / "cas"
+    capath.mkdir()
+    client = Client(hostname="localhost", port=4903, bind=False, capath=str(capath))
+    client.context = RecordingContext()
+    data = read(certificate("carol")[0])
+
+    client.save_new_certfile(bytearray(data))
+    client.save_new_certfile(bytearray(data))
+    assert len(client.context.loaded) == 1
+    assert read(client.context.loaded[0]) == data
+    assert os.listdir(str(capath)) == [os.path.basename(client.context.loaded[0])]
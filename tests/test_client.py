@@ -0,0 +1,142 @@
+import io
+import os
+import ssl
+import json
+import socket
+import tempfile
+
+import pytest
+
+import sys
+sys.path.append('../src/')
+from client import Client
+from block import Block
+from transaction import Transaction
+import codec
+
+
+def key_file(directory, name, key):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(key)
+    return path
+
+
+def batch_client(accept=True):
+    client = Client(hostname="localhost", port=4900, bind=False)
+    client.sent = []
+
+    def broadcast_transaction(batch):
+        client.sent.append(batch)
+        return [accept]
+    client.broadcast_transaction = broadcast_transaction
+    return client
+
+
+def test_batch_reports_every_line():
+    directory = tempfile.mkdtemp()
+    gen = key_file(directory, "gen.pub", "GENERATOR KEY")
+    alice = key_file(directory, "alice key.pub", "ALICE KEY")
+    commands = ("# comment\n\n"
+                "register %s alice '%s'\n"
+                "register %s 'unbalanced\n"
+                "frobnicate a b\n"
+                "revoke %s\n"
+                "query %s alice\n") % (gen, alice, gen, gen, gen)
+    out = io.StringIO()
+    client = batch_client()
+    assert client.batch_loop(io.StringIO(commands), out, flush_interval=0) == (2, 3)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["line"] for r in results] == [3, 4, 5, 6, 7]
+    assert "error" in results[1] and "command" not in results[1]
+    assert results[2]["error"] == "Unknown command frobnicate"
+    assert results[3]["error"] == "revoke takes 2 arguments (1 given)"
+    sent = [tx.transaction_id for batch in client.sent for tx in batch]
+    assert sent == [r["transactions"][0]["transaction_id"] for r in (results[0], results[4])]
+
+
+def test_batches_no_validator_took_fail_their_commands():
+    directory = tempfile.mkdtemp()
+    gen = key_file(directory, "gen.pub", "GENERATOR KEY")
+    out = io.StringIO()
+    client = batch_client(accept=None)
+    assert client.batch_loop(io.StringIO("query %s alice\nquery %s bob\n" % (gen, gen)), out,
+                             flush_interval=0) == (0, 2)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["line"], "error" in r) for r in results] == [(1, False), (2, False), (1, True), (2, True)]
+    assert results[2]["transactions"] == [t["transaction_id"] for t in results[0]["transactions"]]
+
+
+def test_busy_validators_are_retried():
+    client = Client(hostname="localhost", port=4900, bind=False)
+    client.connections = ["a", "b"]
+    replies = {"a": [False, False, True], "b": [False, None, None]}
+    client.send_transaction = lambda val, tx: replies[val].pop(0)
+    assert client.deliver("tx", delay=0)
+    assert replies == {"a": [], "b": []}
+
+    # Retries stop once no validator answers busy, or when they run out
+    client.send_transaction = lambda val, tx: None
+    assert not client.deliver("tx", delay=0)
+    client.send_transaction = lambda val, tx: False
+    assert not client.deliver("tx", retries=2, delay=0)
+
+
+def test_public_keys_are_cached_until_the_file_changes():
+    directory = tempfile.mkdtemp()
+    path = key_file(directory, "key.pub", "FIRST")
+    client = batch_client()
+    assert client.read_public_key(path) == "FIRST"
+    with open(path, 'w') as f:
+        f.write("SECOND")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert client.read_public_key(path) == "SECOND"
+    assert client.run_command(["query", path, "alice"])[0].tx_generator_address == "SECOND"
+
+
+class Listener:
+    '''
+        Hands the client one socket per queued message, then stops its receive loop
+    '''
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def accept(self):
+        if not self.messages:
+            raise StopIteration
+        a, b = socket.socketpair()
+        with a:
+            a.sendall(self.messages.pop(0))
+        return b, ('127.0.0.1', 1234)
+
+
+class HandshakeContext:
+    '''
+        Fails the handshake of the first connection, the others are not encrypted
+    '''
+
+    def __init__(self):
+        self.failed = False
+
+    def wrap_socket(self, conn, server_side):
+        if not self.failed:
+            self.failed = True
+            raise ssl.SSLError("handshake failed")
+        return conn
+
+
+def test_bad_connections_do_not_stop_receiving():
+    client = Client(hostname="localhost", port=4901, bind=False)
+    client.receive_context = HandshakeContext()
+    block = Block(id=0, transactions=[Transaction(inputs="a")], previous_hash="")
+    payload = codec.encode([block])
+    client.net = Listener([codec.frame_header(len(payload)) + payload,
+                          codec.frame_header(codec.MAX_FRAME_SIZE + 1),
+                          codec.frame_header(100) + b'truncated',
+                          codec.frame_header(len(payload)) + payload])
+    with pytest.raises(StopIteration):
+        client.receive()
+    assert client.blockchain.last_block.hash == block.hash
@@ -0,0 +1,230 @@
+import json
+import time
+import socket
+import threading
+
+import pytest
+
+import sys
+sys.path.append('../src/')
+import codec
+from block import Block
+from transaction import Transaction
+from blockchain import NOAH_PUBLIC_KEY
+from node import Node, ReceiveBuffer
+import validator as validator_module
+from validator import Validator
+
+
+def register_tx(name):
+    inputs = json.dumps({"REGISTER": {"name": name, "public_key": NOAH_PUBLIC_KEY}})
+    outputs = json.dumps({"REGISTER": {"success": True}})
+    return Transaction(transaction_type="Standard", tx_generator_address=NOAH_PUBLIC_KEY,
+                       inputs=inputs, outputs=outputs)
+
+
+def test_plain_round_trip():
+    tx = register_tx("noah")
+    assert codec.decode(codec.encode(tx)) == tx
+
+
+def test_compressed_round_trip():
+    blk = Block(transactions=[register_tx("user_%d" % i) for i in range(20)])
+    data = codec.encode(blk, compress=True)
+    assert data.startswith(codec.FLAG_ZLIB)
+    assert codec.decode(data) == blk
+    # The shared dictionary and repeated keys should shrink the block considerably
+    assert len(data) < len(codec.encode(blk)) / 3
+
+
+def test_batch_round_trip():
+    batch = [register_tx("a"), register_tx("b")]
+    decoded = codec.decode(codec.encode(batch, compress=True))
+    assert decoded == batch
+
+
+def test_alpn_protocols():
+    assert codec.alpn_protocols(True)[0] == codec.ALPN_COMPRESSED
+    assert codec.alpn_protocols(False) == [codec.ALPN_PLAIN]
+
+
+def receive(payload, framed, buffer):
+    a, b = socket.socketpair()
+
+    def send():
+        with a:
+            if framed:
+                Node.send_message(a, payload)
+            else:
+                a.sendall(payload)
+    sender = threading.Thread(target=send)
+    sender.start()
+    with b:
+        data = bytes(buffer.read(b))
+    sender.join()
+    return data
+
+
+def test_receive_buffer_reads_framed_and_unframed_messages():
+    buffer = ReceiveBuffer(size=16)
+    block = codec.encode(Block(id=1, transactions=[register_tx("user %d" % i) for i in range(50)]), compress=True)
+    assert receive(block, True, buffer) == block
+    # Unframed messages still arrive whole, however small or large
+    assert receive(b'/cert', False, buffer) == b'/cert'
+    assert receive(block, False, buffer) == block
+    assert codec.decode(receive(block, True, buffer)).t_counter == 50
+
+
+def test_receive_buffer_limits(monkeypatch):
+    buffer = ReceiveBuffer(size=16, kept=64)
+    block = codec.encode(Block(id=1, transactions=[register_tx("user %d" % i) for i in range(5)]))
+    assert receive(block, True, buffer) == block
+    # The buffer grown for the block is given back once it is done with
+    assert len(buffer.buffer) == 16
+    monkeypatch.setattr(codec, 'MAX_FRAME_SIZE', 256)
+    for framed in (True, False):
+        try:
+            receive(block, framed, buffer)
+            assert False, "Oversized message accepted"
+        except ValueError:
+            pass
+
+
+class PlainContext:
+    def wrap_socket(self, conn, server_side):
+        return conn
+
+
+def test_bad_frames_only_cost_their_connection():
+    validator = Validator(hostname="localhost", port=4950, bind=False)
+    validator.receive_context = PlainContext()
+    validator.accept_pending = lambda: None
+    tx = register_tx("noah")
+    payload = codec.encode(tx)
+    malformed = payload[:-1]
+    mistyped = register_tx("dung")
+    mistyped.lock_time = "soon"
+    mistyped = codec.encode(mistyped)
+    messages = [codec.frame_header(codec.MAX_FRAME_SIZE + 1), codec.frame_header(100) + b'truncated',
+                codec.frame_header(len(malformed)) + malformed, codec.frame_header(len(mistyped)) + mistyped,
+                codec.frame_header(len(payload)) + payload]
+    for message in messages:
+        a, b = socket.socketpair()
+        with a:
+            a.sendall(message)
+            a.shutdown(socket.SHUT_WR)
+            validator.connmgr.admit(b, ('127.0.0.1', 1234))
+            validator.receive()
+    assert tx in validator.mempool
+
+    tx = register_tx("noah")
+    block = Block(id=2, transactions=[tx, register_tx("dung"), tx], previous_hash="",
+                  block_generator_address=("127.0.0.1", 4848), status="Proposed")
+    for compress in (False, True):
+        decoded = codec.decode(codec.encode(block, compress=compress))
+        assert decoded.compute_hash() == block.compute_hash()
+        assert decoded.verify()
+        # Shared values stay shared, as they would through pickle
+        assert decoded.transactions[0] is decoded.transactions[2]
+
+
+def test_stream_decoder_yields_items_as_they_arrive():
+    blocks = [Block(id=i, transactions=[register_tx("user %d" % i)]) for i in range(3)]
+    payload = codec.encode(blocks, compress=True)
+    decoder = codec.StreamDecoder()
+    arrived = []
+    for i in range(0, len(payload), 64):
+        arrived.append(len(decoder.feed(payload[i:i + 64])))
+    arrived.append(len(decoder.close()))
+    assert sum(arrived) == 3
+    assert arrived.index(1) < len(arrived) - 1
+
+
+def test_legacy_pickle_payloads():
+    import pickle
+    tx = register_tx("noah")
+    assert codec.decode(pickle.dumps([tx]), accept_pickle=True) == [tx]
+    with pytest.raises(codec.DecodeError):
+        codec.decode(pickle.dumps(tx))
+
+
+def test_malformed_payloads_raise_decode_errors():
+    payload = codec.encode(register_tx("noah"))
+    nested = codec.PAYLOAD_HEADER.pack(codec.FLAG_SCHEMA, codec.SCHEMA_VERSION, codec.KIND_SINGLE)
+    nested += codec.ITEM_HEADER.pack(100000 * 5) + (codec.TAG_LIST + codec.LENGTH.pack(1)) * 100000
+    malformed = [payload[:-3], payload[:11] + b'\xff' + payload[12:], payload + b'\x00',
+                 payload[:-3] + codec.TAG_REF + codec.LENGTH.pack(999), nested,
+                 codec.FLAG_ZLIB + b'not zlib', codec.encode([1, {}], compress=True)[:-2]]
+    for data in malformed:
+        with pytest.raises(codec.DecodeError):
+            codec.decode(data)
+
+
+def test_mistyped_fields_raise_decode_errors():
+    for name, value in [('lock_time', "soon"), ('transaction_id', ['x']), ('time_stamp', True)]:
+        tx = register_tx("noah")
+        setattr(tx, name, value)
+        with pytest.raises(codec.DecodeError):
+            codec.decode(codec.encode(tx))
+    block = Block(id=1, transactions=[register_tx("noah")])
+    block.transactions.append("not a transaction")
+    with pytest.raises(codec.DecodeError):
+        codec.decode(codec.encode(block))
+    # Objects sent with their attribute names are checked too
+    tx = register_tx("noah")
+    del tx.status
+    with pytest.raises(codec.DecodeError):
+        codec.decode(codec.encode(tx))
+
+
+def test_unexpected_errors_only_cost_their_connection():
+    validator = Validator(hostname="localhost", port=4952, bind=False)
+    validator.receive_context = PlainContext()
+    validator.accept_pending = lambda: None
+    handle = validator.handle_message
+
+    def fail_once(message, addr, start_time):
+        validator.handle_message = handle
+        raise TypeError("unexpected")
+    validator.handle_message = fail_once
+    tx = register_tx("noah")
+    payload = codec.encode(tx)
+    for _ in range(2):
+        a, b = socket.socketpair()
+        with a:
+            a.sendall(codec.frame_header(len(payload)) + payload)
+            a.shutdown(socket.SHUT_WR)
+            validator.connmgr.admit(b, ('127.0.0.1', 1234))
+            validator.receive()
+    assert tx in validator.mempool
+
+
+def test_stalled_connections_time_out(monkeypatch):
+    monkeypatch.setattr(validator_module, 'CONNECTION_TIMEOUT', 0.2)
+    validator = Validator(hostname="localhost", port=4953, bind=False)
+    validator.receive_context = PlainContext()
+    validator.accept_pending = lambda: None
+    tx = register_tx("noah")
+    payload = codec.encode(tx)
+    stalled, b = socket.socketpair()
+    with stalled:
+        # Sends half of a frame and then nothing, without closing the connection
+        stalled.sendall((codec.frame_header(len(payload)) + payload)[:20])
+        validator.connmgr.admit(b, ('127.0.0.1', 1234))
+        start = time.monotonic()
+        validator.receive()
+        assert time.monotonic() - start < 2
+    a, b = socket.socketpair()
+    with a:
+        a.sendall(codec.frame_header(len(payload)) + payload)
+        validator.connmgr.admit(b, ('127.0.0.1', 1235))
+        validator.receive()
+    assert tx in validator.mempool
+
+
+def test_decompressed_size_is_bounded():
+    payload = codec.encode(b'\x00' * 100000, compress=True)
+    assert len(codec.decode(payload)) == 100000
+    decoder = codec.StreamDecoder(max_size=50000)
+    with pytest.raises(codec.DecodeError):
+        decoder.feed(payload)
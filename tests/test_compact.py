@@ -0,0 +1,79 @@
+import collections
+
+import sys
+sys.path.append('../src/')
+from simulator import Simulation
+from transaction import Transaction
+from compact import CompactBlock, TransactionsRequest, BlockTransactions
+import codec
+
+
+def relay(received):
+    '''
+        Announce a block of three transactions from one validator to another that
+        holds only the first two, and count the messages sent
+    '''
+    sim = Simulation(validators=2, clients=1)
+    sender, receiver = sim.validators
+    sent = collections.Counter()
+    send = sim.send
+    sim.send = lambda source, destination, msg: sent.update([type(msg).__name__]) or send(source, destination, msg)
+
+    txs = [Transaction(transaction_type="Standard", inputs=str(i)) for i in range(3)]
+    for tx in txs:
+        sender.add_transaction(received(tx))
+    for tx in txs[:2]:
+        receiver.add_transaction(received(tx))
+    blk = sender.create_block(0, 3)
+    sender.blockchain.append(blk)
+    sender.announce(blk)
+    sim.run(transactions=0)
+
+    assert receiver.blockchain.last_block.hash == blk.hash
+    assert len(receiver.mempool) == 0 and not receiver.pending_blocks
+    return sent
+
+
+def test_only_missing_transactions_are_fetched():
+    sent = relay(lambda tx: codec.decode(codec.encode(tx)))
+    assert sent == {'CompactBlock': 1, 'TransactionsRequest': 1, 'BlockTransactions': 1}
+
+
+def test_transactions_hashing_differently_are_fetched_whole():
+    # Built in one process the transactions share their "Standard" string, and
+    # the block hash depends on it, so the copies in the receiver's mempool do not fit
+    sent = relay(lambda tx: tx)
+    assert sent == {'CompactBlock': 1, 'TransactionsRequest': 2, 'BlockTransactions': 2}
+
+
+def test_only_known_validators_get_transactions():
+    sim = Simulation(validators=2, clients=1)
+    validator, other = sim.validators
+    blk = validator.create_block(0, 0)
+    validator.blockchain.append(blk)
+    sent = []
+    sim.send = lambda source, destination, msg: sent.append(destination.address)
+    for sender in [("attacker.example", 443), ("localhost", 443), None, (other.hostname, other.address[1])]:
+        validator.handle_message(TransactionsRequest(blk.hash, [0], sender), other.address, 0)
+    assert sent == [other.address]
+
+
+def test_malformed_or_unknown_compact_messages_are_ignored():
+    sim = Simulation(validators=2, clients=1)
+    validator, other = sim.validators
+    blk = validator.create_block(0, 0)
+    validator.blockchain.append(blk)
+    sent, lookups = [], []
+    sim.send = lambda source, destination, msg: sent.append(msg)
+    find = validator.mempool.find
+    validator.mempool.find = lambda short: lookups.append(short) or find(short)
+    known = (other.hostname, other.address[1])
+
+    compact = CompactBlock.from_block(validator.create_block(0, 0), ("attacker.example", 443))
+    compact.header.id = blk.id + 1
+    messages = [compact, CompactBlock(None, [b'12345678'], known), CompactBlock(compact.header, [[1]], known),
+                TransactionsRequest(blk.hash, ["0"], known), TransactionsRequest([blk.hash], [0], known),
+                BlockTransactions(None, None)]
+    for message in messages:
+        validator.handle_message(message, other.address, 0)
+    assert sent == [] and lookups == []
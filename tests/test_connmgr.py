@@ -0,0 +1,75 @@
+from threading import Thread, Event
+
+import sys
+sys.path.append('../src/')
+from connmgr import ConnectionManager
+
+
+def served(manager):
+    order = []
+    while True:
+        item = manager.next()
+        if item is None:
+            return order
+        order.append(item[0])
+
+
+def test_peers_are_served_in_turn(clock):
+    manager = ConnectionManager(16, 2, clock=clock)
+    for i in range(4):
+        manager.admit("noisy%d" % i, ("10.0.0.1", 5000 + i))
+    manager.admit("quiet0", ("10.0.0.2", 6000))
+    manager.admit("quiet1", ("10.0.0.3", 6000))
+    assert served(manager) == ["noisy0", "quiet0", "quiet1", "noisy1", "noisy2", "noisy3"]
+
+
+def test_inbound_cap_takes_from_the_busiest_peer(clock):
+    manager = ConnectionManager(3, 2, clock=clock)
+    for i in range(3):
+        assert manager.admit("noisy%d" % i, ("10.0.0.1", i)) == []
+    assert manager.admit("noisy3", ("10.0.0.1", 3)) == ["noisy3"]
+    assert manager.admit("quiet", ("10.0.0.2", 0)) == ["noisy2"]
+    assert len(manager) == 3 and manager.counters['rejected'] == 1 and manager.counters['dropped'] == 1
+
+
+def test_rate_limits_throttle_a_peer(clock):
+    manager = ConnectionManager(16, 2, message_rate=1, message_burst=2, byte_rate=100, byte_burst=100,
+                                clock=clock)
+    for i in range(4):
+        manager.admit(i, ("10.0.0.1", i))
+    assert served(manager) == [0, 1] and manager.counters['throttled'] == 1
+    clock.now = 1.0
+    assert served(manager) == [2]
+    # A large message leaves the peer in debt until its bytes are refilled
+    manager.received(("10.0.0.1", 2), 300)
+    clock.now = 3.0
+    assert served(manager) == []
+    clock.now = 4.0
+    assert served(manager) == [3]
+
+
+def test_outbound_slots():
+    manager = ConnectionManager(16, 1)
+    entered = Event()
+
+    def send():
+        with manager.outbound():
+            entered.set()
+    with manager.outbound():
+        thread = Thread(target=send)
+        thread.start()
+        assert not entered.wait(0.05)
+    thread.join()
+    assert entered.is_set() and manager.counters['outbound_waits'] == 1
+
+
+def test_wait_until_a_throttled_peer_refills(clock):
+    manager = ConnectionManager(16, 2, message_rate=2, message_burst=1, clock=clock)
+    assert manager.wait() is None
+    for i in range(2):
+        manager.admit(i, ("10.0.0.1", i))
+    assert manager.wait() == 0.0
+    assert served(manager) == [0]
+    assert manager.wait() == 0.5
+    clock.now = 0.5
+    assert manager.wait() == 0.0 and served(manager) == [1]
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+import sys
+sys.path.append('../src/')
+from keypool import KeyPool
+
+from Crypto.PublicKey import RSA
+
+
+def test_write_keys():
+    key_path = tempfile.mkdtemp()
+    # A small modulus keeps the test fast
+    with KeyPool(size=2, workers=2, modulus_length=1024) as pool:
+        paths = pool.write_keys(3, key_path)
+        more = pool.write_keys(1, key_path)
+    assert len(paths) == 3
+    assert more[0][1].endswith("key_3_public.pem")
+
+    private_path, public_path = paths[0]
+    private_key = RSA.import_key(open(private_path, 'rb').read())
+    public_key = RSA.import_key(open(public_path, 'rb').read())
+    assert private_key.publickey() == public_key
+    assert len(set(open(p, 'rb').read() for _, p in paths)) == 3
+
+
+def test_close_cancels_keys_not_started():
+    pool = KeyPool(size=8, workers=1, modulus_length=1024)
+    jobs = list(pool.jobs)
+    pool.close()
+    # Only the job being run and the one queued behind it by the executor are kept
+    assert sum(job.cancelled() for job in jobs) >= 6
@@ -0,0 +1,45 @@
+import json
+import tempfile
+import time
+
+import sys
+sys.path.append('../src/')
+from loadgen import LoadGenerator, read_workload
+
+
+def write_workload(records):
+    f = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+    for record in records:
+        f.write(json.dumps(record) + '\n')
+    f.close()
+    return f.name
+
+
+def test_open_loop_replay():
+    path = write_workload([{'t': i * 0.005, 'op': 'register', 'name': 'u%d' % i, 'public_key': 'K%d' % i}
+                           for i in range(40)])
+    sent = []
+    generator = LoadGenerator(['v1', 'v2'], lambda peer, tx: sent.append((peer, json.loads(tx.inputs))))
+    report = generator.run(read_workload(path))
+    assert report['sent'] == 40 and report['errors'] == 0
+    assert sent.count(('v1', {'REGISTER': {'name': 'u0', 'public_key': 'K0'}})) == 1
+    assert abs(report['offered_rate'] - 200) < 1
+    assert not report['saturated']
+
+
+def test_slow_validators_saturate():
+    path = write_workload([{'op': 'query', 'name': 'u%d' % i} for i in range(20)])
+    # A single worker that takes 20 ms per send cannot keep up with 200 sends a second
+    generator = LoadGenerator(['v1'], lambda peer, tx: time.sleep(0.02), concurrency=1)
+    report = generator.run(read_workload(path), rate=200)
+    assert report['saturated']
+    assert report['p99'] > report['p50'] > 0.02
+
+
+def test_every_failed_send_is_counted():
+    path = write_workload([{'op': 'query', 'name': 'u%d' % i} for i in range(10)])
+
+    def send(peer, tx):
+        raise ValueError("Refusing a pickled payload")
+    report = LoadGenerator(['v1'], send).run(read_workload(path), rate=1000)
+    assert report['sent'] == 10 and report['errors'] == 10
@@ -0,0 +1,47 @@
+import sys
+sys.path.append('../src/')
+from block import Block
+from mempool import Mempool, ADDED, DUPLICATE, BUSY, OLDEST, LARGEST
+from transaction import Transaction
+
+
+def txs(count, size=10):
+    return [Transaction(inputs="%d" % i + "x" * size) for i in range(count)]
+
+
+def test_limits_and_backpressure():
+    pool = Mempool(max_count=3)
+    pending = txs(4)
+    assert [pool.add(tx) for tx in pending] == [ADDED, ADDED, ADDED, BUSY]
+    assert pool.add(pending[0]) == DUPLICATE and pending[3] not in pool
+    assert pool[0:2] == pending[:2] and pool[-1] is pending[2]
+    pool.remove_block(Block(id=1, transactions=pending[:1]))
+    assert pool.add(pending[3]) == ADDED and list(pool) == pending[1:]
+
+
+def test_eviction_policies():
+    pool = Mempool(max_count=2, policy=OLDEST)
+    pending = txs(3)
+    assert [pool.add(tx) for tx in pending] == [ADDED] * 3
+    assert list(pool) == pending[1:] and pool.counters['evicted'] == 1
+
+    small, large, larger = txs(1, 10)[0], txs(1, 500)[0], txs(1, 1000)[0]
+    pool = Mempool(max_bytes=1500, policy=LARGEST)
+    assert [pool.add(tx) for tx in (large, larger)] == [ADDED, BUSY]
+    assert pool.add(small) == ADDED
+    pool.max_bytes = pool.bytes
+    # The largest transaction makes room for a smaller one, never for a larger one
+    assert pool.add(txs(1, 20)[0]) == ADDED and large not in pool and small in pool
+    assert pool.add(larger) == BUSY
+
+
+def test_expiry(clock):
+    pool = Mempool(expiry=60, clock=clock)
+    first, second = txs(2)
+    pool.add(first)
+    clock.now = 30
+    pool.add(second)
+    clock.now = 61
+    pool.expire()
+    assert list(pool) == [second] and pool.counters['expired'] == 1
+    assert pool.bytes == sum(size for _, size, _ in pool.entries.values())
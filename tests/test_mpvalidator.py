@@ -0,0 +1,76 @@
+import multiprocessing
+import time
+
+import sys
+sys.path.append('../src/')
+from block import Block
+from compact import CompactBlock, TransactionsRequest, BlockTransactions
+from mpvalidator import verify_message, MultiProcessValidator, NetworkValidator
+from transaction import Transaction
+import codec
+
+
+def test_verification_stage_drops_tampered_messages():
+    txs = [Transaction(inputs=str(i)) for i in range(4)]
+    block = Block(id=1, transactions=txs[:2], previous_hash="")
+    tampered = Transaction(inputs="a")
+    tampered.inputs = "b"
+    tampered_block = Block(id=2, transactions=[Transaction(inputs="c")], previous_hash=block.hash)
+    tampered_block.transactions[0].outputs = "changed"
+
+    verified, rejected = verify_message(codec.encode(txs + [block, tampered, tampered_block, "text"], compress=True))
+    assert verified == txs + [block]
+    assert rejected == 3
+    assert verify_message(b"garbage") == ([], 1)
+
+
+def test_compact_block_messages_pass_verification():
+    block = Block(id=1, transactions=[Transaction(inputs="a")], previous_hash="")
+    compact = CompactBlock.from_block(block, ("localhost", 4848))
+    request = TransactionsRequest(block.hash, [0], ("localhost", 4848))
+    response = BlockTransactions(block.hash, block.transactions)
+    forged = BlockTransactions(block.hash, [Transaction(inputs="b")])
+    forged.transactions[0].inputs = "c"
+    verified, rejected = verify_message(codec.encode([compact, request, response, forged]))
+    assert [type(msg) for msg in verified] == [CompactBlock, TransactionsRequest, BlockTransactions]
+    assert rejected == 1
+
+
+def test_pipeline_end_to_end():
+    mp = MultiProcessValidator(port=4960, verifiers=2)
+    network = NetworkValidator(mp.inbound, mp.outbound, mp.busy, hostname="localhost", port=4960, bind=False)
+    # The network stage is driven from here, the verifiers and the ledger run in their processes
+    for process in mp.processes[1:]:
+        process.start()
+    try:
+        peer = ("127.0.0.1", 40000)
+        genesis = Block(id=0, transactions=[Transaction(inputs="genesis")], previous_hash="")
+        following = Block(id=1, transactions=[Transaction(inputs="next")], previous_hash=genesis.hash)
+        sync = Block(id=0, block_generator_address=("127.0.0.1", 4999))
+        for msg in [genesis, following, sync]:
+            assert network.dispatch(codec.encode(msg), peer, 0) == codec.REPLY_OK
+        destination, chain = mp.outbound.get(timeout=30)
+        assert destination[1] == 4999 and [blk.hash for blk in chain] == [genesis.hash, following.hash]
+
+        # The client that synced is sent the block the ledger builds from three transactions
+        txs = [Transaction(transaction_type="Standard", inputs="tx %d" % i) for i in range(3)]
+        for tx in txs:
+            network.dispatch(codec.encode(tx), peer, int(time.time()))
+        destination, block = mp.outbound.get(timeout=30)
+        assert block.id == 2 and block.previous_hash == following.hash
+        assert [tx.transaction_id for tx in block.transactions] == [tx.transaction_id for tx in txs]
+    finally:
+        mp.stop_event.set()
+        for process in mp.processes[1:]:
+            process.join()
+
+
+def test_full_pipeline_replies_busy():
+    inbound, busy = multiprocessing.Queue(1), multiprocessing.Value('b', 0)
+    network = NetworkValidator([inbound], None, busy, hostname="localhost", port=4961, bind=False)
+    payload = codec.encode(Transaction(inputs="a"))
+    assert network.dispatch(payload, ("127.0.0.1", 1), 0) == codec.REPLY_OK
+    assert network.dispatch(payload, ("127.0.0.1", 1), 0) == codec.REPLY_BUSY
+    inbound.get(timeout=5)
+    busy.value = 1
+    assert network.dispatch(payload, ("127.0.0.1", 1), 0) == codec.REPLY_BUSY
@@ -0,0 +1,56 @@
+import ssl
+import socket
+import threading
+
+import sys
+sys.path.append('../src/')
+from client import Client
+from node import Peer
+
+
+def serve(listener, contexts):
+    '''
+        Accept one TLS connection per context, answer its message and close it
+    '''
+    for context in contexts:
+        conn, _ = listener.accept()
+        with context.wrap_socket(conn, server_side=True) as s:
+            s.recv(16)
+            s.sendall(b'/ok')
+
+
+def server_context(certfile, keyfile):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def test_sessions_are_resumed_and_replaced_when_stale(certificate):
+    certfile, keyfile = certificate("localhost")
+    first, restarted = server_context(certfile, keyfile), server_context(certfile, keyfile)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    # The server restarts before the third connection, the session tickets of the
+    # first context mean nothing to the second
+    server = threading.Thread(target=serve, args=(listener, [first, first, restarted, restarted]), daemon=True)
+    server.start()
+
+    client = Client(hostname="localhost", port=4904, bind=False)
+    client.context = ssl.create_default_context()
+    client.context.check_hostname = False
+    client.context.load_verify_locations(certfile)
+    peer = Peer("localhost", listener.getsockname()[1], ip="127.0.0.1")
+
+    reused = list()
+    for _ in range(4):
+        with client.connect(peer) as s:
+            client.send_message(s, b'ping')
+            client.read_reply(s)
+            reused.append(s.session_reused)
+            client.cache_session(peer, s)
+    server.join(10)
+    listener.close()
+
+    assert reused == [False, True, False, True]
+    assert client.handshakes['full'] == 2 and client.handshakes['resumed'] == 2
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+import sys
+sys.path.append('../src/')
+from peers import PeerDirectory
+
+
+def write(path, lines, mtime):
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_reload_keeps_unchanged_peers(clock):
+    path = os.path.join(tempfile.mkdtemp(), "validators.txt")
+    write(path, ["self 127.0.0.1 4848", "a 10.0.0.1 4848", "b 10.0.0.2 4848"], 1)
+    lookups = []
+
+    def resolve(hostname):
+        lookups.append(hostname)
+        if hostname == "b":
+            raise OSError("no such host")
+        return "192.168.0.%d" % len(lookups)
+
+    directory = PeerDirectory(path, exclude=("self", "127.0.0.1", 4848), ttl=60, clock=clock, resolve=resolve)
+    a, b = directory.peers
+    assert a.address == ("192.168.0.1", 4848) and b.address == ("10.0.0.2", 4848)
+    directory.peers.append("syncing client")
+
+    write(path, ["a 10.0.0.1 4848", "c 10.0.0.3 4848"], 2)
+    assert not directory.refresh()  # checked too recently
+    clock.now = 2
+    assert directory.refresh()
+    assert directory.peers[:2] == [a, "syncing client"] and directory.peers[2].hostname == "c"
+    assert lookups == ["a", "b", "c"]
+
+    # Addresses are looked up again once their TTL has expired
+    clock.now = 70
+    directory.refresh()
+    assert a.address == ("192.168.0.4", 4848) and directory.peers[0] is a
+
+
+def test_bad_and_empty_reads_keep_the_peers(clock):
+    path = os.path.join(tempfile.mkdtemp(), "validators.txt")
+    write(path, ["a 10.0.0.1 4848", "b 10.0.0.2 port", "c 10.0.0.3 4848"], 1)
+    directory = PeerDirectory(path, clock=clock, resolve=lambda hostname: "192.168.0.1")
+    a, c = directory.peers
+    assert (a.hostname, c.hostname) == ("a", "c")
+
+    # Truncated by an editor about to write it again
+    write(path, [""], 2)
+    clock.now = 2
+    assert not directory.refresh() and directory.peers == [a, c]
+    directory.peers.remove(c)
+    write(path, ["a 10.0.0.1 4848"], 3)
+    clock.now = 4
+    assert directory.refresh() and directory.peers == [a]
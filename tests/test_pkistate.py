@@ -0,0 +1,183 @@
+import os
+import tempfile
+
+import pytest
+
+import sys
+sys.path.append('../src/')
+from block import Block
+from blockchain import Blockchain
+from chainstore import ChainStore
+from pkistate import PKIState, CheckpointStore, INDEX_RECORD
+from validator import Validator
+
+
+def make_block(chain, txs):
+    previous = chain.last_block
+    return Block(id=previous.id + 1 if previous else 0, transactions=txs,
+                 previous_hash=previous.hash if previous else "")
+
+
+def test_register_update_revoke(pki_tx):
+    state = PKIState()
+    state.apply_transaction(pki_tx("REGISTER", name="alice", public_key="A1"))
+    state.apply_transaction(pki_tx("REGISTER", False, name="bob", public_key="B1"))
+    assert state.lookup("alice") == "A1"
+    assert state.lookup("bob") is None
+    assert state.is_registered("carol", "A1")
+
+    state.apply_transaction(pki_tx("UPDATE", name="alice", old_public_key="A1", new_public_key="A2"))
+    state.apply_transaction(pki_tx("REVOKE", public_key="A1"))
+    assert state.lookup("alice") == "A2"
+    state.apply_transaction(pki_tx("REVOKE", public_key="A2"))
+    assert state.lookup("alice") is None
+
+
+def test_checkpoint_resume_replays_only_newer_blocks(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    chain = Blockchain(store=store, checkpoints=checkpoints)
+    for i in range(6):
+        chain.append(make_block(chain, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+    assert checkpoints.heights() == [3]
+
+    resumed = Blockchain(store=ChainStore(store.path), checkpoints=checkpoints)
+    assert len(resumed.chain) == 2
+    assert resumed.pki.height == 5
+    assert resumed.pki.lookup("user_0") == "K0"
+    assert resumed.pki.lookup("user_5") == "K5"
+
+
+def test_replaying_a_store_writes_no_checkpoints(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    chain = Blockchain(store=store)
+    for i in range(6):
+        chain.append(make_block(chain, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    resumed = Blockchain(store=ChainStore(store.path), checkpoints=checkpoints)
+    assert resumed.pki.height == 5 and checkpoints.heights() == []
+    # Blocks appended after the replay are checkpointed again
+    for i in range(6, 8):
+        resumed.append(make_block(resumed, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+    assert checkpoints.heights() == [7]
+
+
+def test_reading_missing_stores_creates_nothing():
+    missing = os.path.join(tempfile.mkdtemp(), "missing")
+    chain = Blockchain(store=ChainStore(os.path.join(missing, "chain")),
+                       checkpoints=CheckpointStore(os.path.join(missing, "checkpoints")))
+    assert chain.last_block is None and chain.pki.lookup("alice") is None
+    assert not os.path.exists(missing)
+
+
+def test_transaction_index_survives_checkpoints(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    chain = Blockchain(store=store, checkpoints=checkpoints)
+    txs = [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i) for i in range(6)]
+    for tx in txs:
+        chain.append(make_block(chain, [tx]))
+
+    resumed = Blockchain(store=ChainStore(store.path), checkpoints=checkpoints)
+    assert resumed.transaction_height(txs[1].transaction_id) == 1
+    assert resumed.transaction_height(txs[5].transaction_id) == 5
+    # Block 1 was covered by the checkpoint and is read back from the store
+    assert resumed.get_transaction(txs[1].transaction_id).inputs == txs[1].inputs
+    assert resumed.get_transaction(txs[5].transaction_id).inputs == txs[5].inputs
+    assert resumed.get_transaction("unknown") is None
+
+
+def test_checkpoints_log_only_new_transactions(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=2)
+    chain = Blockchain(store=store, checkpoints=checkpoints)
+    txs = [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i) for i in range(6)]
+    for tx in txs:
+        chain.append(make_block(chain, [tx]))
+    assert os.path.getsize(checkpoints.index_path) == 6 * INDEX_RECORD.size
+    assert checkpoints.load(3).transactions == {tx.transaction_id: i for i, tx in enumerate(txs[:4])}
+
+    # Taking a checkpoint again rewrites the records above the previous one
+    checkpoints.save(chain.pki)
+    assert os.path.getsize(checkpoints.index_path) == 6 * INDEX_RECORD.size
+    assert checkpoints.latest(store).transactions == chain.pki.transactions
+
+
+def test_pruned_bodies_are_archived_and_restorable(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    chain = Blockchain(store=store, checkpoints=checkpoints)
+    txs = [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i) for i in range(10)]
+    for tx in txs:
+        chain.append(make_block(chain, [tx]))
+    hashes = [block.hash for block in store.read()]
+
+    assert chain.prune(3) == 7
+    # Only blocks covered by the latest checkpoint, at height 7, are pruned on disk
+    assert store.pruned() == [(0, 7, True)]
+    assert [block.pruned for block in store.read()] == [True] * 7 + [False] * 3
+    assert [block.hash for block in store.read()] == hashes
+    assert all(block.verify() for block in store.read())
+    assert chain.chain[2].pruned and chain.get_transaction(txs[2].transaction_id).inputs == txs[2].inputs
+
+    resumed = Blockchain(store=ChainStore(store.path), checkpoints=checkpoints)
+    assert resumed.pki.lookup("user_1") == "K1" and resumed.is_committed(txs[1].transaction_id)
+    resumed.append(make_block(resumed, [pki_tx("REGISTER", name="late", public_key="L")]))
+    assert resumed.validate(make_block(resumed, [])) and not resumed.validate(make_block(resumed, []).header())
+
+    assert chain.restore(2, 3) == 7
+    assert store.pruned() == [] and not chain.chain[2].pruned
+    assert [block.transactions[0].inputs for block in store.read(0, 10)] == [tx.inputs for tx in txs]
+
+
+def test_resumed_chain_is_served_and_extended_by_height(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    chain = Blockchain(store=store, checkpoints=checkpoints, prune_horizon=2)
+    for i in range(8):
+        chain.append(make_block(chain, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+    # Resumed from the checkpoint at the end of the chain, no block is loaded
+    resumed = Blockchain(store=ChainStore(store.path), checkpoints=checkpoints, prune_horizon=2)
+    assert resumed.last_block is None and [block.id for block in resumed.blocks(5)] == [5, 6, 7]
+
+    validator = Validator(hostname="localhost", port=4951, bind=False)
+    validator.blockchain = resumed
+    sent = []
+    validator.message = lambda peer, message: sent.append(message)
+    validator.handle_message(Block(id=5, block_generator_address=("127.0.0.1", 4900)), ("127.0.0.1", 4900), 0)
+    assert [block.id for block in sent[0]] == [5, 6, 7]
+
+    validator.add_transaction(pki_tx("REGISTER", name="late", public_key="L"))
+    block = validator.create_block(0, 1)
+    assert block.id == 8 and resumed.validate(block)
+
+
+def test_checkpoints_below_the_pruned_blocks_are_not_used(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    checkpoints = CheckpointStore(tempfile.mkdtemp(), interval=4)
+    chain = Blockchain(store=store, checkpoints=checkpoints)
+    for i in range(12):
+        chain.append(make_block(chain, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+    chain.prune(3)
+    assert store.pruned() == [(0, 9, True)]
+
+    os.remove(os.path.join(checkpoints.path, "%012d.ckpt" % 11))
+    with pytest.raises(ValueError):
+        Blockchain(store=ChainStore(store.path), checkpoints=checkpoints)
+
+
+def test_interrupted_rewrite_is_completed_on_open(pki_tx):
+    store = ChainStore(tempfile.mkdtemp())
+    chain = Blockchain(store=store)
+    for i in range(4):
+        chain.append(make_block(chain, [pki_tx("REGISTER", name="user_%d" % i, public_key="K%d" % i)]))
+    hashes = [block.hash for block in store.read()]
+
+    # Crash once both new files are written, before they are swapped in
+    store.finish_rewrite = lambda: None
+    store.prune(2, archive=False)
+    reopened = ChainStore(store.path)
+    assert not os.path.exists(reopened.rewrite_path)
+    assert [block.hash for block in reopened.read()] == hashes
+    assert [block.pruned for block in reopened.read()] == [True, True, False, False]
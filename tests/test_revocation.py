@@ -0,0 +1,44 @@
+import pickle
+
+import sys
+sys.path.append('../src/')
+from pkistate import PKIState
+from revocation import RevocationFilter
+
+
+def test_no_false_negatives_and_round_trip():
+    revoked = ["REVOKED_KEY_%d" % i for i in range(1000)]
+    revocation_filter = RevocationFilter.from_keys(revoked, false_positive_rate=0.01)
+    loaded = RevocationFilter.from_bytes(revocation_filter.to_bytes())
+    assert all(key in loaded for key in revoked)
+    assert loaded.count == 1000
+
+    false_positives = sum(1 for i in range(10000) if "VALID_KEY_%d" % i in loaded)
+    assert false_positives < 300
+
+
+def test_formatting_does_not_matter():
+    key = "-----BEGIN PUBLIC KEY-----\nMIGfMA0GCSqGSIb3DQEB\n-----END PUBLIC KEY-----\n"
+    indented = "-----BEGIN PUBLIC KEY-----\n        MIGfMA0GCSqGSIb3DQEB\n        -----END PUBLIC KEY-----"
+    assert indented in RevocationFilter.from_keys([key])
+
+
+def test_state_exports_revoked_keys(pki_tx):
+    state = PKIState()
+    state.apply_transaction(pki_tx("REGISTER", name="alice", public_key="A1"))
+    state.apply_transaction(pki_tx("REVOKE", public_key="A1"))
+    state.apply_transaction(pki_tx("REVOKE", False, public_key="B1"))
+    assert state.is_revoked("A1")
+    assert not state.is_revoked("B1")
+    revocation_filter = state.revocation_filter()
+    assert "A1" in revocation_filter
+    assert revocation_filter.count == 1
+
+
+def test_old_checkpoints_are_normalized_on_load():
+    key = "-----BEGIN PUBLIC KEY-----\nMIGfMA0GCSqGSIb3DQEB\n-----END PUBLIC KEY-----\n"
+    state = PKIState()
+    # As checkpointed before revoked keys were normalized
+    state.revoked.add(key)
+    loaded = pickle.loads(pickle.dumps(state))
+    assert loaded.is_revoked(key) and loaded.revoked == {"".join(key.split("\n"))}
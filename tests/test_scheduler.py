@@ -0,0 +1,68 @@
+import sys
+sys.path.append('../src/')
+from block import Block
+from scheduler import LockTimeScheduler, HELD, TOO_FAR
+from mempool import DUPLICATE, BUSY
+from simulator import Simulation
+from transaction import Transaction
+
+
+def test_release_by_height_and_time(clock):
+    clock.now = 1600000000.0
+    scheduler = LockTimeScheduler(max_count=4, clock=clock)
+    later, sooner = Transaction(inputs="a", lock_time=12), Transaction(inputs="b", lock_time=11)
+    timed = Transaction(inputs="c", lock_time=1600000060)
+    assert scheduler.eligible(Transaction(inputs="d"), 0) and not scheduler.eligible(later, 11)
+    assert [scheduler.hold(tx, 10) for tx in (later, sooner, timed, later)] == [HELD, HELD, HELD, DUPLICATE]
+
+    assert scheduler.release(10) == []
+    assert scheduler.release(12) == [sooner, later]
+    clock.now += 60
+    assert scheduler.release(12) == [timed] and len(scheduler) == 0
+
+
+def test_discard_and_limit():
+    scheduler = LockTimeScheduler(max_count=1)
+    first, second = Transaction(inputs="a", lock_time=5), Transaction(inputs="b", lock_time=5)
+    assert scheduler.hold(first, 0) == HELD and scheduler.hold(second, 0) == BUSY
+    scheduler.remove_block(Block(id=1, transactions=[first]))
+    assert first not in scheduler and scheduler.release(5) == []
+
+
+def test_validator_holds_until_height():
+    validator = Simulation(validators=1, clients=1).validators[0]
+    height = validator.next_height()
+    locked = Transaction(transaction_type="Standard", inputs="locked", lock_time=height + 1)
+    assert validator.add_transaction(locked) == HELD and locked not in validator.mempool
+
+    validator.blockchain.append(validator.create_block(0, 0))
+    assert locked in validator.mempool and len(validator.scheduler) == 0
+
+
+def test_far_lock_times_are_refused_and_held_ones_expire(clock):
+    clock.now = 1600000000.0
+    scheduler = LockTimeScheduler(max_height_ahead=100, max_time_ahead=3600, expiry=7200, clock=clock)
+    assert scheduler.hold(Transaction(inputs="a", lock_time=111), 10) == TOO_FAR
+    assert scheduler.hold(Transaction(inputs="b", lock_time=1600003601), 10) == TOO_FAR
+    first = Transaction(inputs="c", lock_time=110)
+    assert scheduler.hold(first, 10) == HELD
+    clock.now += 3600
+    second = Transaction(inputs="d", lock_time=110)
+    assert scheduler.hold(second, 10) == HELD
+    clock.now += 3600
+    assert scheduler.release(10) == [] and first not in scheduler and second in scheduler
+    assert scheduler.counters['too_far'] == 2 and scheduler.counters['expired'] == 1
+
+
+def test_transactions_a_full_mempool_refuses_stay_held():
+    validator = Simulation(validators=1, clients=1).validators[0]
+    validator.mempool.max_count = len(validator.mempool) + 1
+    height = validator.next_height()
+    locked = [Transaction(transaction_type="Standard", inputs=str(i), lock_time=height + 1) for i in range(3)]
+    assert [validator.add_transaction(tx) for tx in locked] == [HELD] * 3
+
+    validator.blockchain.append(validator.create_block(0, 0))
+    assert locked[0] in validator.mempool and len(validator.scheduler) == 2
+    validator.mempool.discard(locked[0].transaction_id)
+    validator.release_transactions()
+    assert locked[1] in validator.mempool and locked[2] in validator.scheduler
@@ -0,0 +1,27 @@
+import sys
+sys.path.append('../src/')
+from simulator import Simulation, Link
+
+
+def test_simulated_network_finalizes_transactions():
+    report = Simulation(validators=3, clients=2, link=Link(latency=0.01)).run(transactions=30, rate=100)
+    assert report['submitted'] == 30
+    assert report['finalized'] == 30
+    # One hop for the transaction to reach a validator, one for its block to reach the others
+    assert report['finality_p50'] >= 0.02
+    assert set(report['queue_depth']) == {'validator0', 'validator1', 'validator2', 'client0', 'client1'}
+
+
+def test_lossy_links_drop_messages():
+    report = Simulation(validators=3, link=Link(loss=1.0)).run(transactions=10, rate=100)
+    assert report['dropped'] == 30
+    assert report['finalized'] == 0
+
+
+def test_sync_reply_goes_to_requesting_port():
+    sim = Simulation(validators=1, clients=1)
+    validator, client = sim.validators[0], sim.clients[0]
+    sent = []
+    sim.send = lambda source, destination, msg: sent.append(destination.address[1])
+    validator.handle_message(client.sync_request(0), ('127.0.0.1', 40000), 0)
+    assert sent == [client.address[1]] and client.address[1] != 4848
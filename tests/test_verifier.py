@@ -0,0 +1,63 @@
+import tempfile
+
+import sys
+sys.path.append('../src/')
+from block import Block
+from blockchain import Blockchain
+from chainstore import ChainStore
+from transaction import Transaction
+from verifier import verify_store
+
+
+def build_chain(length, tamper=(), unlink=()):
+    blocks, previous_hash = [], ""
+    for height in range(length):
+        block = Block(id=height, transactions=[Transaction(inputs="%d.%d" % (height, i)) for i in range(2)],
+                      previous_hash="elsewhere" if height in unlink else previous_hash)
+        if height in tamper:
+            block.transactions[1].inputs = "forged"
+        blocks.append(block)
+        previous_hash = block.hash
+    store = ChainStore(tempfile.mkdtemp())
+    store.extend(blocks)
+    return store, blocks
+
+
+def test_valid_chain_across_workers():
+    store, _ = build_chain(230)
+    report = verify_store(store, workers=2, chunk_size=50)
+    assert report == {'height': 229, 'verified': 230, 'skipped': 0, 'errors': []}
+
+
+def test_tampered_and_unlinked_blocks_are_found():
+    store, _ = build_chain(230, tamper=[7], unlink=[100, 150])
+    errors = verify_store(store, workers=2, chunk_size=50)['errors']
+    assert (7, "merkle root or hash does not match its contents") in errors
+    # Block 100 starts a chunk, so its link is checked across workers
+    assert (100, "does not link to the previous block") in errors
+    assert (150, "does not link to the previous block") in errors
+
+
+def test_trusted_checkpoint_skips_history():
+    store, blocks = build_chain(120, tamper=[7])
+    report = verify_store(store, trusted=(99, blocks[99].hash), chunk_size=50)
+    assert report['skipped'] == 100 and report['verified'] == 20 and not report['errors']
+    assert verify_store(store, trusted=(99, blocks[98].hash))['errors'] == [(99, "does not match the trusted checkpoint")]
+
+
+def test_only_linked_blocks_are_accepted():
+    _, blocks = build_chain(3, tamper=[2])
+    chain = Blockchain()
+    chain.append(blocks[0])
+    assert not chain.validate(blocks[2])
+    assert chain.validate(blocks[1])
+
+
+def test_received_blocks_must_come_next():
+    chain = Blockchain()
+    genesis = Block(id=0, previous_hash="")
+    assert not chain.validate(Block(id=3, previous_hash=""))
+    assert chain.validate(genesis)
+    chain.append(genesis)
+    assert not chain.validate(Block(id=57, previous_hash=genesis.hash))
+    assert chain.validate(Block(id=1, previous_hash=genesis.hash))